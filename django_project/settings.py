@@ -51,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'recommender.profiling.ProfilingMiddleware',  # Removes itself unless profiling is enabled below
 ]
 
 ROOT_URLCONF = 'django_project.urls'
@@ -122,3 +123,139 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Recommender settings
+
+# Server-side restaurant catalog (enriched restaurants keyed by place_id)
+RESTAURANT_CATALOG_MAX_ENTRIES = int(os.getenv('RESTAURANT_CATALOG_MAX_ENTRIES', '20000'))
+RESTAURANT_CATALOG_TTL_SECONDS = int(os.getenv('RESTAURANT_CATALOG_TTL_SECONDS', str(6 * 60 * 60)))
+# Requests may list at most PLACE_IDS_MAX_PER_REQUEST place_ids; at most PLACE_IDS_MAX_FETCH of those
+# missing from the catalog are fetched from Google per request, the rest are returned as unresolved.
+PLACE_IDS_MAX_PER_REQUEST = int(os.getenv('PLACE_IDS_MAX_PER_REQUEST', '500'))
+PLACE_IDS_MAX_FETCH = int(os.getenv('PLACE_IDS_MAX_FETCH', '20'))
+
+# Columnar restaurant feature store (memory-mapped NumPy arrays shared by all workers)
+FEATURE_STORE_ENABLED = os.getenv('FEATURE_STORE_ENABLED', 'True') == 'True'
+FEATURE_STORE_DIR = os.getenv('FEATURE_STORE_DIR', os.path.join(BASE_DIR, 'feature_store'))
+
+# Pre-load TensorFlow, scikit-learn, pandas and Firebase when a worker starts
+# (RecommenderConfig.ready) instead of on the first request.
+RECOMMENDER_WARMUP = os.getenv('RECOMMENDER_WARMUP', 'False') == 'True'
+
+# Storage for user favourites and model weights: 'firestore' (default) or 'sqlite' for offline use.
+# RECOMMENDER_STORAGE_CACHE_TTL > 0 puts a read-through cache (in seconds) in front of the backend.
+RECOMMENDER_STORAGE_BACKEND = os.getenv('RECOMMENDER_STORAGE_BACKEND', 'firestore')
+RECOMMENDER_SQLITE_PATH = os.getenv('RECOMMENDER_SQLITE_PATH', os.path.join(BASE_DIR, 'recommender_store.sqlite3'))
+RECOMMENDER_STORAGE_CACHE_TTL = int(os.getenv('RECOMMENDER_STORAGE_CACHE_TTL', '0'))
+
+# Feedback events are written to UserFeedback in batches of this size, or after this many seconds.
+FEEDBACK_FLUSH_BATCH_SIZE = int(os.getenv('FEEDBACK_FLUSH_BATCH_SIZE', '100'))
+FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.getenv('FEEDBACK_FLUSH_INTERVAL_SECONDS', '5'))
+
+# Half-life of the per-user category affinities built from feedback (used for users without an RL model).
+AFFINITY_HALF_LIFE_DAYS = float(os.getenv('AFFINITY_HALF_LIFE_DAYS', '14'))
+
+# Re-ranker used after the hybrid score: 'dqn' (per-user Keras DQN) or 'linucb' (per-user linear bandit).
+# Requests can override it with a "ranker" field. BANDIT_ALPHA scales LinUCB's exploration bonus. Until a user's
+# bandit has BANDIT_MIN_UPDATES updates, their category affinities re-rank instead.
+RECOMMENDER_RANKER = os.getenv('RECOMMENDER_RANKER', 'dqn')
+BANDIT_ALPHA = float(os.getenv('BANDIT_ALPHA', '0.5'))
+BANDIT_MIN_UPDATES = int(os.getenv('BANDIT_MIN_UPDATES', '10'))
+
+# 'online': record_feedback trains the user's ranker in the request.
+# 'batch': record_feedback only logs the event; run `manage.py retrain_models` periodically to train.
+RL_TRAINING_MODE = os.getenv('RL_TRAINING_MODE', 'online')
+
+# Write the per-request JSON debug logs (content/collab/hybrid) to assets/restaurant_data.
+RECOMMENDER_DEBUG_LOGS = os.getenv('RECOMMENDER_DEBUG_LOGS', 'True') == 'True'
+
+# Threads used by the async views for blocking Google Maps/Firestore calls (per worker process).
+GOOGLE_MAPS_IO_WORKERS = int(os.getenv('GOOGLE_MAPS_IO_WORKERS', '16'))
+
+# Google Places budgets (calls per second, per worker process) and retry behaviour. Calls that fail with
+# OVER_QUERY_LIMIT, 5xx or timeouts are retried with jittered backoff, and the number of calls in flight
+# (at most GOOGLE_MAPS_MAX_CONCURRENCY) is halved on every OVER_QUERY_LIMIT.
+GOOGLE_PLACES_NEARBY_QPS = float(os.getenv('GOOGLE_PLACES_NEARBY_QPS', '5'))
+GOOGLE_PLACES_DETAILS_QPS = float(os.getenv('GOOGLE_PLACES_DETAILS_QPS', '20'))
+GOOGLE_PLACES_PHOTO_QPS = float(os.getenv('GOOGLE_PLACES_PHOTO_QPS', '20'))
+GOOGLE_MAPS_MAX_RETRIES = int(os.getenv('GOOGLE_MAPS_MAX_RETRIES', '4'))
+GOOGLE_MAPS_MAX_CONCURRENCY = int(os.getenv('GOOGLE_MAPS_MAX_CONCURRENCY', '16'))
+
+# Grid cell size (degrees) of the spatial index used for radius queries over known restaurants (?source=local).
+SPATIAL_INDEX_CELL_DEGREES = float(os.getenv('SPATIAL_INDEX_CELL_DEGREES', '0.01'))
+
+# 'full': search results carry every Place Details field (reviews, photos, opening hours, contact details).
+# 'tiered': search results only fetch the fields needed to categorize and rank; the rest is fetched on
+# demand from place_details/<place_id>/ and cached in the catalog. That endpoint answers place_ids the server
+# has not ingested at most PLACE_DETAILS_UNKNOWN_PER_MINUTE times per minute per client address.
+PLACES_DETAILS_MODE = os.getenv('PLACES_DETAILS_MODE', 'full')
+PLACE_DETAILS_UNKNOWN_PER_MINUTE = float(os.getenv('PLACE_DETAILS_UNKNOWN_PER_MINUTE', '10'))
+
+# Keep per-user model weights in memory-mapped files shared by all worker processes on this host.
+# Weights written by any worker are visible to the others at once; entries older than the TTL are
+# re-read from the store, so updates made on other hosts are picked up.
+MODEL_ARENA_ENABLED = os.getenv('MODEL_ARENA_ENABLED', 'False') == 'True'
+MODEL_ARENA_DIR = os.getenv('MODEL_ARENA_DIR', os.path.join(BASE_DIR, 'model_arena'))
+MODEL_ARENA_TTL_SECONDS = float(os.getenv('MODEL_ARENA_TTL_SECONDS', '300'))
+
+# Opt-in request profiling (recommender.profiling). Requests under PROFILING_PATH_PREFIX are profiled when they
+# carry an X-Recommender-Profile header from `manage.py profiling_token` (if PROFILING_HEADER_ENABLED), or at
+# random with PROFILING_SAMPLE_RATE. Profiles slower than PROFILING_SLOW_MS are kept, others with
+# PROFILING_RETAIN_RATE, up to PROFILING_MAX_FILES files in PROFILING_DIR.
+PROFILING_HEADER_ENABLED = os.getenv('PROFILING_HEADER_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', str(24 * 60 * 60)))
+PROFILING_PATH_PREFIX = os.getenv('PROFILING_PATH_PREFIX', '/recommender/')
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', '1000'))
+PROFILING_RETAIN_RATE = float(os.getenv('PROFILING_RETAIN_RATE', '0.1'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))
+
+# Hybrid candidates that fail the user's restrictions are set aside before scoring. 'append' returns them
+# unscored (flagged "restricted": true) after the ranked ones, 'drop' leaves them out. Requests can override it.
+RESTRICTED_CANDIDATES = os.getenv('RESTRICTED_CANDIDATES', 'append')
+
+# Restaurant photos served by photos/<photo_reference>/ are kept in PHOTO_CACHE_DIR, evicting the least recently
+# used once it holds more than PHOTO_CACHE_MAX_BYTES. Clients may cache a photo for PHOTO_MAX_AGE_SECONDS.
+# References Google has no image for are answered with a 404 without an API call for PHOTO_NOT_FOUND_TTL_SECONDS.
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', os.path.join(BASE_DIR, 'photo_cache'))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv('PHOTO_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+PHOTO_MAX_AGE_SECONDS = int(os.getenv('PHOTO_MAX_AGE_SECONDS', str(7 * 24 * 60 * 60)))
+PHOTO_NOT_FOUND_TTL_SECONDS = int(os.getenv('PHOTO_NOT_FOUND_TTL_SECONDS', '300'))
+
+# Result sets of get_restaurants recently sent by this worker, kept so that clients polling with ?since=<version>
+# get only the changes. Older versions get the full result set.
+RESULT_VERSION_CACHE_SIZE = int(os.getenv('RESULT_VERSION_CACHE_SIZE', '1024'))
+
+# Background prefetch of popular areas (recommender.prefetch). Search locations build a heat map of
+# PREFETCH_TILE_DEGREES tiles whose heat halves every PREFETCH_HALF_LIFE_SECONDS. When a worker has had no search for
+# PREFETCH_IDLE_SECONDS, it searches the hottest tile (heat >= PREFETCH_MIN_HEAT) not refreshed in the last
+# PREFETCH_REFRESH_SECONDS, using a PREFETCH_RADIUS_M circle, at most PREFETCH_REFRESHES_PER_HOUR times per worker.
+# Searches that fit inside a circle prefetched within PREFETCH_FRESH_SECONDS are answered from the catalog, unless
+# that search was truncated at Google's 60 results; in dense areas keep PREFETCH_RADIUS_M small enough to stay under it.
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'False') == 'True'
+PREFETCH_TILE_DEGREES = float(os.getenv('PREFETCH_TILE_DEGREES', '0.01'))
+PREFETCH_HALF_LIFE_SECONDS = float(os.getenv('PREFETCH_HALF_LIFE_SECONDS', '3600'))
+PREFETCH_RADIUS_M = float(os.getenv('PREFETCH_RADIUS_M', '6000'))
+PREFETCH_REFRESHES_PER_HOUR = float(os.getenv('PREFETCH_REFRESHES_PER_HOUR', '20'))
+PREFETCH_MIN_HEAT = float(os.getenv('PREFETCH_MIN_HEAT', '3'))
+PREFETCH_REFRESH_SECONDS = float(os.getenv('PREFETCH_REFRESH_SECONDS', '1800'))
+PREFETCH_FRESH_SECONDS = float(os.getenv('PREFETCH_FRESH_SECONDS', '3600'))
+PREFETCH_IDLE_SECONDS = float(os.getenv('PREFETCH_IDLE_SECONDS', '5'))
+
+# Cache the categories of each place (CategoryCacheEntry), keyed by a hash of the categorization inputs and of
+# CATEGORY_DICT. After editing CATEGORY_DICT, run `manage.py recategorize` to update the stored entries.
+CATEGORY_CACHE_ENABLED = os.getenv('CATEGORY_CACHE_ENABLED', 'True') == 'True'
+CATEGORY_CACHE_MEMORY_ENTRIES = int(os.getenv('CATEGORY_CACHE_MEMORY_ENTRIES', '20000'))
+
+# Score collaborative filtering on a memory-mapped CSR snapshot of all users' favourites, shared by the worker
+# processes, instead of a per-worker copy. `manage.py refresh_favourites_snapshot --interval N` keeps it current;
+# snapshots older than FAVOURITES_SNAPSHOT_MAX_AGE seconds are ignored and favourites are read from the store.
+FAVOURITES_SNAPSHOT_ENABLED = os.getenv('FAVOURITES_SNAPSHOT_ENABLED', 'False') == 'True'
+FAVOURITES_SNAPSHOT_DIR = os.getenv('FAVOURITES_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'favourites_snapshot'))
+FAVOURITES_SNAPSHOT_MAX_AGE = float(os.getenv('FAVOURITES_SNAPSHOT_MAX_AGE', '3600'))
+
+# Worker processes the batch_recommendations/ endpoint may start per request. 1 scores in the request's process;
+# the batch_recommend management command is not limited by this.
+BATCH_API_MAX_WORKERS = int(os.getenv('BATCH_API_MAX_WORKERS', '1'))
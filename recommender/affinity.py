@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from .constants import CATEGORY_KEYS, FEEDBACK_ACTION_INDEX, FEEDBACK_REWARDS
+from .feature_store import NUMERIC_INDEX, category_mask, gather_features, masks_to_matrix
+
+# ============================= # # Decayed per-user like/dislike/click/skip counts per category and price level,
+# === User Affinity Vectors === # # updated in O(1) per feedback event. They give a cheap personalization signal
+# ============================= # # (a dot product with the category matrix) when the user's RL model is cold.
+
+PRICE_LEVELS = 5 # Google price_level is 0 (free) to 4 (very expensive)
+NUM_ACTIONS = len(FEEDBACK_ACTION_INDEX)
+
+# Reward of each action, in action-index order, used to turn counts into an affinity.
+_ACTION_REWARDS = np.array(
+    [FEEDBACK_REWARDS[action] for action, _ in sorted(FEEDBACK_ACTION_INDEX.items(), key=lambda x: x[1])],
+    dtype=np.float64,
+)
+
+
+def _price_bucket(price_level):
+    try:
+        level = int(float(price_level))
+    except (ValueError, TypeError):
+        return None
+    return level if 0 <= level < PRICE_LEVELS else None
+
+
+class UserAffinityStore:
+    """
+    In-process aggregates per user: a (NUM_ACTIONS, len(CATEGORY_KEYS)) count matrix and a
+    (NUM_ACTIONS, PRICE_LEVELS) count matrix, both decayed exponentially with the given half-life.
+    Decay is applied lazily on each update, so an update costs the same for every user.
+    """
+    def __init__(self, half_life_seconds=14 * 24 * 3600, max_users=100000, prior=1.0):
+        self.half_life_seconds = half_life_seconds
+        self.max_users = max_users
+        self.prior = prior # Pseudo-count that shrinks affinities built from few events towards 0
+        # user_id -> [last_update, category_counts, price_counts, time of the first update() in this process]
+        self._users = OrderedDict()
+        self._history_loaded = set()
+        self._history_loading = set()
+        self._lock = threading.Lock()
+
+    def _decay(self, entry, now):
+        elapsed = now - entry[0]
+        if elapsed > 0:
+            factor = math.pow(0.5, elapsed / self.half_life_seconds)
+            entry[1] *= factor
+            entry[2] *= factor
+            entry[0] = now
+
+    def update(self, user_id, action, categories, price_level=None, now=None):
+        """Adds one feedback event for a restaurant with the given categories and price level."""
+        self._add(user_id, action, categories, price_level, time.time() if now is None else now, live=True)
+
+    def _add(self, user_id, action, categories, price_level, now, live):
+        action_index = FEEDBACK_ACTION_INDEX.get(action)
+        if action_index is None:
+            return
+        category_columns = [i for i, cat in enumerate(CATEGORY_KEYS) if cat in set(categories or [])]
+        price = _price_bucket(price_level)
+        weight = 1.0
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = [now, np.zeros((NUM_ACTIONS, len(CATEGORY_KEYS))), np.zeros((NUM_ACTIONS, PRICE_LEVELS)), None]
+                self._users[user_id] = entry
+                if len(self._users) > self.max_users:
+                    evicted, _ = self._users.popitem(last=False)
+                    # Loaded again from the database if the user comes back.
+                    self._history_loaded.discard(evicted)
+            else:
+                self._users.move_to_end(user_id)
+                if now >= entry[0]:
+                    self._decay(entry, now)
+                else:
+                    # An older event (history merged after live updates) counts as already decayed.
+                    weight = math.pow(0.5, (entry[0] - now) / self.half_life_seconds)
+            if live and entry[3] is None:
+                entry[3] = now
+            entry[1][action_index, category_columns] += weight
+            if price is not None:
+                entry[2][action_index, price] += weight
+
+    def has_user(self, user_id):
+        with self._lock:
+            return user_id in self._users
+
+    def load_history(self, user_id, limit=500):
+        """
+        Rebuilds a user's aggregates from their logged UserFeedback events (e.g. after a restart).
+        The restaurants' categories and price levels are gathered from the feature store.
+        Each user is only loaded once per process; if the database cannot be read, the user is
+        left without affinities for this request and loading is tried again on the next one.
+        If update() already applied events of the user in this process, the stored history up to
+        the first of them is merged in, so those events are not counted twice.
+        """
+        with self._lock:
+            if user_id in self._history_loaded or user_id in self._history_loading:
+                return
+            self._history_loading.add(user_id)
+
+        from .feedback_log import export_user_history
+        try:
+            # Events still in the write-behind buffer were recorded by this process, which already
+            # applied them with update(); reading without a flush keeps writes out of the request.
+            history = export_user_history(user_id, limit=limit, flush=False)
+        except Exception as e:
+            print(f"  [AFFINITY] ERROR: Could not load the feedback history of user {user_id}: {e}")
+            return
+        finally:
+            with self._lock:
+                self._history_loading.discard(user_id)
+        with self._lock:
+            if len(self._history_loaded) >= self.max_users:
+                self._history_loaded.clear()
+            self._history_loaded.add(user_id)
+        if not len(history['actions']):
+            return
+        with self._lock:
+            entry = self._users.get(user_id)
+            live_since = entry[3] if entry is not None else None
+        numeric, masks, found = gather_features([{'place_id': pid} for pid in history['restaurant_ids']])
+        actions_by_index = {index: action for action, index in FEEDBACK_ACTION_INDEX.items()}
+        for i in np.flatnonzero(found):
+            timestamp = float(history['timestamps'][i])
+            if live_since is not None and timestamp >= live_since:
+                continue  # Applied by update() when it was recorded
+            categories = [cat for cat in CATEGORY_KEYS if int(masks[i]) & (1 << CATEGORY_KEYS.index(cat))]
+            self._add(user_id, actions_by_index.get(int(history['actions'][i])), categories,
+                      numeric[i, NUMERIC_INDEX['price_level']], timestamp, live=False)
+
+    def affinity_vector(self, user_id, now=None):
+        """
+        Returns the user's dense affinity vector of length len(CATEGORY_KEYS) + PRICE_LEVELS,
+        one value in [-1, 1] per category then per price level, or None for an unknown user.
+        Each value is the reward-weighted share of the user's decayed feedback on that feature.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            self._decay(entry, now)
+            counts = np.hstack([entry[1], entry[2]])
+        return (_ACTION_REWARDS @ counts) / (counts.sum(axis=0) + self.prior)
+
+    def score_restaurants(self, user_id, restaurants):
+        """
+        Scores restaurants for a user as the dot product of their category/price one-hot matrix
+        with the user's affinity vector, averaged over the restaurant's active features.
+        Returns None for an unknown user.
+        """
+        vector = self.affinity_vector(user_id)
+        if vector is None:
+            return None
+        features = restaurant_feature_matrix(restaurants)
+        active = features.sum(axis=1)
+        return (features @ vector) / np.maximum(active, 1.0)
+
+
+def restaurant_feature_matrix(restaurants):
+    """One-hot (n, len(CATEGORY_KEYS) + PRICE_LEVELS) matrix of categories and price level."""
+    numeric, masks, found = gather_features(restaurants)
+    prices = numeric[:, NUMERIC_INDEX['price_level']].astype(np.float64)
+    # Restaurants that are not in the feature store are encoded from their dictionaries.
+    for row in np.flatnonzero(~found):
+        masks[row] = category_mask(restaurants[row].get('categories'))
+        bucket = _price_bucket(restaurants[row].get('price_level'))
+        prices[row] = np.nan if bucket is None else bucket
+
+    features = np.zeros((len(restaurants), len(CATEGORY_KEYS) + PRICE_LEVELS))
+    features[:, :len(CATEGORY_KEYS)] = masks_to_matrix(masks)
+    valid = ~np.isnan(prices) & (prices >= 0) & (prices < PRICE_LEVELS)
+    features[np.flatnonzero(valid), len(CATEGORY_KEYS) + prices[valid].astype(int)] = 1.0
+    return features
+
+
+affinity_store = UserAffinityStore(
+    half_life_seconds=getattr(settings, 'AFFINITY_HALF_LIFE_DAYS', 14) * 24 * 3600,
+)
@@ -1,6 +1,28 @@
+import os
+import sys
 from django.apps import AppConfig
+from django.conf import settings
+
+# manage.py commands that serve requests, and so benefit from the warm-up.
+SERVING_COMMANDS = ('runserver',)
+
+
+def _is_management_command():
+    """True when the app is loaded for a manage.py/django-admin command that does not serve requests (migrate, check, ...)."""
+    return os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin') and len(sys.argv) > 1 \
+        and sys.argv[1] not in SERVING_COMMANDS
 
 
 class RecommenderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommender'
+
+    def ready(self):
+        # Optional: load models and heavy dependencies before the worker takes traffic.
+        if getattr(settings, 'RECOMMENDER_WARMUP', False) and not _is_management_command():
+            from .warmup import warm_up
+            try:
+                warm_up()
+            except Exception as e:
+                # A cold worker is slower on its first request, not broken; keep starting.
+                print(f"[WARMUP] WARNING: Warm-up failed, continuing without it: {e}", file=sys.stderr)
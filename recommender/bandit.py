@@ -0,0 +1,99 @@
+import numpy as np
+from django.conf import settings
+from .storage import get_store
+from .reinforcement_learning import STATE_SIZE
+
+# ====================== # # A LinUCB contextual bandit over the extract_rl_features vector. Feedback is a
+# === LinUCB Ranker ==== # # single-step reward, so a per-user ridge regression with an exploration bonus
+# ====================== # # replaces the DQN: O(d^2) updates and batch scoring in plain NumPy.
+
+BANDIT_COLLECTION = 'bandit_models'
+RANKERS = ('dqn', 'linucb')
+
+
+def get_ranker_name(requested=None):
+    """Returns the ranker to use: the requested one if given, else settings.RECOMMENDER_RANKER."""
+    ranker = requested or getattr(settings, 'RECOMMENDER_RANKER', 'dqn')
+    if ranker not in RANKERS:
+        raise ValueError(f"Unknown ranker '{ranker}'. Expected one of: {', '.join(RANKERS)}")
+    return ranker
+
+
+class LinUCBRanker:
+    """
+    Disjoint LinUCB for one user. Keeps A = ridge * I + sum(x x^T) and b = sum(reward * x),
+    plus A's inverse, which is updated with the Sherman-Morrison formula instead of being
+    recomputed. The score of a context x is theta . x + alpha * sqrt(x^T A^-1 x), theta = A^-1 b.
+    """
+    def __init__(self, user_id, dim=STATE_SIZE, alpha=None, ridge=1.0):
+        self.user_id = user_id
+        self.dim = dim
+        self.alpha = getattr(settings, 'BANDIT_ALPHA', 0.5) if alpha is None else alpha
+        self.ridge = ridge
+        self.A = np.eye(dim) * ridge
+        self.A_inv = np.eye(dim) / ridge
+        self.b = np.zeros(dim)
+        self.num_updates = 0
+
+    def update(self, x, reward):
+        """Adds one (context, reward) observation in O(d^2)."""
+        x = np.asarray(x, dtype=np.float64).reshape(-1)
+        A_inv_x = self.A_inv @ x
+        self.A_inv -= np.outer(A_inv_x, A_inv_x) / (1.0 + x @ A_inv_x)
+        self.A += np.outer(x, x)
+        self.b += reward * x
+        self.num_updates += 1
+
+    def update_many(self, X, rewards):
+        for x, reward in zip(X, rewards):
+            self.update(x, reward)
+
+    def score_batch(self, X):
+        """
+        Scores a (n, dim) context matrix. The expected reward costs O(n * d); the exploration
+        bonus adds O(n * d^2) and is skipped when alpha is 0.
+        """
+        X = np.reshape(X, (-1, self.dim))
+        scores = X @ (self.A_inv @ self.b)
+        if self.alpha:
+            scores = scores + self.alpha * np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', X, self.A_inv, X), 0.0))
+        return scores
+
+    # --- Serialization ---
+    def to_weights(self):
+        """
+        Compact state: the upper triangle of A (d(d+1)/2 values), b and the update count.
+        A's inverse is rebuilt on load, so rounding in the stored float32 values does not accumulate.
+        """
+        return [
+            self.A[np.triu_indices(self.dim)].astype(np.float32),
+            self.b.astype(np.float32),
+            np.array([self.num_updates], dtype=np.float32),
+        ]
+
+    @classmethod
+    def from_weights(cls, user_id, weights, **kwargs):
+        upper, b, meta = weights
+        ranker = cls(user_id, dim=len(b), **kwargs)
+        rows, cols = np.triu_indices(ranker.dim)
+        ranker.A = np.zeros((ranker.dim, ranker.dim))
+        ranker.A[rows, cols] = upper
+        ranker.A[cols, rows] = upper
+        ranker.A_inv = np.linalg.inv(ranker.A)
+        ranker.b = np.asarray(b, dtype=np.float64)
+        ranker.num_updates = int(meta[0])
+        return ranker
+
+
+def load_linucb_ranker(user_id, weights=None):
+    """
+    Returns the user's LinUCBRanker from the store (or from already fetched weights),
+    or None if the user has no saved state.
+    """
+    if weights is None:
+        weights = get_store().get_model_weights(user_id, collection=BANDIT_COLLECTION)
+    return LinUCBRanker.from_weights(user_id, weights) if weights else None
+
+
+def save_linucb_ranker(ranker):
+    get_store().put_model_weights(ranker.user_id, ranker.to_weights(), collection=BANDIT_COLLECTION)
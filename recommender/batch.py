@@ -0,0 +1,196 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.conf import settings
+from .content_based import build_content_index, score_content_based
+from .collaborative import _get_all_user_favorites, build_favourites_index, score_collaborative
+from .hybrid import HYBRID_WEIGHTS, RL_SCORE_WEIGHT, restriction_check
+from .reinforcement_learning import DQNAgent, STATE_SIZE, ACTION_SIZE, build_rl_feature_matrix
+from .constants import CATEGORY_KEYS
+
+# ======================================== # # Scores many users against one shared candidate set, e.g. for a nightly
+# === Batch Multi-User Recommendations === # # "new near you" push. Everything that does not depend on the user (TF-IDF
+# ======================================== # # matrix, favourites index, category encodings) is built once and shared.
+# The content index is built once per distinct set of restrictions, over the candidates that pass them,
+# so each user is scored exactly as get_hybrid_recommendations would score them.
+
+# Shared state of a worker process, set once by _init_worker.
+_shared_state = None
+
+
+def _init_worker(shared_state):
+    """Process pool initializer: receives the shared candidate state once per worker."""
+    global _shared_state
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Spawned workers start with a fresh interpreter.
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
+        django.setup()
+    _shared_state = shared_state
+
+
+def _restrictions_key(user_profile):
+    return frozenset(user_profile.get('restrictions', []))
+
+
+def _build_content_indexes(user_profiles, restaurants_data):
+    """
+    Builds, for each distinct set of restrictions among the users, the rows of the candidates
+    that pass them and a content index over those candidates (None if there are none).
+
+    Returns:
+        dict: {frozenset_of_restrictions: (eligible_rows, content_index)}.
+    """
+    indexes = {}
+    for profile in user_profiles:
+        key = _restrictions_key(profile)
+        if key in indexes:
+            continue
+        is_eligible = restriction_check(profile)
+        if is_eligible is None:
+            rows = np.arange(len(restaurants_data))
+        else:
+            rows = np.flatnonzero(np.fromiter((is_eligible(r) for r in restaurants_data), dtype=bool,
+                                              count=len(restaurants_data)))
+        indexes[key] = (rows, build_content_index([restaurants_data[i] for i in rows]) if len(rows) else None)
+    return indexes
+
+
+def _recommend_for_user(user_profile, shared_state):
+    """Scores all shared candidates for one user and returns (user_id, top_k recommendations)."""
+    user_id = user_profile['uid']
+    all_place_ids = shared_state['place_ids']
+
+    # 0. The same pre-filter as get_hybrid_recommendations: only the candidates that pass the
+    # user's restrictions are ranked, with a content index built over them alone.
+    rows, content_index = shared_state['content_indexes'][_restrictions_key(user_profile)]
+    eligible = np.zeros(len(all_place_ids), dtype=bool)
+    eligible[rows] = True
+    place_ids = [all_place_ids[i] for i in rows]
+
+    # 1. Content-based scores from the shared TF-IDF and category matrices.
+    content_scores = score_content_based(user_profile, content_index) if content_index is not None else np.zeros(0)
+
+    # 2. Collaborative scores from the shared favourites index.
+    target_user_favorites = {
+        fav['place_id'] for fav in user_profile.get('favourites', []) if isinstance(fav, dict) and 'place_id' in fav
+    }
+    collab_map, _ = score_collaborative(user_id, target_user_favorites, place_ids, shared_state['all_user_favorites'],
+                                        favourites_index=shared_state['favourites_index'])
+    collab_scores = np.array([collab_map.get(pid, 0.0) for pid in place_ids])
+
+    # 3. Weighted hybrid score.
+    hybrid_scores = (content_scores * HYBRID_WEIGHTS['content']) + (collab_scores * HYBRID_WEIGHTS['collab'])
+    final_scores = hybrid_scores
+
+    # 4. Optional RL re-ranking, one batched forward pass per user.
+    if shared_state['use_rl'] and len(rows):
+        states = shared_state['rl_features'][rows]
+        states[:, 2] = hybrid_scores # The hybrid score is the only user-dependent feature
+        rl_agent = DQNAgent(state_size=STATE_SIZE, action_size=ACTION_SIZE, user_id=user_id)
+        final_scores = hybrid_scores + (rl_agent.get_q_values_batch(states)[:, 0] * RL_SCORE_WEIGHT)
+
+    top_k = shared_state['top_k']
+    order = np.argsort(-final_scores, kind='stable')[:top_k]
+    recommendations = [
+        {
+            'place_id': place_ids[i],
+            'final_score': float(hybrid_scores[i]),
+            'final_score_with_rl': float(final_scores[i]),
+        }
+        for i in order
+    ]
+    if shared_state['restricted'] == 'append':
+        # Unscored and flagged, after every eligible restaurant, as in get_hybrid_recommendations.
+        for i in np.flatnonzero(~eligible)[:top_k - len(recommendations)]:
+            recommendations.append({'place_id': all_place_ids[i], 'restricted': True})
+    return user_id, recommendations
+
+
+def _recommend_chunk(user_profiles):
+    return [_recommend_for_user(profile, _shared_state) for profile in user_profiles]
+
+
+def get_batch_hybrid_recommendations(user_profiles, restaurants_data, top_k=20, workers=None,
+                                     use_rl=False, all_user_favorites=None, restricted=None):
+    """
+    Generates hybrid recommendations for many users against one shared candidate set.
+
+    Args:
+        user_profiles (list): User profile dictionaries (uid, preferences, restrictions, favourites).
+                              Every profile needs its own uid, which keys its results.
+        restaurants_data (list): The shared candidate restaurant dictionaries.
+        top_k (int): Number of recommendations to keep per user.
+        workers (int): Number of worker processes. None uses all cores, 1 runs in-process.
+        use_rl (bool): Whether to re-rank with each user's DQN agent (one model load per user).
+        all_user_favorites (dict): Optional {user_id: set_of_place_ids}; fetched from Firestore if omitted.
+        restricted (str): 'append' the candidates failing a user's restrictions unscored after the
+                          ranked ones, or 'drop' them. Defaults to settings.RESTRICTED_CANDIDATES.
+
+    Returns:
+        dict: {'results': {user_id: [recommendations]}, 'users': n, 'elapsed_seconds': t,
+               'users_per_second': throughput}.
+
+    Raises:
+        ValueError: If restricted is invalid, or a profile has no uid or the uid of another profile.
+    """
+    print(f"[BATCH] START: {len(user_profiles)} users against {len(restaurants_data)} restaurants...")
+    start = time.perf_counter()
+    restricted = restricted or getattr(settings, 'RESTRICTED_CANDIDATES', 'append')
+    if restricted not in ('append', 'drop'):
+        raise ValueError(f"restricted must be 'append' or 'drop', got {restricted!r}")
+    uids = [profile.get('uid') if isinstance(profile, dict) else None for profile in user_profiles]
+    if not all(isinstance(uid, str) and uid for uid in uids):
+        raise ValueError('every user profile needs a uid')
+    if len(set(uids)) != len(uids):
+        raise ValueError('user profiles must have distinct uids')
+    restaurants_data = [r for r in restaurants_data if r.get('place_id')]
+    if not user_profiles or not restaurants_data:
+        return {'results': {}, 'users': 0, 'elapsed_seconds': 0.0, 'users_per_second': 0.0}
+
+    # --- Shared, user-independent state (built once) ---
+    if all_user_favorites is None:
+        all_user_favorites = _get_all_user_favorites()
+    shared_state = {
+        'place_ids': [r['place_id'] for r in restaurants_data],
+        'content_indexes': _build_content_indexes(user_profiles, restaurants_data),
+        'all_user_favorites': all_user_favorites,
+        'favourites_index': build_favourites_index(all_user_favorites),
+        'rl_features': build_rl_feature_matrix(restaurants_data, CATEGORY_KEYS) if use_rl else None,
+        'use_rl': use_rl,
+        'top_k': top_k,
+        'restricted': restricted,
+    }
+    print(f"[BATCH] Shared state built in {time.perf_counter() - start:.2f}s.")
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(user_profiles))
+    results = {}
+    if workers <= 1:
+        for profile in user_profiles:
+            user_id, recommendations = _recommend_for_user(profile, shared_state)
+            results[user_id] = recommendations
+    else:
+        # A few chunks per worker keeps the pool balanced without per-user IPC overhead.
+        chunk_size = max(1, math.ceil(len(user_profiles) / (workers * 4)))
+        chunks = [user_profiles[i:i + chunk_size] for i in range(0, len(user_profiles), chunk_size)]
+        # TensorFlow and the Firestore client are not fork-safe, so RL workers are spawned.
+        context = multiprocessing.get_context('spawn') if use_rl else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(shared_state,)) as executor:
+            for chunk_results in executor.map(_recommend_chunk, chunks):
+                results.update(chunk_results)
+
+    elapsed = time.perf_counter() - start
+    users_per_second = len(user_profiles) / elapsed if elapsed > 0 else 0.0
+    print(f"[BATCH] END: {len(results)} users in {elapsed:.2f}s ({users_per_second:.1f} users/sec, {workers} workers).")
+    return {
+        'results': results,
+        'users': len(results),
+        'elapsed_seconds': elapsed,
+        'users_per_second': users_per_second,
+    }
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+# ========================== # # The catalog keeps the enriched restaurant dictionaries produced by
+# === Restaurant Catalog === # # get_nearby_recommend_restaurants_logic, keyed by place_id, so that
+# ========================== # # clients can refer to restaurants by ID instead of re-uploading them.
+
+class RestaurantCatalog:
+    """
+    A thread-safe, size-bounded, in-process store of enriched restaurants keyed by place_id.
+    Least recently used entries are evicted first and entries older than ttl_seconds are ignored.
+    """
+    def __init__(self, max_entries=20000, ttl_seconds=6 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # place_id -> (stored_at, restaurant dict)
+        self._lock = threading.Lock()
+
+    def put_many(self, restaurants):
+        """Stores (or refreshes) a list of restaurant dictionaries. Returns the number stored."""
+        now = time.time()
+        stored = 0
+        with self._lock:
+            for restaurant in restaurants:
+                place_id = restaurant.get('place_id')
+                if not place_id:
+                    continue
+                self._entries[place_id] = (now, restaurant)
+                self._entries.move_to_end(place_id)
+                stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return stored
+
+    def get_many(self, place_ids, max_age=None):
+        """
+        Resolves a list of place_ids in one pass.
+
+        Args:
+            place_ids (list): The place_ids to look up.
+            max_age (float): Also treat entries stored longer ago than this (seconds) as missing.
+
+        Returns:
+            tuple: (found, missing) where found maps place_id to a shallow copy of the
+                   stored restaurant and missing lists the IDs that are unknown or expired.
+        """
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for place_id in place_ids:
+                entry = self._entries.get(place_id)
+                if entry is None or now - entry[0] > self.ttl_seconds:
+                    if entry is not None:
+                        del self._entries[place_id]
+                    missing.append(place_id)
+                    continue
+                if max_age is not None and now - entry[0] > max_age:
+                    missing.append(place_id)
+                    continue
+                self._entries.move_to_end(place_id)
+                # Copy so that scorers adding keys (score, final_score, ...) never touch the stored object.
+                found[place_id] = dict(entry[1])
+        return found, missing
+
+    def get(self, place_id):
+        found, _ = self.get_many([place_id])
+        return found.get(place_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared catalog instance for this worker process.
+restaurant_catalog = RestaurantCatalog(
+    max_entries=getattr(settings, 'RESTAURANT_CATALOG_MAX_ENTRIES', 20000),
+    ttl_seconds=getattr(settings, 'RESTAURANT_CATALOG_TTL_SECONDS', 6 * 60 * 60),
+)
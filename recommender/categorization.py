@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .constants import CATEGORY_DICT
+
+# ====================== # # get_final_categories fuzzy-matches every word of a place's name, vicinity and
+# === Category Cache === # # reviews, on every fetch. Its result is kept per place_id and hash of those inputs,
+# ====================== # # with a hash of CATEGORY_DICT, and recomputed only when either of them changes.
+
+def dictionary_version(category_dict):
+    """A short hash of a category dictionary."""
+    return hashlib.blake2b(json.dumps(category_dict, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+
+# Changes whenever CATEGORY_DICT is edited, which invalidates every cached entry.
+CATEGORY_DICT_VERSION = dictionary_version(CATEGORY_DICT)
+
+
+def categorization_inputs(details, keyword):
+    """
+    Extracts the fields get_final_categories reads, as a details-shaped dictionary.
+    Categorizing this gives the same result as categorizing the full details.
+    """
+    return {
+        'name': details.get('name', ''),
+        'vicinity': details.get('vicinity', ''),
+        'description': details.get('description', ''),
+        'types': list(details.get('types', [])),
+        'reviews': [{'text': r.get('text', '')} for r in details.get('reviews', [])],
+        'keyword': keyword or '',
+    }
+
+
+def inputs_hash(inputs):
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class CategoryCache:
+    """
+    Categories per (place_id, inputs hash), in the CategoryCacheEntry table with a bounded
+    in-process LRU in front, so the same place found by different keywords keeps one entry per
+    keyword. Storing an entry deletes the place's entries for the same keyword with other inputs,
+    which the new ones supersede. An entry is used only if its dictionary version matches; anything
+    else is recomputed and stored. If the table cannot be used, categories are computed every time.
+    """
+    def __init__(self, max_memory_entries=20000):
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()  # (place_id, inputs hash) -> (dictionary version, categories)
+        self._lock = threading.Lock()
+
+    def _remember(self, key, categories):
+        with self._lock:
+            self._memory[key] = (CATEGORY_DICT_VERSION, categories)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_categories(self, place_id, details, keyword, compute):
+        """
+        Returns the categories of a place, computing them only if its inputs changed.
+
+        Args:
+            place_id (str): The place.
+            details (dict): The Place Details result.
+            keyword (str): The search keyword, which also adds categories.
+            compute (callable): compute(inputs, keyword) -> list of categories, i.e. get_final_categories.
+
+        Returns:
+            list: The categories.
+        """
+        from .models import CategoryCacheEntry
+
+        inputs = categorization_inputs(details, keyword)
+        digest = inputs_hash(inputs)
+        key = (place_id, digest)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == CATEGORY_DICT_VERSION:
+                self._memory.move_to_end(key)
+                return list(entry[1])
+
+        try:
+            stored = CategoryCacheEntry.objects.filter(
+                place_id=place_id, inputs_hash=digest, dictionary_version=CATEGORY_DICT_VERSION
+            ).values_list('categories', flat=True).first()
+        except Exception as e:
+            print(f"[CATEGORY CACHE] ERROR: Lookup failed, categorizing without the cache: {e}", file=sys.stderr)
+            return compute(inputs, keyword)
+        if stored is not None:
+            self._remember(key, stored)
+            return list(stored)
+
+        categories = compute(inputs, keyword)
+        try:
+            with transaction.atomic():
+                CategoryCacheEntry.objects.filter(place_id=place_id, inputs__keyword=inputs['keyword']) \
+                    .exclude(inputs_hash=digest).delete()
+                CategoryCacheEntry.objects.update_or_create(place_id=place_id, inputs_hash=digest, defaults={
+                    'dictionary_version': CATEGORY_DICT_VERSION, 'inputs': inputs, 'categories': categories,
+                })
+        except Exception as e:
+            print(f"[CATEGORY CACHE] ERROR: Could not store the categories of {place_id}: {e}", file=sys.stderr)
+        self._remember(key, categories)
+        return list(categories)
+
+
+def recategorize_entries(compute, recompute_all=False, batch_size=500):
+    """
+    Recomputes stored entries from their saved inputs, e.g. after CATEGORY_DICT was edited.
+
+    Args:
+        compute (callable): compute(inputs, keyword) -> list of categories.
+        recompute_all (bool): Also recompute entries already at the current dictionary version.
+        batch_size (int): Rows read and written per query.
+
+    Returns:
+        tuple: (entries recomputed, entries whose categories changed).
+    """
+    from .models import CategoryCacheEntry
+
+    queryset = CategoryCacheEntry.objects.all()
+    if not recompute_all:
+        queryset = queryset.exclude(dictionary_version=CATEGORY_DICT_VERSION)
+
+    recomputed = changed = 0
+    # Keyset pagination by primary key rather than offsets, since updated rows drop out of the queryset.
+    last_pk = 0
+    while True:
+        entries = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not entries:
+            break
+        now = timezone.now()
+        for entry in entries:
+            categories = compute(entry.inputs, entry.inputs.get('keyword', ''))
+            if sorted(categories) != sorted(entry.categories):
+                changed += 1
+            entry.categories = categories
+            entry.inputs_hash = inputs_hash(entry.inputs)
+            entry.dictionary_version = CATEGORY_DICT_VERSION
+            entry.updated_at = now
+        CategoryCacheEntry.objects.bulk_update(entries, ['categories', 'inputs_hash', 'dictionary_version', 'updated_at'])
+        recomputed += len(entries)
+        last_pk = entries[-1].pk
+    return recomputed, changed
+
+
+# Shared cache of this worker process.
+category_cache = CategoryCache(max_memory_entries=getattr(settings, 'CATEGORY_CACHE_MEMORY_ENTRIES', 20000))
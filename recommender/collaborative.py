@@ -1,10 +1,7 @@
-from surprise import Dataset, Reader
-from surprise import SVD
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pandas as pd
-from collections import defaultdict
 from django.conf import settings
+from collections import defaultdict
+from .storage import get_store
+from .favourites_snapshot import favourites_snapshot
 import os
 import json
 
@@ -12,62 +9,94 @@ import json
 # === Collaborative Filtering === # # It is based on the idea that if two users agree on one issue, they are likely to agree on others as well.
 # =============================== # # predicting what a particular user might like based on other users’ ratings
 
-# Initialize Firebase Admin SDK only if it hasn't been initialized yet.
-# This prevents errors during hot-reloading in Django's development server.
-if not firebase_admin._apps:
-    cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
-    firebase_admin.initialize_app(cred)
-else:
-    # Fallback for environments where the key might be configured differently
-    # For example, using environment variables on a server
-    if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
-            firebase_admin.initialize_app()
-    else:
-        print("WARNING: Firebase credentials not found. Collaborative filtering may not work.")
-
 
 def _get_all_user_favorites():
     """
-    Fetches the 'favourite_restaurants' list for all users from Firestore.
+    Fetches the favourite place_ids of all users from the configured store (Firestore by default).
     Returns a dictionary of {user_id: {set_of_favorite_place_ids}}.
     """
-    db = firestore.client()
-    print(f"  [COLLAB] INFO: Connected to Firebase project: {db.project}")
-    
-    users_ref = db.collection('users')
-    all_favorites = {}
-    doc_count = 0
-    
-    for doc in users_ref.stream():
-        doc_count += 1
-        user_data = doc.to_dict()
-        user_id_from_doc = user_data.get('uid', doc.id)
-
-        if 'favourites' in user_data:
-            favorites_list = user_data.get('favourites', [])
-            if favorites_list:
-                place_ids = {
-                    fav['place_id'] for fav in favorites_list if isinstance(fav, dict) and 'place_id' in fav
-                }
-                if place_ids:
-                    all_favorites[user_id_from_doc] = place_ids
-
-    if doc_count == 0:
-        print("  [COLLAB] CRITICAL: No documents found in the 'users' collection.")
-        
-    print(f"  [COLLAB] INFO: Found favorites for {len(all_favorites)} out of {doc_count} users.")
-    return all_favorites
-
-def _calculate_jaccard_similarity(set1, set2):
+    return get_store().get_all_favourites()
+
+def build_favourites_index(all_user_favorites):
+    """
+    Builds an inverted index {place_id: [user positions]} over all users' favorites.
+    Only users sharing at least one favorite have a non-zero Jaccard similarity, so the
+    index lets score_collaborative skip every other user. It can be shared across requests.
+
+    Returns:
+        dict: {'favorites': all_user_favorites, 'user_ids': [...], 'by_place': {...}}
+    """
+    user_ids = list(all_user_favorites.keys())
+    by_place = defaultdict(list)
+    for position, user_id in enumerate(user_ids):
+        for place_id in all_user_favorites[user_id]:
+            by_place[place_id].append(position)
+    return {'favorites': all_user_favorites, 'user_ids': user_ids, 'by_place': dict(by_place)}
+
+def score_collaborative(target_user_id, target_user_favorites, candidate_ids, all_user_favorites,
+                        max_neighbors=50, favourites_index=None):
     """
-    Calculates the Jaccard similarity between two sets.
+    Scores candidate place_ids for one user from the favorites of the most similar users.
+
+    Args:
+        target_user_id (str): The user being scored (excluded from the neighbors).
+        target_user_favorites (set): The user's favorite place_ids.
+        candidate_ids (list): The place_ids to score.
+        all_user_favorites (dict): {user_id: set_of_favorite_place_ids} for all users.
+        max_neighbors (int): How many of the most similar users to aggregate.
+        favourites_index (dict): Optional prebuilt build_favourites_index(all_user_favorites).
+
+    Returns:
+        tuple: ({place_id: normalized_score}, {neighbor_id: similarity}).
     """
-    intersection = len(set1.intersection(set2))
-    union = len(set1.union(set2))
-    return intersection / union if union != 0 else 0
+    if not target_user_favorites:
+        return {place_id: 0.0 for place_id in candidate_ids}, {}
+
+    if favourites_index is None:
+        favourites_index = build_favourites_index(all_user_favorites)
+    user_ids = favourites_index['user_ids']
+
+    # --- 1. Find Similar Users ---
+    # Count shared favorites only for users that have at least one in common.
+    shared_counts = defaultdict(int)
+    for place_id in target_user_favorites:
+        for position in favourites_index['by_place'].get(place_id, ()):
+            shared_counts[position] += 1
+
+    similarities = []
+    for position, intersection in shared_counts.items():
+        other_user_id = user_ids[position]
+        if target_user_id == other_user_id:
+            continue
+        union = len(target_user_favorites) + len(all_user_favorites[other_user_id]) - intersection
+        similarities.append((position, intersection / union))
+
+    # Ties keep the users' original order, as with a full scan.
+    similarities.sort(key=lambda x: (-x[1], x[0]))
+    top_neighbors = {user_ids[position]: similarity for position, similarity in similarities[:max_neighbors]}
+
+    if not top_neighbors:
+        return {place_id: 0.0 for place_id in candidate_ids}, top_neighbors
+
+    # --- 2. Aggregate Recommendations from Neighbors ---
+    neighbor_likes = defaultdict(float)
+    for neighbor_id, similarity_score in top_neighbors.items():
+        for place_id in all_user_favorites.get(neighbor_id, set()):
+            # We only care about items the target user hasn't already favorited
+            if place_id not in target_user_favorites:
+                neighbor_likes[place_id] += similarity_score
+
+    max_possible_score = sum(top_neighbors.values())
+    scores = {
+        place_id: (neighbor_likes.get(place_id, 0.0) / max_possible_score if max_possible_score > 0 else 0)
+        for place_id in candidate_ids
+    }
+    return scores, top_neighbors
 
 def _save_collab_log(log_data):
     """Saves collaborative filtering data to a JSON file for debugging."""
+    if not getattr(settings, 'RECOMMENDER_DEBUG_LOGS', True):
+        return
     try:
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         log_dir = os.path.join(base_dir, 'assets', 'restaurant_data')
@@ -112,49 +141,34 @@ def get_collaborative_filtering_recommendations(user_profile, restaurants_data):
                 recommendations.append(r_copy)
         return recommendations
 
-    # Get ALL user favorites from the database to find neighbors
-    all_user_favorites = _get_all_user_favorites()
-
-    # --- 1. Find Similar Users ---
-    similarities = []
-    for other_user_id, other_user_favorites in all_user_favorites.items():
-        if target_user_id == other_user_id:
-            continue
-        similarity = _calculate_jaccard_similarity(target_user_favorites, other_user_favorites)
-        if similarity > 0:
-            similarities.append((other_user_id, similarity))
-    
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    top_neighbors = dict(similarities[:50])
+    candidate_ids = [r.get('place_id') for r in restaurants_data if r.get('place_id')]
+    scored = None
+    if getattr(settings, 'FAVOURITES_SNAPSHOT_ENABLED', False):
+        # The memory-mapped snapshot shared by all workers; None if the refresher has not written a recent one.
+        scored = favourites_snapshot.score(target_user_id, target_user_favorites, candidate_ids,
+                                           max_age=getattr(settings, 'FAVOURITES_SNAPSHOT_MAX_AGE', 3600))
+        if scored is None:
+            print("  [COLLAB] WARNING: No recent favourites snapshot, reading favourites from the store.")
+    if scored is None:
+        # Get ALL user favorites from the database to find neighbors
+        all_user_favorites = _get_all_user_favorites()
+        scored = score_collaborative(target_user_id, target_user_favorites, candidate_ids, all_user_favorites)
+    scores, top_neighbors = scored
 
     if not top_neighbors:
         print("  [COLLAB] WARNING: No similar users found. Returning 0 scores.")
-        for r in restaurants_data:
-            if r.get('place_id'):
-                r_copy = r.copy()
-                r_copy['score'] = 0.0
-                recommendations.append(r_copy)
-        return recommendations
-
-    # --- 2. Aggregate Recommendations from Neighbors ---
-    neighbor_likes = defaultdict(list)
-    for neighbor_id, similarity_score in top_neighbors.items():
-        for place_id in all_user_favorites.get(neighbor_id, set()):
-            # We only care about items the target user hasn't already favorited
-            if place_id not in target_user_favorites:
-                neighbor_likes[place_id].append(similarity_score)
 
     # --- 3. Score the candidate restaurants ---
-    max_possible_score = sum(top_neighbors.values())
     for r in restaurants_data:
         place_id = r.get('place_id')
         if place_id:
             r_copy = r.copy()
-            raw_score = sum(neighbor_likes.get(place_id, []))
-            normalized_score = raw_score / max_possible_score if max_possible_score > 0 else 0
-            r_copy['score'] = normalized_score
+            r_copy['score'] = scores.get(place_id, 0.0)
             recommendations.append(r_copy)
 
+    if not top_neighbors:
+        return recommendations
+
     print(f"  [COLLAB] END: Returning {len(recommendations)} scored items.")
     # Save a more detailed log object for better debugging.
     _save_collab_log({
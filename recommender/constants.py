@@ -29,4 +29,8 @@ CATEGORY_DICT = {
 CATEGORY_KEYS = sorted(list(CATEGORY_DICT.keys()))
 
 # Types of places to exclude from Google Maps results.
-EXCLUDED_TYPES = ['gas_station', 'lodging', 'convenience_store', 'car_repair', 'car_wash', 'parking']
\ No newline at end of file
+EXCLUDED_TYPES = ['gas_station', 'lodging', 'convenience_store', 'car_repair', 'car_wash', 'parking']
+
+# Feedback actions sent by the app, their index in the RL agent's action space and their rewards.
+FEEDBACK_ACTION_INDEX = {'like': 0, 'dislike': 1, 'click_details': 2, 'skip': 3}
+FEEDBACK_REWARDS = {'like': 1.0, 'dislike': -1.0, 'click_details': 0.5, 'skip': -0.2}
@@ -1,7 +1,6 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from firebase_admin import firestore
+from django.conf import settings
+from .constants import CATEGORY_KEYS
+from .feature_store import NUMERIC_INDEX, gather_features, masks_to_matrix
 import math
 import json
 import os
@@ -9,6 +8,8 @@ import numpy as np
 
 def _save_content_log(log_data):
     """Saves content-based data to a JSON file for debugging."""
+    if not getattr(settings, 'RECOMMENDER_DEBUG_LOGS', True):
+        return
     try:
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         log_dir = os.path.join(base_dir, 'assets', 'restaurant_data')
@@ -35,32 +36,22 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
     return R * c  # Distance in kilometers
 
-# ===== Function to Get Content-Based Recommendations ===== #
-def get_content_based_recommendations(user_profile, restaurants_data):
+# ===== Shared Content Index ===== #
+def build_content_index(restaurants_data):
     """
-    Generates personalized recommendations based on user profile and a list of restaurants.
-    
+    Builds the user-independent part of content-based filtering for a candidate list:
+    the preprocessed DataFrame, the TF-IDF matrix and a one-hot category matrix.
+    The index can be reused to score any number of users against the same candidates.
+
     Args:
-        user_profile (dict): The user's profile data sent from the client.
-        restaurants_data (list): A list of restaurant dictionaries from the Flutter app.
+        restaurants_data (list): A list of restaurant dictionaries.
 
     Returns:
-        list: A sorted list of recommended restaurant dictionaries, with scores.
+        dict: The content index (see score_content_based).
     """
-    print("  [CONTENT] START: Content-based filtering...")
-    if not restaurants_data:
-        return []
-
-    # --- Use User Profile from arguments ---
-    user_preferences = set(user_profile.get("preferences", []))
-    user_restrictions = set(user_profile.get("restrictions", []))
-    print(f"  [CONTENT] User Preferences: {user_preferences}")  # <-- ADDED PRINT
-    print(f"  [CONTENT] User Restrictions: {user_restrictions}")  # <-- ADDED PRINT
-    
-    favourites_list = user_profile.get("favourites", [])
-    user_favourite_restaurants = {
-        fav['place_id'] for fav in favourites_list if isinstance(fav, dict) and 'place_id' in fav
-    }
+    # pandas and scikit-learn are imported on first use to keep worker startup light.
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
 
     # Convert incoming restaurant list to a DataFrame
     content_df = pd.DataFrame(restaurants_data)
@@ -77,57 +68,126 @@ def get_content_based_recommendations(user_profile, restaurants_data):
         content_df['editorial_summary'].fillna("N/A")
     )
 
-    # --- TF-IDF Similarity to User's Favorites ---
+    # --- TF-IDF Matrix ---
     tfidf_vectorizer = TfidfVectorizer(stop_words='english')
     content_matrix = tfidf_vectorizer.fit_transform(content_df['Processed_Content'])
-    
-    favorite_indices = content_df[content_df['place_id'].isin(user_favourite_restaurants)].index
-    tfidf_scores = [0] * len(content_df)
-    if not favorite_indices.empty:
+
+    # --- One-hot Category Matrix and Ratings ---
+    # Restaurants ingested by this server are gathered from the feature store by place_id;
+    # the others (e.g. sent by the client) are encoded from their dictionaries.
+    numeric, masks, found = gather_features(restaurants_data)
+    missing_rows = np.flatnonzero(~found)
+    category_sets = {row: set(content_df.at[row, 'categories']) for row in missing_rows}
+    extra_categories = sorted(set().union(*category_sets.values()) - set(CATEGORY_KEYS)) if category_sets else []
+    category_columns = {cat: i for i, cat in enumerate(CATEGORY_KEYS + extra_categories)}
+    category_matrix = np.zeros((len(content_df), len(category_columns)), dtype=np.float32)
+    category_matrix[found, :len(CATEGORY_KEYS)] = masks_to_matrix(masks[found])
+    for row, cats in category_sets.items():
+        for cat in cats:
+            category_matrix[row, category_columns[cat]] = 1.0
+
+    ratings = np.where(found, numeric[:, NUMERIC_INDEX['rating']], content_df['rating'].astype(float).to_numpy())
+    ratings = np.where(np.isnan(ratings), content_df['rating'].median(), ratings)
+
+    return {
+        'df': content_df,
+        'tfidf_matrix': content_matrix,
+        'place_ids': content_df['place_id'].tolist(),
+        'category_columns': category_columns,
+        'category_matrix': category_matrix,
+        'ratings': ratings,
+    }
+
+def score_content_based(user_profile, content_index):
+    """
+    Scores every restaurant in a content index for one user.
+
+    Args:
+        user_profile (dict): The user's profile data sent from the client.
+        content_index (dict): The output of build_content_index.
+
+    Returns:
+        numpy.ndarray: One content-based score per restaurant, in index order.
+    """
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    user_preferences = set(user_profile.get("preferences", []))
+    user_restrictions = set(user_profile.get("restrictions", []))
+    favourites_list = user_profile.get("favourites", [])
+    user_favourite_restaurants = {
+        fav['place_id'] for fav in favourites_list if isinstance(fav, dict) and 'place_id' in fav
+    }
+
+    content_matrix = content_index['tfidf_matrix']
+    category_columns = content_index['category_columns']
+    category_matrix = content_index['category_matrix']
+    num_restaurants = category_matrix.shape[0]
+
+    # --- TF-IDF Similarity to User's Favorites ---
+    favorite_indices = [i for i, pid in enumerate(content_index['place_ids']) if pid in user_favourite_restaurants]
+    tfidf_scores = np.zeros(num_restaurants)
+    if favorite_indices:
         user_profile_vector = content_matrix[favorite_indices].mean(axis=0)
         # CORRECTED: Convert the numpy.matrix to a numpy.ndarray before calculating similarity
         user_profile_vector_array = np.asarray(user_profile_vector)
         tfidf_scores = cosine_similarity(user_profile_vector_array, content_matrix).flatten()
 
-    # --- Scoring Loop ---
+    # 1. Restriction Check (Requirement Logic)
+    # A restaurant MUST have ALL the categories listed in user_restrictions.
+    # A restriction that no restaurant carries can never be satisfied.
+    if all(cat in category_columns for cat in user_restrictions):
+        restriction_cols = [category_columns[cat] for cat in user_restrictions]
+        meets_restrictions = category_matrix[:, restriction_cols].sum(axis=1) == len(restriction_cols)
+    else:
+        meets_restrictions = np.zeros(num_restaurants, dtype=bool)
+
+    # 2. Preference Score
+    # How many of the restaurant's categories match the user's preferences?
+    preference_scores = np.zeros(num_restaurants)
+    if user_preferences:
+        preference_cols = [category_columns[cat] for cat in user_preferences if cat in category_columns]
+        preference_scores = category_matrix[:, preference_cols].sum(axis=1) / len(user_preferences)
+
+    # 3. Rating Score (Normalized 0-1)
+    rating_scores = content_index['ratings'] / 5.0
+
+    # 4. Final Weighted Score
+    # Weights are dynamic. If tfidf_score is 0, its weight is given to preference_score.
+    has_tfidf_score = tfidf_scores > 0
+    w_tfidf = np.where(has_tfidf_score, 0.4, 0.0)
+    w_preference = np.where(has_tfidf_score, 0.4, 0.8) # Becomes more important if no favorites are nearby
+    w_rating = 0.2
+
+    final_scores = (w_tfidf * tfidf_scores) + (w_preference * preference_scores) + (w_rating * rating_scores)
+    # If it doesn't meet the requirements, its score is 0.
+    return np.where(meets_restrictions, final_scores, 0.0)
+
+# ===== Function to Get Content-Based Recommendations ===== #
+def get_content_based_recommendations(user_profile, restaurants_data):
+    """
+    Generates personalized recommendations based on user profile and a list of restaurants.
+    
+    Args:
+        user_profile (dict): The user's profile data sent from the client.
+        restaurants_data (list): A list of restaurant dictionaries from the Flutter app.
+
+    Returns:
+        list: A sorted list of recommended restaurant dictionaries, with scores.
+    """
+    print("  [CONTENT] START: Content-based filtering...")
+    if not restaurants_data:
+        return []
+
+    print(f"  [CONTENT] User Preferences: {set(user_profile.get('preferences', []))}")  # <-- ADDED PRINT
+    print(f"  [CONTENT] User Restrictions: {set(user_profile.get('restrictions', []))}")  # <-- ADDED PRINT
+
+    content_index = build_content_index(restaurants_data)
+    scores = score_content_based(user_profile, content_index)
+
+    # --- Attach scores ---
     all_recommendations = []
-    for idx, rec in content_df.iterrows():
-        rec_categories = set(rec['categories'])
-
-        # 1. Restriction Check (Requirement Logic)
-        # A restaurant MUST have ALL the categories listed in user_restrictions.
-        # If it doesn't meet the requirements, its score is 0.
-        if not user_restrictions.issubset(rec_categories):
-            final_score = 0.0
-        else:
-            # 2. Preference Score
-            # How many of the restaurant's categories match the user's preferences?
-            preference_score = 0
-            if user_preferences:
-                preference_score = len(user_preferences.intersection(rec_categories)) / len(user_preferences)
-
-            # 3. Rating Score (Normalized 0-1)
-            rating_score = rec.get('rating', 0) / 5.0
-
-            # 4. TF-IDF Score (Similarity to favorites)
-            tfidf_score = tfidf_scores[idx]
-
-            # 5. Final Weighted Score
-            # Weights are now dynamic. If tfidf_score is 0, its weight is given to preference_score.
-            has_tfidf_score = tfidf_score > 0
-            
-            w_tfidf = 0.4 if has_tfidf_score else 0.0
-            w_preference = 0.4 if has_tfidf_score else 0.8 # Becomes more important if no favorites are nearby
-            w_rating = 0.2
-
-            final_score = (
-                (w_tfidf * tfidf_score) +
-                (w_preference * preference_score) +
-                (w_rating * rating_score)
-            )
-
-        rec_data = rec.to_dict()
-        rec_data['score'] = final_score
+    for rec_data, final_score in zip(content_index['df'].to_dict('records'), scores):
+        rec_data['score'] = float(final_score)
         all_recommendations.append(rec_data)
 
     # Save log BEFORE sorting to see the raw scores
@@ -136,5 +196,3 @@ def get_content_based_recommendations(user_profile, restaurants_data):
     # Return the scored and sorted recommendations
     print(f"  [CONTENT] END: Returning {len(all_recommendations)} scored recommendations.") # <-- ADDED PRINT
     return sorted(all_recommendations, key=lambda x: x['score'], reverse=True)
-
-
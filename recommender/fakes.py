@@ -0,0 +1,289 @@
+"""
+Local stand-ins for the Google Maps and Firestore clients, for load tests and benchmarks.
+
+They serve synthetic data (see synthetic.py) through the same methods the recommender calls
+on googlemaps.Client and firestore.Client, and sleep for a latency drawn from a log-normal
+distribution on every call, so the endpoints can be exercised without the network.
+"""
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+import zlib
+from googlemaps.exceptions import ApiError
+from .synthetic import DEFAULT_CENTER, make_restaurants
+
+
+class LatencyModel:
+    """Log-normal latency with the given median (ms). sigma controls the tail: 0.5 gives p99 ~ 3.2x median."""
+    def __init__(self, median_ms, sigma=0.5, seed=0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.median_ms / 1000.0), self.sigma)
+
+    def wait(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+
+# --- Google Maps ---
+def place_details_result(r):
+    """Converts a synthetic restaurant to a Place Details 'result' in the Google Maps API format."""
+    details = {
+        'place_id': r['place_id'], 'name': r['name'], 'rating': r['rating'],
+        'user_ratings_total': r['user_ratings_total'],
+        'formatted_address': r['address'], 'vicinity': r['address'],
+        'geometry': {'location': {'lat': r['latitude'], 'lng': r['longitude']}},
+        'website': r['website'], 'formatted_phone_number': r['phone_number'],
+        'opening_hours': {'open_now': r['opening_status'], 'weekday_text': r['opening_hours']},
+        'reviews': [
+            {'author_name': rv['author'], 'rating': rv['rating'], 'text': rv['text'],
+             'relative_time_description': rv['relative_time']}
+            for rv in r['reviews']
+        ],
+        'photos': [{'photo_reference': ref} for ref in r['photos']],
+        'url': r['url'], 'editorial_summary': {'overview': r['editorial_summary']},
+        'types': r['types'], 'delivery': r['delivery'], 'takeout': r['takeout'],
+        'business_status': r['business_status'],
+    }
+    if r['price_level'] != 'N/A':
+        details['price_level'] = r['price_level']
+    return details
+
+
+def fake_photo_png(photo_reference, width):
+    """A solid-colour 4:3 PNG whose colour depends on the photo reference, standing in for a Place Photo."""
+    height = max(1, width * 3 // 4)
+    rgb = hashlib.sha256(photo_reference.encode('utf-8')).digest()[:3]
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    rows = (b'\x00' + rgb * width) * height  # filter byte 0 per row
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+
+class FakeGoogleMapsClient:
+    """
+    Implements places_nearby (with next_page_token pagination, 20 results per page), place
+    (Place Details) and places_photo over a set of synthetic restaurants, returning responses in
+    the Places API format. Photos are generated PNGs of the requested width.
+
+    Throttling can be injected to exercise the rate limiter: quota_qps makes calls beyond that many
+    per second fail with OVER_QUERY_LIMIT, over_query_limit_rate fails that fraction of calls at random,
+    and page tokens are rejected with INVALID_REQUEST until page_token_delay seconds after they were issued.
+    """
+    PAGE_SIZE = 20
+    FIELD_KEYS = {'photo': 'photos', 'type': 'types'}
+
+    def __init__(self, restaurants=None, latency=None, max_pages=3, quota_qps=None, over_query_limit_rate=0.0,
+                 page_token_delay=0.0, seed=0):
+        self.restaurants = restaurants if restaurants is not None else make_restaurants(500)
+        self.latency = latency or LatencyModel(median_ms=150)
+        self.max_pages = max_pages
+        self.quota_qps = quota_qps
+        self.over_query_limit_rate = over_query_limit_rate
+        self.page_token_delay = page_token_delay
+        self._rng = random.Random(seed)
+        self._by_id = {r['place_id']: r for r in self.restaurants}
+        self._photo_references = {ref for r in self.restaurants for ref in r['photos']}
+        self._pages = {}  # next_page_token -> (active from, remaining results)
+        self._window = (0, 0)  # (second, calls in it) for quota_qps
+        self._lock = threading.Lock()
+        self.calls = {'places_nearby': 0, 'place': 0, 'places_photo': 0, 'over_query_limit': 0,
+                      'place_response_bytes': 0, 'photo_bytes': 0}
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            second = int(time.monotonic())
+            calls_this_second = self._window[1] + 1 if self._window[0] == second else 1
+            self._window = (second, calls_this_second)
+            throttled = ((self.quota_qps is not None and calls_this_second > self.quota_qps)
+                         or self._rng.random() < self.over_query_limit_rate)
+            if throttled:
+                self.calls['over_query_limit'] += 1
+        if throttled:
+            raise ApiError('OVER_QUERY_LIMIT', 'You have exceeded your rate-limit for this API.')
+
+    def places_nearby(self, location=None, radius=None, keyword=None, type=None, page_token=None, **kwargs):
+        self._count('places_nearby')
+        self.latency.wait()
+        if page_token:
+            with self._lock:
+                active_from, remaining = self._pages.get(page_token, (None, None))
+                if remaining is None or time.monotonic() < active_from:
+                    raise ApiError('INVALID_REQUEST')
+                del self._pages[page_token]
+        else:
+            lat, lon = location or DEFAULT_CENTER
+            # Nearest first, like a prominence-ranked search over a small area.
+            remaining = sorted(self.restaurants,
+                               key=lambda r: (r['latitude'] - lat) ** 2 + (r['longitude'] - lon) ** 2)
+            if keyword:
+                matching = [r for r in remaining if keyword.lower() in ' '.join(r['categories'] + [r['name'].lower()])]
+                remaining = matching or remaining
+            remaining = remaining[:self.PAGE_SIZE * self.max_pages]
+
+        page, remaining = remaining[:self.PAGE_SIZE], remaining[self.PAGE_SIZE:]
+        response = {'status': 'OK', 'results': [self._nearby_result(r) for r in page]}
+        if remaining:
+            token = f"fake_page_token_{random.getrandbits(64):x}"
+            with self._lock:
+                self._pages[token] = (time.monotonic() + self.page_token_delay, remaining)
+            response['next_page_token'] = token
+        return response
+
+    def place(self, place_id, fields=None, **kwargs):
+        self._count('place')
+        self.latency.wait()
+        restaurant = self._by_id.get(place_id)
+        if restaurant is None:
+            raise ApiError('NOT_FOUND')
+        result = place_details_result(restaurant)
+        if fields:
+            # Request fields are singular where the response keys are plural.
+            keys = {self.FIELD_KEYS.get(field, field) for field in fields}
+            result = {key: value for key, value in result.items() if key in keys}
+        with self._lock:
+            self.calls['place_response_bytes'] += len(json.dumps(result))
+        return {'status': 'OK', 'result': result}
+
+    def places_photo(self, photo_reference, max_width=None, max_height=None):
+        if not (max_width or max_height):
+            raise ValueError("a max_width or max_height arg is required")
+        self._count('places_photo')
+        self.latency.wait()
+        if photo_reference not in self._photo_references:
+            # Like Google, an unknown reference is answered with an error page rather than an exception.
+            return iter([b'<html><body>Bad Request</body></html>'])
+        data = fake_photo_png(photo_reference, min(1600, max_width or max_height * 4 // 3))
+        with self._lock:
+            self.calls['photo_bytes'] += len(data)
+        # Streamed in chunks, like response.iter_content().
+        return (data[i:i + 8192] for i in range(0, len(data), 8192))
+
+    def _nearby_result(self, r):
+        return {
+            'place_id': r['place_id'], 'name': r['name'], 'types': r['types'],
+            'business_status': r['business_status'], 'vicinity': r['address'],
+        }
+
+
+# --- Firestore ---
+class _FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _FakeDocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    def get(self):
+        self._client.latency.wait()
+        return self._client._snapshot(self.collection_name, self.id)
+
+    def set(self, data, merge=False):
+        self._client.latency.wait()
+        self._client._set(self.collection_name, self.id, data, merge)
+
+
+class _FakeCollection:
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+
+    def document(self, doc_id):
+        return _FakeDocumentReference(self._client, self.name, doc_id)
+
+    def stream(self):
+        self._client.latency.wait()
+        with self._client._lock:
+            docs = list(self._client._data.get(self.name, {}).items())
+        for doc_id, data in docs:
+            yield _FakeSnapshot(doc_id, dict(data))
+
+
+class _FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref.collection_name, ref.id, data, merge))
+
+    def commit(self):
+        self._client.latency.wait()
+        for collection, doc_id, data, merge in self._writes:
+            self._client._set(collection, doc_id, data, merge)
+        self._writes = []
+
+
+class FakeFirestoreClient:
+    """
+    An in-memory Firestore with the subset of the client API used by FirestoreStore:
+    collection().document()/stream(), get_all() and batch(). Each call waits one latency sample.
+    """
+    project = 'fake-project'
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel(median_ms=30)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def with_favourites(cls, favourites_by_user, restaurants_by_id=None, **kwargs):
+        """Builds a client whose 'users' collection holds the given {user_id: place_ids} favourites."""
+        client = cls(**kwargs)
+        restaurants_by_id = restaurants_by_id or {}
+        for user_id, place_ids in favourites_by_user.items():
+            client._set('users', user_id, {
+                'uid': user_id,
+                # The app stores the full restaurant objects.
+                'favourites': [restaurants_by_id.get(pid, {'place_id': pid}) for pid in place_ids],
+            })
+        return client
+
+    def _snapshot(self, collection, doc_id):
+        with self._lock:
+            data = self._data.get(collection, {}).get(doc_id)
+        return _FakeSnapshot(doc_id, dict(data) if data is not None else None)
+
+    def _set(self, collection, doc_id, data, merge=False):
+        with self._lock:
+            documents = self._data.setdefault(collection, {})
+            # merge=True updates only the given top-level fields, as in Firestore.
+            documents[doc_id] = dict(documents.get(doc_id, {}), **data) if merge else dict(data)
+
+    def collection(self, name):
+        return _FakeCollection(self, name)
+
+    def get_all(self, refs):
+        self.latency.wait()
+        for ref in refs:
+            yield self._snapshot(ref.collection_name, ref.id)
+
+    def batch(self):
+        return _FakeWriteBatch(self)
@@ -0,0 +1,194 @@
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+# =============================== # # Every user's favourites as one read-only snapshot on disk, in compressed sparse
+# === Favourites CSR Snapshot === # # row form with integer place IDs. One refresher writes it; every worker process
+# =============================== # # memory-maps the same files, so the host holds one copy however many workers run.
+
+CURRENT_POINTER = 'CURRENT'
+KEEP_SNAPSHOTS = 2
+
+
+def _encode(strings):
+    return np.array([s.encode('utf-8') for s in strings], dtype=bytes)
+
+
+def write_favourites_snapshot(all_user_favorites, directory):
+    """
+    Writes {user_id: set_of_place_ids} as a new snapshot and publishes it atomically.
+
+    Files of a snapshot (a subdirectory, named in the CURRENT file once complete):
+        user_ids.npy      - sorted user IDs (bytes); a user's row is its position
+        place_ids.npy     - sorted place IDs (bytes); the interned integer ID of a place is its position
+        offsets.npy       - int64, n_users + 1: user i's favourites are indices[offsets[i]:offsets[i + 1]]
+        indices.npy       - int32 place IDs, sorted within each user
+        place_offsets.npy - int64, n_places + 1: the transpose, place -> users
+        place_users.npy   - int32 user rows
+
+    Returns:
+        str: The path of the new snapshot.
+    """
+    user_ids = sorted(user_id for user_id, place_ids in all_user_favorites.items() if place_ids)
+    place_ids = sorted({place_id for user_id in user_ids for place_id in all_user_favorites[user_id]})
+    encoded_places = _encode(place_ids)
+
+    counts = np.array([len(all_user_favorites[user_id]) for user_id in user_ids], dtype=np.int64)
+    offsets = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    flat = _encode([place_id for user_id in user_ids for place_id in all_user_favorites[user_id]])
+    indices = np.searchsorted(encoded_places, flat).astype(np.int32) if len(flat) else np.empty(0, dtype=np.int32)
+    rows = np.repeat(np.arange(len(user_ids), dtype=np.int32), counts)
+    # Rows are already in user order; sort each user's places.
+    order = np.lexsort((indices, rows))
+    indices, rows = indices[order], rows[order]
+
+    # The transpose, for finding the users who share a favourite.
+    place_users = rows[np.argsort(indices, kind='stable')]
+    place_offsets = np.zeros(len(place_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=len(place_ids)), out=place_offsets[1:])
+
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot_{time.time_ns()}_{os.getpid()}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    for file_name, array in (('user_ids', _encode(user_ids)), ('place_ids', encoded_places), ('offsets', offsets),
+                             ('indices', indices), ('place_offsets', place_offsets), ('place_users', place_users)):
+        np.save(os.path.join(path, f"{file_name}.npy"), array)
+
+    tmp_pointer = os.path.join(directory, f"{CURRENT_POINTER}.{os.getpid()}.tmp")
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(tmp_pointer, os.path.join(directory, CURRENT_POINTER))
+
+    # Workers still reading an older snapshot keep their maps; unlinked files stay readable until unmapped.
+    older = sorted(entry.name for entry in os.scandir(directory) if entry.is_dir() and entry.name.startswith('snapshot_'))
+    for old_name in older[:-KEEP_SNAPSHOTS]:
+        if old_name != name:
+            shutil.rmtree(os.path.join(directory, old_name), ignore_errors=True)
+    print(f"[FAVOURITES SNAPSHOT] Wrote {name}: {len(user_ids)} users, {len(place_ids)} places, {len(indices)} favourites.")
+    return path
+
+
+class FavouritesSnapshot:
+    """
+    Read-only view of the current snapshot in `directory`, reopened when the refresher publishes a
+    new one. All arrays are memory-mapped; only the scoring temporaries are per request.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pointer_stamp = None
+        self._arrays = None
+        self._published_at = None
+
+    def _refresh(self):
+        """
+        Caller holds the lock. The pointer's stamp is only recorded once its snapshot is open: if
+        opening fails, the previous snapshot (if any) is kept and the next call tries again.
+        """
+        pointer = os.path.join(self.directory, CURRENT_POINTER)
+        try:
+            stat = os.stat(pointer)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._pointer_stamp:
+            return
+        arrays, published_at = None, None
+        if stamp is not None:
+            try:
+                with open(pointer, encoding='utf-8') as f:
+                    path = os.path.join(self.directory, f.read().strip())
+                arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                          for name in ('user_ids', 'place_ids', 'offsets', 'indices', 'place_offsets', 'place_users')}
+                published_at = stat.st_mtime
+            except (OSError, ValueError) as e:
+                print(f"[FAVOURITES SNAPSHOT] ERROR: Could not open the snapshot: {e}")
+                return
+        self._arrays, self._published_at, self._pointer_stamp = arrays, published_at, stamp
+
+    def current(self, max_age=None):
+        """Returns the snapshot's arrays, or None if there is none (or it is older than max_age seconds)."""
+        with self._lock:
+            self._refresh()
+            arrays, published_at = self._arrays, self._published_at
+        if arrays is None or (max_age is not None and time.time() - published_at > max_age):
+            return None
+        return arrays
+
+    def score(self, target_user_id, target_user_favorites, candidate_ids, max_neighbors=50, max_age=None):
+        """
+        score_collaborative on the snapshot: Jaccard similarity to every user sharing a favourite,
+        then the top neighbours' favourites weighted by similarity, all on integer arrays.
+
+        Returns:
+            tuple: ({place_id: normalized_score}, {neighbor_id: similarity}), or None if there is no usable snapshot.
+        """
+        arrays = self.current(max_age)
+        if arrays is None:
+            return None
+        zero_scores = {place_id: 0.0 for place_id in candidate_ids}
+        if not target_user_favorites:
+            return zero_scores, {}
+
+        user_ids, place_ids = arrays['user_ids'], arrays['place_ids']
+        offsets, indices = arrays['offsets'], arrays['indices']
+        place_offsets, place_users = arrays['place_offsets'], arrays['place_users']
+
+        # --- 1. Find Similar Users ---
+        targets = _lookup(place_ids, list(target_user_favorites))
+        targets = targets[targets >= 0]
+        if len(targets) == 0:
+            return zero_scores, {}
+        sharing = np.concatenate([place_users[place_offsets[p]:place_offsets[p + 1]] for p in targets])
+        neighbours, intersections = np.unique(sharing, return_counts=True)
+        self_row = _lookup(user_ids, [target_user_id])[0]
+        keep = neighbours != self_row
+        neighbours, intersections = neighbours[keep], intersections[keep]
+        if len(neighbours) == 0:
+            return zero_scores, {}
+        unions = len(target_user_favorites) + (offsets[neighbours + 1] - offsets[neighbours]) - intersections
+        similarities = intersections / unions
+        # Highest similarity first; ties by user row.
+        top = np.lexsort((neighbours, -similarities))[:max_neighbors]
+        neighbours, similarities = neighbours[top], similarities[top]
+        top_neighbors = {user_ids[row].decode('utf-8'): float(sim) for row, sim in zip(neighbours, similarities)}
+
+        # --- 2. Aggregate Recommendations from Neighbors ---
+        liked = np.concatenate([indices[offsets[row]:offsets[row + 1]] for row in neighbours])
+        weights = np.repeat(similarities, offsets[neighbours + 1] - offsets[neighbours])
+        not_own = ~np.isin(liked, targets)
+        places, inverse = np.unique(liked[not_own], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights[not_own], minlength=len(places))
+
+        max_possible_score = float(similarities.sum())
+        candidates = _lookup(place_ids, candidate_ids)
+        positions = np.searchsorted(places, candidates)
+        scores = {}
+        for place_id, candidate, position in zip(candidate_ids, candidates, positions):
+            found = candidate >= 0 and position < len(places) and places[position] == candidate
+            scores[place_id] = float(totals[position]) / max_possible_score if found and max_possible_score > 0 else 0.0
+        return scores, top_neighbors
+
+    def nbytes(self):
+        """Size of the mapped arrays, i.e. the memory the host shares between workers."""
+        arrays = self.current()
+        return sum(array.nbytes for array in arrays.values()) if arrays else 0
+
+
+def _lookup(sorted_ids, ids):
+    """Positions of ids in a sorted bytes array, -1 for those not in it."""
+    if len(sorted_ids) == 0 or not ids:
+        return np.full(len(ids), -1, dtype=np.int64)
+    encoded = _encode(ids)
+    positions = np.minimum(np.searchsorted(sorted_ids, encoded), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == encoded, positions, -1)
+
+
+# Shared reader of this worker process.
+favourites_snapshot = FavouritesSnapshot(
+    getattr(settings, 'FAVOURITES_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'favourites_snapshot')))
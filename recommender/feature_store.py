@@ -0,0 +1,319 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from .constants import CATEGORY_KEYS
+
+try:
+    import fcntl # Cross-process write lock (not available on Windows)
+except ImportError:
+    fcntl = None
+
+# ============================== # # Numeric features and a category bitmask for every ingested restaurant, written
+# === Columnar Feature Store === # # once into fixed-width NumPy arrays on disk and memory-mapped read-only by
+# ============================== # # every worker process, so scorers gather rows by place_id without parsing dicts.
+
+# Column order of the numeric array. Missing values are stored as NaN.
+NUMERIC_COLUMNS = ('rating', 'price_level', 'user_ratings_total')
+NUMERIC_INDEX = {name: i for i, name in enumerate(NUMERIC_COLUMNS)}
+
+# Key add_many stamps on each restaurant dictionary it stores: a hash of the row's stored features.
+# A dictionary carrying its row's current version is known to hold the stored values.
+FEATURE_VERSION_KEY = 'feature_version'
+# Dictionary keys the stored features are encoded from.
+FEATURE_KEYS = NUMERIC_COLUMNS + ('categories',)
+# Bumped when the files change; stores in an older format are discarded.
+STORE_FORMAT = 2
+
+# Bit i of a category mask is set when the restaurant has CATEGORY_KEYS[i].
+assert len(CATEGORY_KEYS) <= 32, "category masks are uint32; widen categories.u32 before adding more categories"
+CATEGORY_BITS = {cat: 1 << i for i, cat in enumerate(CATEGORY_KEYS)}
+
+
+def category_mask(categories):
+    """Encodes a list of category names as a bitmask over CATEGORY_KEYS (unknown names are ignored)."""
+    mask = 0
+    for cat in categories or []:
+        mask |= CATEGORY_BITS.get(cat, 0)
+    return mask
+
+
+def masks_to_matrix(masks, num_categories=len(CATEGORY_KEYS)):
+    """Expands an array of category bitmasks to a (n, num_categories) one-hot float32 matrix."""
+    masks = np.asarray(masks, dtype=np.uint32)
+    return ((masks[:, None] >> np.arange(num_categories, dtype=np.uint32)) & 1).astype(np.float32)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _row_version(numeric_row, mask):
+    """Hash of a stored row (its float32 values and category mask), as a uint32."""
+    digest = hashlib.blake2b(np.asarray(numeric_row, dtype=np.float32).tobytes() + int(mask).to_bytes(4, 'little'),
+                             digest_size=4).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class RestaurantFeatureStore:
+    """
+    Append-only columnar store of restaurant features, indexed by place_id.
+
+    Files in `directory`:
+        numeric.f32    - float32 array of shape (capacity, len(NUMERIC_COLUMNS))
+        categories.u32 - uint32 category bitmask per row
+        versions.u32   - uint32 hash of each row's features (see FEATURE_VERSION_KEY)
+        place_ids.txt  - the place_id of each row, one per line, appended as rows are added
+        index.json     - {"count": rows, "capacity": n, "generation": id, "category_keys": [...], "format": n}
+
+    Rows are written in place. index.json is only rewritten when rows are added or the files
+    grow; readers notice that by its modification time, read the new lines of place_ids.txt
+    and reopen their memory maps only if the files grew.
+    """
+    def __init__(self, directory, initial_capacity=4096):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._index_stamp = None
+        self._row_of = {}
+        self._ids_offset = 0  # Bytes of place_ids.txt already read into _row_of
+        self._generation = None
+        self._capacity = 0
+        self._numeric = None
+        self._categories = None
+        self._versions = None
+
+    # --- Paths ---
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_index(self):
+        try:
+            with open(self._path('index.json'), encoding='utf-8') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        # A change to CATEGORY_DICT changes the meaning of the bits, so the store is discarded
+        # (as is an index written in an older layout).
+        if index.get('category_keys') != CATEGORY_KEYS or index.get('format') != STORE_FORMAT:
+            return None
+        return index
+
+    def _write_index(self, count, capacity, generation):
+        tmp_path = self._path(f'index.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'count': count, 'capacity': capacity, 'generation': generation,
+                       'category_keys': CATEGORY_KEYS, 'format': STORE_FORMAT}, f)
+        os.replace(tmp_path, self._path('index.json'))
+
+    # --- Reading ---
+    def _refresh(self):
+        """Reopens the memory maps if another process (or thread) has written new rows."""
+        try:
+            stat = os.stat(self._path('index.json'))
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._index_stamp:
+            return
+        index = self._read_index() if stamp else None
+        if index is None or not index['count']:
+            self._row_of, self._ids_offset, self._generation = {}, 0, None
+            self._capacity, self._numeric, self._categories, self._versions = 0, None, None, None
+        else:
+            if index['generation'] != self._generation:
+                # The store was discarded and rebuilt since we last read it, with new files.
+                self._row_of, self._ids_offset, self._generation = {}, 0, index['generation']
+                self._numeric = None
+            capacity = index['capacity']
+            if capacity != self._capacity or self._numeric is None:
+                self._numeric = np.memmap(self._path('numeric.f32'), dtype=np.float32, mode='r',
+                                          shape=(capacity, len(NUMERIC_COLUMNS)))
+                self._categories = np.memmap(self._path('categories.u32'), dtype=np.uint32, mode='r', shape=(capacity,))
+                self._versions = np.memmap(self._path('versions.u32'), dtype=np.uint32, mode='r', shape=(capacity,))
+                self._capacity = capacity
+            self._read_new_place_ids(index['count'])
+        self._index_stamp = stamp
+
+    def _read_new_place_ids(self, count):
+        """Reads the lines of place_ids.txt added since the last read, up to `count` rows."""
+        with open(self._path('place_ids.txt'), 'rb') as f:
+            f.seek(self._ids_offset)
+            while len(self._row_of) < count:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # Not fully written yet
+                self._row_of[line[:-1].decode('utf-8')] = len(self._row_of)
+                self._ids_offset += len(line)
+
+    def gather(self, place_ids):
+        """
+        Gathers the stored features for a list of place_ids.
+
+        Returns:
+            tuple: (numeric, masks, found, versions) where numeric is a (n, len(NUMERIC_COLUMNS))
+                   float32 array, masks a (n,) uint32 array of category bitmasks, found a boolean
+                   array marking the place_ids that are in the store (other rows are NaN/0) and
+                   versions a (n,) uint32 array of the rows' feature versions.
+        """
+        with self._lock:
+            self._refresh()
+            rows = np.array([self._row_of.get(pid, -1) for pid in place_ids], dtype=np.int64)
+            found = rows >= 0
+            numeric = np.full((len(place_ids), len(NUMERIC_COLUMNS)), np.nan, dtype=np.float32)
+            masks = np.zeros(len(place_ids), dtype=np.uint32)
+            versions = np.zeros(len(place_ids), dtype=np.uint32)
+            if found.any():
+                numeric[found] = self._numeric[rows[found]]
+                masks[found] = self._categories[rows[found]]
+                versions[found] = self._versions[rows[found]]
+        return numeric, masks, found, versions
+
+    # --- Writing ---
+    def add_many(self, restaurants):
+        """
+        Writes (or overwrites) the features of a list of enriched restaurants, and stamps each
+        dictionary with its row's FEATURE_VERSION_KEY. Returns rows written.
+        """
+        restaurants = [r for r in restaurants if r.get('place_id')]
+        if not restaurants:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path('write.lock'), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            index = self._read_index()
+            if index is None:
+                # New (or discarded) store: start a new generation with no rows.
+                generation, capacity = os.urandom(8).hex(), 0
+                open(self._path('place_ids.txt'), 'wb').close()
+            else:
+                generation, capacity = index['generation'], index['capacity']
+            # Catch up on the rows other processes added; only the new lines of place_ids.txt are read.
+            self._refresh()
+            row_of = dict(self._row_of) if index is not None else {}
+            new_ids = []
+            for r in restaurants:
+                if r['place_id'] not in row_of:
+                    row_of[r['place_id']] = len(row_of)
+                    new_ids.append(r['place_id'])
+
+            old_capacity = capacity
+            if len(row_of) > capacity:
+                capacity = self._grow(capacity, max(self.initial_capacity, capacity * 2, len(row_of)))
+
+            numeric = np.memmap(self._path('numeric.f32'), dtype=np.float32, mode='r+',
+                                shape=(capacity, len(NUMERIC_COLUMNS)))
+            categories = np.memmap(self._path('categories.u32'), dtype=np.uint32, mode='r+', shape=(capacity,))
+            versions = np.memmap(self._path('versions.u32'), dtype=np.uint32, mode='r+', shape=(capacity,))
+            for r in restaurants:
+                row = row_of[r['place_id']]
+                values = np.array([_to_float(r.get(name)) for name in NUMERIC_COLUMNS], dtype=np.float32)
+                mask = category_mask(r.get('categories'))
+                version = _row_version(values, mask)
+                numeric[row] = values
+                categories[row] = mask
+                versions[row] = version
+                r[FEATURE_VERSION_KEY] = version
+            numeric.flush()
+            categories.flush()
+            versions.flush()
+            del numeric, categories, versions
+
+            # Rows written in place are already visible through the shared maps; readers only
+            # need to be told about new rows and grown files.
+            if new_ids:
+                with open(self._path('place_ids.txt'), 'ab') as f:
+                    f.write(''.join(f"{place_id}\n" for place_id in new_ids).encode('utf-8'))
+            if new_ids or capacity != old_capacity:
+                self._write_index(len(row_of), capacity, generation)
+        return len(restaurants)
+
+    def _grow(self, old_capacity, new_capacity):
+        """Copies the arrays into larger files and swaps them in atomically."""
+        for name, dtype, width in (('numeric.f32', np.float32, len(NUMERIC_COLUMNS)), ('categories.u32', np.uint32, None),
+                                   ('versions.u32', np.uint32, None)):
+            shape = (new_capacity, width) if width else (new_capacity,)
+            tmp_path = self._path(f'{name}.{os.getpid()}.tmp')
+            grown = np.memmap(tmp_path, dtype=dtype, mode='w+', shape=shape)
+            if old_capacity and os.path.exists(self._path(name)):
+                old_shape = (old_capacity, width) if width else (old_capacity,)
+                grown[:old_capacity] = np.memmap(self._path(name), dtype=dtype, mode='r', shape=old_shape)
+            grown.flush()
+            del grown
+            os.replace(tmp_path, self._path(name))
+        return new_capacity
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    """Returns this process's feature store, or None if it is disabled in settings."""
+    global _feature_store
+    if not getattr(settings, 'FEATURE_STORE_ENABLED', True):
+        return None
+    with _feature_store_lock:
+        if _feature_store is None:
+            directory = getattr(settings, 'FEATURE_STORE_DIR', os.path.join(settings.BASE_DIR, 'feature_store'))
+            _feature_store = RestaurantFeatureStore(directory)
+    return _feature_store
+
+
+def from_client(restaurants):
+    """
+    Drops FEATURE_VERSION_KEY from restaurant dictionaries sent by a client: a client may echo
+    a version back with edited features, so its dictionaries are always encoded from their data.
+    """
+    if not isinstance(restaurants, list):
+        return restaurants
+    return [{k: v for k, v in r.items() if k != FEATURE_VERSION_KEY} if isinstance(r, dict) and FEATURE_VERSION_KEY in r else r
+            for r in restaurants]
+
+
+def _uses_stored_features(restaurant, version):
+    """
+    True if the stored row can stand in for the dictionary: it carries the row's current version
+    (it was stamped by add_many and not re-stamped since), or it carries no features at all.
+    Other dictionaries (e.g. built by the client, or stamped before the row was rewritten) are
+    encoded from their own data, without parsing any of it here.
+    """
+    stamped = restaurant.get(FEATURE_VERSION_KEY)
+    if stamped is not None:
+        return stamped == version
+    return not any(key in restaurant for key in FEATURE_KEYS)
+
+
+def gather_features(restaurants):
+    """
+    Gathers stored features for a list of restaurant dictionaries.
+    Returns (numeric, masks, found) as RestaurantFeatureStore.gather, with found all False
+    when the store is disabled or unavailable. Rows are only used for dictionaries that carry
+    their current FEATURE_VERSION_KEY (or no features at all); the others are reported as not
+    found, so callers encode them from the dictionary.
+    """
+    place_ids = [r.get('place_id') for r in restaurants]
+    store = get_feature_store()
+    if store is not None:
+        try:
+            numeric, masks, found, versions = store.gather(place_ids)
+            for row in np.flatnonzero(found):
+                found[row] = _uses_stored_features(restaurants[row], int(versions[row]))
+            return numeric, masks, found
+        except Exception as e:
+            print(f"  [FEATURES] ERROR: Failed to read the feature store: {e}")
+    return (np.full((len(place_ids), len(NUMERIC_COLUMNS)), np.nan, dtype=np.float32),
+            np.zeros(len(place_ids), dtype=np.uint32),
+            np.zeros(len(place_ids), dtype=bool))
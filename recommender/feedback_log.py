@@ -0,0 +1,143 @@
+import atexit
+import threading
+from collections import deque
+import time
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .constants import FEEDBACK_ACTION_INDEX, FEEDBACK_REWARDS
+
+# ============================ # # Feedback events are buffered in process and written to UserFeedback with
+# === Write-Behind Feedback === # # bulk_create by a background thread, when the buffer reaches a batch size or
+# ============================ # # a time limit, so record_feedback never waits for a database insert.
+
+
+class FeedbackBuffer:
+    """
+    Buffers UserFeedback rows and flushes them in batches of `batch_size`, or every
+    `flush_interval` seconds, whichever comes first. Pending rows are also flushed at exit.
+    """
+    def __init__(self, batch_size=100, flush_interval=5.0, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque(maxlen=max_pending)  # Full, it drops the oldest event on append
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, user_id, restaurant_id, action, score_at_recommendation=0.0, ranker='', trained=False):
+        """
+        Queues one feedback event. Returns immediately; the row is written later.
+        `trained` marks an event the caller trains the ranker on itself, so the retraining job skips it.
+        """
+        from .models import UserFeedback
+
+        try:
+            score = float(score_at_recommendation)
+        except (ValueError, TypeError):
+            score = 0.0
+        event = UserFeedback(
+            user_id=user_id,
+            restaurant_id=restaurant_id,
+            action=action,
+            score_at_recommendation=score,
+            timestamp=timezone.now(),
+            ranker=ranker,
+            trained=trained,
+        )
+        with self._condition:
+            self._ensure_thread()
+            if len(self._pending) >= self.max_pending:
+                # The database is unreachable for a while; keep the most recent events.
+                print("  [FEEDBACK LOG] WARNING: Buffer full, dropping the oldest event.")
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self):
+        """Writes all pending events with bulk_create. Returns the number of rows written."""
+        from .models import UserFeedback
+
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = list(self._pending), deque(maxlen=self.max_pending)
+            if not batch:
+                return 0
+            try:
+                UserFeedback.objects.bulk_create(batch, batch_size=500)
+                return len(batch)
+            except Exception as e:
+                print(f"  [FEEDBACK LOG] ERROR: Failed to write {len(batch)} events, will retry. Error: {e}")
+                with self._condition:
+                    self._pending = deque(batch + list(self._pending), maxlen=self.max_pending)
+                return 0
+
+    def _ensure_thread(self):
+        # Called with self._condition held.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='feedback-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            self.flush()
+            # This thread keeps its own database connection; drop it if it has gone stale.
+            close_old_connections()
+
+
+feedback_buffer = FeedbackBuffer(
+    batch_size=getattr(settings, 'FEEDBACK_FLUSH_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'FEEDBACK_FLUSH_INTERVAL_SECONDS', 5.0),
+)
+atexit.register(feedback_buffer.flush)
+
+
+def export_user_history(user_id, since=None, limit=1000, flush=True):
+    """
+    Exports a user's most recent feedback events as compact, column-oriented arrays
+    for training and analytics. Pending events are flushed first, unless flush is False.
+
+    Args:
+        user_id (str): The user.
+        since (datetime): Only return events at or after this time.
+        limit (int): Maximum number of (most recent) events.
+        flush (bool): Whether to write the buffered events before reading.
+
+    Returns:
+        dict: Arrays in chronological order: 'restaurant_ids' (str), 'actions' (int8 action index,
+              see FEEDBACK_ACTION_INDEX), 'rewards' (float32), 'scores' (float32, score at
+              recommendation) and 'timestamps' (float64 UNIX seconds).
+    """
+    from .models import UserFeedback
+
+    if flush:
+        feedback_buffer.flush()
+    queryset = UserFeedback.objects.filter(user_id=user_id)
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    # Served by the (user_id, timestamp) index.
+    rows = list(queryset.order_by('-timestamp').values_list(
+        'restaurant_id', 'action', 'score_at_recommendation', 'timestamp')[:limit])
+    rows.reverse()
+
+    return {
+        'user_id': user_id,
+        'restaurant_ids': np.array([r[0] for r in rows], dtype=str),
+        'actions': np.array([FEEDBACK_ACTION_INDEX.get(r[1], -1) for r in rows], dtype=np.int8),
+        'rewards': np.array([FEEDBACK_REWARDS.get(r[1], 0.0) for r in rows], dtype=np.float32),
+        'scores': np.array([r[2] for r in rows], dtype=np.float32),
+        'timestamps': np.array([r[3].timestamp() for r in rows], dtype=np.float64),
+    }
@@ -0,0 +1,39 @@
+import os
+import threading
+from django.conf import settings
+
+# Firebase is initialized on first use instead of at import time, so requests that never
+# touch Firestore (e.g. get_restaurants_api) do not pay for it.
+_init_lock = threading.Lock()
+
+
+def initialize_firebase():
+    """
+    Initializes the Firebase Admin SDK once per process.
+    Uses the service account key from settings.FIREBASE_CREDENTIALS when it exists and
+    falls back to GOOGLE_APPLICATION_CREDENTIALS (application default credentials).
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _init_lock:
+        # Already initialized, e.g. during hot-reloading in Django's development server.
+        if firebase_admin._apps:
+            return
+        if os.path.exists(settings.FIREBASE_CREDENTIALS):
+            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
+            firebase_admin.initialize_app(cred)
+        elif os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
+            # Fallback for environments where the key is configured differently,
+            # for example using environment variables on a server.
+            firebase_admin.initialize_app()
+        else:
+            print("WARNING: Firebase credentials not found. Collaborative filtering may not work.")
+
+
+def get_firestore_client():
+    """Returns a Firestore client, initializing Firebase on first use."""
+    from firebase_admin import firestore
+
+    initialize_firebase()
+    return firestore.client()
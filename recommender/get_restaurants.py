@@ -6,10 +6,22 @@ from fuzzywuzzy import process
 from dotenv import load_dotenv
 import sys # For stderr printing
 import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.http import JsonResponse, HttpRequest
 from django.views.decorators.http import require_GET
 from .constants import CATEGORY_DICT, EXCLUDED_TYPES # Import from constants
+from .catalog import restaurant_catalog
+from .feature_store import get_feature_store
+from .rate_limit import make_places_scheduler
+from .spatial import restaurant_spatial_index
+from .photos import PhotoNotFound, image_content_type
+from .categorization import category_cache
+from .profiling import current_job_profiles, run_profiled
 
 load_dotenv()  # take environment variables from .env.
 
@@ -19,7 +31,21 @@ load_dotenv()  # take environment variables from .env.
 
 # Google Maps API Key - IMPORTANT: Manage this securely, e.g., environment variable or Django settings
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+# OVER_QUERY_LIMIT is retried by places_scheduler, which also slows down on it.
+gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY, retry_over_query_limit=False)
+
+# Rate limits, retries and page-token polling for every Places call (see rate_limit.py).
+places_scheduler = make_places_scheduler()
+
+def set_gmaps_client(client):
+    """Replaces the Google Maps client, e.g. with a FakeGoogleMapsClient for load tests."""
+    global gmaps
+    gmaps = client
+
+def set_places_scheduler(scheduler):
+    """Replaces the Places call scheduler, e.g. with different budgets for load tests."""
+    global places_scheduler
+    places_scheduler = scheduler
 
 def save_to_json(data, base_filename="map_output", folder_name="../assets/restaurant_data"):
     if not os.path.exists(folder_name):
@@ -106,6 +132,10 @@ def get_final_categories(details, keyword, category_dict):
             final_categories.add(category)
     return list(final_categories)
 
+def categorize(details, keyword):
+    """get_final_categories with the shared CATEGORY_DICT."""
+    return get_final_categories(details, keyword, CATEGORY_DICT)
+
 def clean_text(text):
     if text:
         text = text.replace("–", "-")
@@ -113,141 +143,411 @@ def clean_text(text):
         text = re.sub(r'[^\x20-\x7E\n\r\t]', '', text) # Allow common whitespace
     return text
 
-def get_nearby_recommend_restaurants_logic(latitude, longitude, radius, keyword=""):
+# Place Details fields per level. 'basic' is what categorization and ranking need, including the
+# reviews get_final_categories scans, so both levels give a place the same categories (and the same
+# restriction filtering); 'full' adds the fields only shown on a restaurant's page (photos, opening
+# hours, contact details).
+DETAILS_FIELDS = {
+    'full': [
+        "name", "place_id", "rating", "user_ratings_total", "price_level",
+        "formatted_address", "vicinity", "geometry", "website", "formatted_phone_number",
+        "opening_hours", "reviews", "photo", "url", "editorial_summary", # Changed to 'photo' (singular)
+        "type", "delivery", "takeout", "business_status"  # Changed to 'type' (singular)
+    ],
+    'basic': [
+        "name", "place_id", "rating", "user_ratings_total", "price_level",
+        "formatted_address", "vicinity", "geometry", "reviews", "editorial_summary", "type", "business_status"
+    ],
+}
+
+def _list_details_level():
+    """Details level fetched for search results: 'basic' when PLACES_DETAILS_MODE is 'tiered'."""
+    return 'basic' if getattr(settings, 'PLACES_DETAILS_MODE', 'full') == 'tiered' else 'full'
+
+def _fetch_restaurant_details(place_id, name, keyword, fallback_address='N/A', level=None):
     """
-    Fetches nearby restaurants using Google Maps API and enriches the data.
-    Now accepts an optional keyword for searching.
+    Fetches the Place Details for a single place and builds the enriched restaurant dictionary.
+    Returns None if the place should be skipped (API error, empty details or no rating).
+    level ('basic' or 'full') selects the fields requested; it defaults to the list level.
     """
-    all_restaurants = []
-    
-    # Correctly format the location as a tuple for the Google Maps API call
-    location = (latitude, longitude)
-
+    level = level or _list_details_level()
+    details_response = {}
     try:
-        # Prepare parameters for the API call
-        api_params = {
-            'location': location,
-            'radius': radius,
-            'type': 'restaurant'
-        }
-        # Only add the keyword to the search if it's provided and not empty
-        if keyword:
-            api_params['keyword'] = keyword
-
-        # Initial search for restaurants using the prepared parameters
-        places_result = gmaps.places_nearby(**api_params)
-        
-        results = places_result.get('results', [])
-
-        # Google recommends a short delay before using next_page_token
-        # It's better to handle this more robustly in a production app (e.g., with retries)
-        while places_result.get('next_page_token'):
-            import time
-            time.sleep(2) 
-            places_result = gmaps.places_nearby(page_token=places_result['next_page_token'])
-            results.extend(places_result.get('results', []))
+        details_response = places_scheduler.call('place', gmaps.place, place_id=place_id, fields=DETAILS_FIELDS[level])
     except Exception as e:
-        print(f"Error during Google Maps API call (places_nearby): {e}", file=sys.stderr)
-        # Depending on the error, you might want to return an empty list or raise it
-        return []
+        print(f"Error during Google Maps API call (place details for {place_id}): {e}", file=sys.stderr)
+        return None # Skip this place if details can't be fetched
+
+    details = details_response.get('result', {})
+    name = name or details.get('name', 'N/A')
+
+    if not details:
+        print(f"Skipping '{name}' (Place ID: {place_id}) due to empty details response. API Response: {details_response}", file=sys.stderr)
+        return None
+
+    rating = details.get('rating', None)
+    if rating is None or rating == 'N/A': # Check for None explicitly
+        print(f"Excluding '{name}' (Place ID: {place_id}) due to missing or N/A rating (Rating: {rating}).", file=sys.stderr)
+        return None
+
+    # Consolidate address fetching
+    address = details.get('formatted_address', fallback_address)
+    phone_number = details.get('formatted_phone_number', 'N/A')
+    website = details.get('website', 'N/A')
+    user_ratings_total = details.get('user_ratings_total', 0) # Default to 0 if N/A
+    price_level = details.get('price_level', 'N/A') # Or a sensible default like 0 or -1
+    business_status_detail = details.get('business_status', 'OPERATIONAL') # Default to OPERATIONAL
+    types_detail = details.get('types', [])
+
+    geometry = details.get('geometry', {})
+    location_detail = geometry.get('location', {})
+    latitude = location_detail.get('lat', 'N/A')
+    longitude = location_detail.get('lng', 'N/A')
+
+    opening_hours_data = details.get('opening_hours', {})
+    opening_status = opening_hours_data.get('open_now', False) # Default to False
+    opening_hours_text = opening_hours_data.get('weekday_text', [])
+    cleaned_opening_hours = [clean_text(hour) for hour in opening_hours_text]
+
+    reviews_data = details.get('reviews', [])
+    formatted_reviews = []
+    for r_idx, r in enumerate(reviews_data[:3]): # Max 3 reviews
+        formatted_reviews.append({
+            "author": clean_text(r.get('author_name', f"Author {r_idx+1}")),
+            "rating": r.get('rating', 0),
+            "text": clean_text(r.get('text', "")),
+            "relative_time": r.get('relative_time_description', "")
+        })
+
+    photos_data = details.get('photos', [])
+    photo_references = [p.get('photo_reference') for p in photos_data[:3] if p.get('photo_reference')] # Max 3, ensure ref exists
 
+    url = details.get('url', 'N/A')
+    editorial_summary_data = details.get('editorial_summary', {})
+    editorial_summary = clean_text(editorial_summary_data.get('overview', 'N/A'))
 
+    delivery_val = details.get('delivery') # Check boolean directly
+    takeout_val = details.get('takeout')
+
+    # Ensure CATEGORY_DICT is accessible
+    if getattr(settings, 'CATEGORY_CACHE_ENABLED', True):
+        # Only recomputed when the place's name, vicinity, types, reviews or CATEGORY_DICT changed.
+        categories = category_cache.get_categories(place_id, details, keyword, categorize)
+    else:
+        categories = get_final_categories(details, keyword, CATEGORY_DICT)
+
+    return {
+        'place_id': place_id, 'name': clean_text(name), 'categories': categories,
+        'address': clean_text(address), 'latitude': latitude, 'longitude': longitude,
+        'rating': rating, 'user_ratings_total': user_ratings_total,
+        'price_level': price_level, 'editorial_summary': editorial_summary,
+        'reviews': formatted_reviews, 'photos': photo_references, 'url': url,
+        'phone_number': phone_number, 'website': website,
+        'opening_hours': cleaned_opening_hours, 'opening_status': opening_status,
+        'business_status': business_status_detail, 'types': types_detail,
+        'delivery': delivery_val if isinstance(delivery_val, bool) else 'N/A', # Handle boolean or N/A
+        'takeout': takeout_val if isinstance(takeout_val, bool) else 'N/A',  # Handle boolean or N/A
+        'details_level': level
+    }
+
+def _ingest_restaurants(restaurants):
+    """
+    Keeps freshly enriched restaurants server-side: in the catalog, so clients can refer
+    to them by place_id, in the spatial index, so radius queries can be answered locally,
+    and in the feature store, so scorers can gather their features.
+    """
+    restaurant_catalog.put_many(restaurants)
+    restaurant_spatial_index.add_restaurants(restaurants)
+    feature_store = get_feature_store()
+    if feature_store is not None:
+        try:
+            feature_store.add_many(restaurants)
+        except Exception as e:
+            print(f"Error writing to the feature store: {e}", file=sys.stderr)
+
+def _nearby_search_params(latitude, longitude, radius, keyword):
+    # Correctly format the location as a tuple for the Google Maps API call
+    api_params = {
+        'location': (latitude, longitude),
+        'radius': radius,
+        'type': 'restaurant'
+    }
+    # Only add the keyword to the search if it's provided and not empty
+    if keyword:
+        api_params['keyword'] = keyword
+    return api_params
+
+def _filter_places(results, keyword):
+    """Keeps the operational places that are not of an excluded type."""
     print(f"Total places found by Google API: {len(results)} for keyword: '{keyword}'", file=sys.stderr)
-    
+
+    all_restaurants = []
     for place in results:
         place_types = place.get('types', [])
         business_status = place.get('business_status', '').upper()
         # Ensure EXCLUDED_TYPES is accessible
         if not any(excluded_type in place_types for excluded_type in EXCLUDED_TYPES) and business_status == 'OPERATIONAL':
             all_restaurants.append(place)
-    
-    restaurant_data = []
-    for place in all_restaurants:
-        name = place.get('name', 'N/A')
-        place_id = place.get('place_id')
 
-        if not place_id:
-            print(f"Skipping '{name}' due to missing place_id.", file=sys.stderr)
+    places = []
+    for place in all_restaurants:
+        if not place.get('place_id'):
+            print(f"Skipping '{place.get('name', 'N/A')}' due to missing place_id.", file=sys.stderr)
             continue
-        
-        details_response = {}
-        try:
-            details_response = gmaps.place(place_id=place_id, fields=[
-                "name", "place_id", "rating", "user_ratings_total", "price_level",
-                "formatted_address", "vicinity", "geometry", "website", "formatted_phone_number",
-                "opening_hours", "reviews", "photo", "url", "editorial_summary", # Changed to 'photo' (singular)
-                "type", "delivery", "takeout", "business_status"  # Changed to 'type' (singular)
-            ])
-        except Exception as e:
-            print(f"Error during Google Maps API call (place details for {place_id}): {e}", file=sys.stderr)
-            continue # Skip this place if details can't be fetched
+        places.append(place)
+    return places
 
-        details = details_response.get('result', {})
-        
-        if not details:
-            print(f"Skipping '{name}' (Place ID: {place_id}) due to empty details response. API Response: {details_response}", file=sys.stderr)
-            continue
+def _search_places(latitude, longitude, radius, keyword):
+    """Runs a Nearby Search and follows its next_page_tokens. Returns the raw results of all pages."""
+    # Initial search for restaurants using the prepared parameters
+    places_result = places_scheduler.call(
+        'places_nearby', gmaps.places_nearby, **_nearby_search_params(latitude, longitude, radius, keyword))
 
-        rating = details.get('rating', None)
-        if rating is None or rating == 'N/A': # Check for None explicitly
-            print(f"Excluding '{name}' (Place ID: {place_id}) due to missing or N/A rating (Rating: {rating}).", file=sys.stderr)
-            continue
+    results = places_result.get('results', [])
 
-        # Consolidate address fetching
-        address = details.get('formatted_address', place.get('vicinity', 'N/A'))
-        phone_number = details.get('formatted_phone_number', 'N/A')
-        website = details.get('website', 'N/A')
-        user_ratings_total = details.get('user_ratings_total', 0) # Default to 0 if N/A
-        price_level = details.get('price_level', 'N/A') # Or a sensible default like 0 or -1
-        business_status_detail = details.get('business_status', 'OPERATIONAL') # Default to OPERATIONAL
-        types_detail = details.get('types', [])
-
-        geometry = details.get('geometry', {})
-        location_detail = geometry.get('location', {})
-        latitude = location_detail.get('lat', 'N/A')
-        longitude = location_detail.get('lng', 'N/A')
-
-        opening_hours_data = details.get('opening_hours', {})
-        opening_status = opening_hours_data.get('open_now', False) # Default to False
-        opening_hours_text = opening_hours_data.get('weekday_text', [])
-        cleaned_opening_hours = [clean_text(hour) for hour in opening_hours_text]
-
-        reviews_data = details.get('reviews', [])
-        formatted_reviews = []
-        for r_idx, r in enumerate(reviews_data[:3]): # Max 3 reviews
-            formatted_reviews.append({
-                "author": clean_text(r.get('author_name', f"Author {r_idx+1}")),
-                "rating": r.get('rating', 0),
-                "text": clean_text(r.get('text', "")),
-                "relative_time": r.get('relative_time_description', "")
-            })
-
-        photos_data = details.get('photos', [])
-        photo_references = [p.get('photo_reference') for p in photos_data[:3] if p.get('photo_reference')] # Max 3, ensure ref exists
-
-        url = details.get('url', 'N/A')
-        editorial_summary_data = details.get('editorial_summary', {})
-        editorial_summary = clean_text(editorial_summary_data.get('overview', 'N/A'))
-
-        delivery_val = details.get('delivery') # Check boolean directly
-        takeout_val = details.get('takeout')
-
-        # Ensure CATEGORY_DICT is accessible
-        categories = get_final_categories(details, keyword, CATEGORY_DICT)
+    # A next_page_token only becomes valid after a short delay; poll until it is
+    while places_result.get('next_page_token'):
+        places_result = places_scheduler.next_page(gmaps.places_nearby, places_result['next_page_token'])
+        results.extend(places_result.get('results', []))
+    return results
 
-        restaurant_data.append({
-            'place_id': place_id, 'name': clean_text(name), 'categories': categories,
-            'address': clean_text(address), 'latitude': latitude, 'longitude': longitude,
-            'rating': rating, 'user_ratings_total': user_ratings_total,
-            'price_level': price_level, 'editorial_summary': editorial_summary,
-            'reviews': formatted_reviews, 'photos': photo_references, 'url': url,
-            'phone_number': phone_number, 'website': website,
-            'opening_hours': cleaned_opening_hours, 'opening_status': opening_status,
-            'business_status': business_status_detail, 'types': types_detail,
-            'delivery': delivery_val if isinstance(delivery_val, bool) else 'N/A', # Handle boolean or N/A
-            'takeout': takeout_val if isinstance(takeout_val, bool) else 'N/A'  # Handle boolean or N/A
-        })
+def get_nearby_recommend_restaurants_logic(latitude, longitude, radius, keyword=""):
+    """
+    Fetches nearby restaurants using Google Maps API and enriches the data.
+    Now accepts an optional keyword for searching.
+    """
+    try:
+        results = _search_places(latitude, longitude, radius, keyword)
+    except Exception as e:
+        print(f"Error during Google Maps API call (places_nearby): {e}", file=sys.stderr)
+        # Depending on the error, you might want to return an empty list or raise it
+        return []
+
+    restaurant_data = []
+    for place in _filter_places(results, keyword):
+        restaurant = _fetch_restaurant_details(place['place_id'], place.get('name', 'N/A'), keyword, place.get('vicinity', 'N/A'))
+        if restaurant:
+            restaurant_data.append(restaurant)
+
+    _ingest_restaurants(restaurant_data)
     return restaurant_data
+
+def refresh_nearby_restaurants(latitude, longitude, radius, max_age):
+    """
+    Re-runs a Nearby Search to refresh the catalog and spatial index for an area, e.g. from the
+    background prefetcher. Place Details are only fetched for places not already in the catalog
+    within max_age seconds, so overlapping areas do not pay for the same details twice.
+
+    Returns:
+        tuple: (number of results the search returned, before filtering, and the number of Place Details calls made).
+    """
+    results = _search_places(latitude, longitude, radius, "")
+    places = _filter_places(results, "")
+    found, missing = restaurant_catalog.get_many([place['place_id'] for place in places], max_age=max_age)
+    missing = set(missing)
+    restaurant_data = []
+    for place in places:
+        if place['place_id'] in missing:
+            restaurant = _fetch_restaurant_details(place['place_id'], place.get('name', 'N/A'), "", place.get('vicinity', 'N/A'))
+            if restaurant:
+                restaurant_data.append(restaurant)
+    # Re-index the places still fresh too, in case they were dropped from the spatial index.
+    restaurant_spatial_index.add_restaurants(list(found.values()))
+    _ingest_restaurants(restaurant_data)
+    return len(results), len(missing)
+
+def _ids_to_fetch(missing, fetch_missing, max_fetch):
+    """The IDs missing from the catalog to fetch from Google: none, or at most max_fetch (PLACE_IDS_MAX_FETCH by default)."""
+    if not fetch_missing:
+        return []
+    if max_fetch is None:
+        max_fetch = getattr(settings, 'PLACE_IDS_MAX_FETCH', 20)
+    if len(missing) > max_fetch:
+        print(f"Catalog lookup: fetching {max_fetch} of {len(missing)} missing place_ids, the rest stay unresolved.", file=sys.stderr)
+    return missing[:max_fetch]
+
+def get_restaurants_by_ids(place_ids, fetch_missing=True, max_fetch=None):
+    """
+    Resolves a list of place_ids to enriched restaurant dictionaries in bulk.
+    IDs found in the server-side catalog are returned directly; unknown IDs fall back to a
+    Place Details call (and are added to the catalog) when fetch_missing is True.
+
+    The catalog is per worker process: with several workers, IDs ingested by another worker are
+    missing here, so the Place Details fallback is the common path rather than the exception.
+    max_fetch bounds what one request can spend on it.
+
+    Args:
+        place_ids (list): The place_ids to resolve, in the order they should be returned.
+        fetch_missing (bool): Whether to call the Google Maps API for IDs not in the catalog.
+        max_fetch (int): At most this many missing IDs are fetched; None uses PLACE_IDS_MAX_FETCH.
+
+    Returns:
+        tuple: (restaurants, unresolved) where restaurants keeps the order of place_ids and
+               unresolved lists the IDs that could not be resolved (or were over max_fetch).
+    """
+    unique_ids = list(dict.fromkeys(pid for pid in place_ids if isinstance(pid, str) and pid))
+    found, missing = restaurant_catalog.get_many(unique_ids)
+    print(f"Catalog lookup: {len(found)} of {len(unique_ids)} place_ids resolved, {len(missing)} missing.", file=sys.stderr)
+
+    to_fetch = _ids_to_fetch(missing, fetch_missing, max_fetch)
+    if to_fetch:
+        fetched = []
+        for place_id in to_fetch:
+            restaurant = _fetch_restaurant_details(place_id, None, "")
+            if restaurant:
+                fetched.append(restaurant)
+        _ingest_restaurants(fetched)
+        for restaurant in fetched:
+            found[restaurant['place_id']] = dict(restaurant)
+
+    restaurants = [found[pid] for pid in unique_ids if pid in found]
+    unresolved = [pid for pid in unique_ids if pid not in found]
+    return restaurants, unresolved
+def get_restaurant_full_details(place_id):
+    """
+    Returns a restaurant with the full Place Details. Entries in the catalog that were fetched
+    at the 'basic' level are upgraded with one Place Details call and stored back.
+
+    Args:
+        place_id (str): The place to fetch.
+
+    Returns:
+        dict | None: The restaurant, or None if it could not be fetched.
+    """
+    cached = restaurant_catalog.get(place_id)
+    if cached is not None and cached.get('details_level', 'full') == 'full':
+        return cached
+
+    restaurant = _fetch_restaurant_details(place_id, cached.get('name') if cached else None, "", level='full')
+    if restaurant is None:
+        return cached
+    if cached is not None:
+        # Keep the categories the restaurant was ranked with, e.g. those of the search keyword it was found by.
+        restaurant['categories'] = list(dict.fromkeys(cached.get('categories', []) + restaurant['categories']))
+    _ingest_restaurants([restaurant])
+    return dict(restaurant)
+
+def is_known_place(place_id):
+    """True if this server has ingested the place: it is in this worker's catalog or in the host's feature store."""
+    if restaurant_catalog.get(place_id) is not None:
+        return True
+    feature_store = get_feature_store()
+    return feature_store is not None and bool(feature_store.gather([place_id])[2][0])
+
+def get_local_nearby_restaurants(latitude, longitude, radius, limit=None):
+    """
+    Answers a radius query from the restaurants already in the catalog, without calling Google.
+
+    Args:
+        latitude (float): Latitude of the centre.
+        longitude (float): Longitude of the centre.
+        radius (int): Search radius in metres.
+        limit (int): Return at most this many (the nearest). None returns all.
+
+    Returns:
+        list: Copies of the catalog restaurants, nearest first, each with a 'distance_m' key.
+    """
+    place_ids, distances = restaurant_spatial_index.query(latitude, longitude, radius, limit=limit)
+    found, missing = restaurant_catalog.get_many(place_ids)
+    if missing:
+        # Evicted or expired from the catalog since they were indexed.
+        restaurant_spatial_index.discard_many(missing)
+
+    restaurants = []
+    for place_id, distance in zip(place_ids, distances):
+        restaurant = found.get(place_id)
+        if restaurant is not None:
+            restaurant['distance_m'] = round(distance, 1)
+            restaurants.append(restaurant)
+    return restaurants
+
+def fetch_photo(photo_reference, max_width):
+    """
+    Downloads a Place Photo from Google.
+
+    Args:
+        photo_reference (str): The photo reference from Place Details.
+        max_width (int): Maximum width in pixels (Google allows up to 1600).
+
+    Returns:
+        bytes: The image.
+
+    Raises:
+        PhotoNotFound: If Google answered with something other than an image (e.g. an unknown reference).
+    """
+    # The body is streamed, so it is read inside the scheduled call and a dropped download is retried.
+    data = places_scheduler.call('photo', lambda: b''.join(gmaps.places_photo(photo_reference, max_width=max_width)))
+    if image_content_type(data[:12]) is None:
+        raise PhotoNotFound(photo_reference)
+    return data
+
+# --- Async versions for the ASGI views ---
+# The googlemaps client is synchronous, so its calls run on a bounded thread pool while the
+# event loop waits; the page-token polling waits are asyncio sleeps, which hold no thread at all.
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+def _get_io_executor():
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'GOOGLE_MAPS_IO_WORKERS', 16),
+                                              thread_name_prefix='gmaps-io')
+    return _io_executor
+
+async def run_io(func, *args, **kwargs):
+    """Runs a blocking call (Google Maps, Firestore, disk) on the bounded I/O executor."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    profiles = current_job_profiles()
+    if profiles is not None:
+        # The request is being profiled (see profiling.ProfilingMiddleware); profile the job in its thread.
+        call = functools.partial(run_profiled, profiles, call)
+    return await loop.run_in_executor(_get_io_executor(), call)
+
+async def aget_nearby_recommend_restaurants_logic(latitude, longitude, radius, keyword=""):
+    """
+    Async version of get_nearby_recommend_restaurants_logic. The Place Details calls for all
+    results are made concurrently (up to GOOGLE_MAPS_IO_WORKERS at a time) instead of one by one.
+    """
+    try:
+        places_result = await run_io(places_scheduler.call, 'places_nearby', gmaps.places_nearby,
+                                     **_nearby_search_params(latitude, longitude, radius, keyword))
+        results = places_result.get('results', [])
+        while places_result.get('next_page_token'):
+            places_result = await places_scheduler.anext_page(gmaps.places_nearby, places_result['next_page_token'], run_io)
+            results.extend(places_result.get('results', []))
+    except Exception as e:
+        print(f"Error during Google Maps API call (places_nearby): {e}", file=sys.stderr)
+        return []
+
+    places = _filter_places(results, keyword)
+    # gather keeps the order of the search results.
+    details = await asyncio.gather(*[
+        run_io(_fetch_restaurant_details, place['place_id'], place.get('name', 'N/A'), keyword, place.get('vicinity', 'N/A'))
+        for place in places
+    ])
+    restaurant_data = [restaurant for restaurant in details if restaurant]
+
+    await run_io(_ingest_restaurants, restaurant_data)
+    return restaurant_data
+
+async def aget_restaurants_by_ids(place_ids, fetch_missing=True, max_fetch=None):
+    """Async version of get_restaurants_by_ids; place_ids missing from the catalog are fetched concurrently."""
+    unique_ids = list(dict.fromkeys(pid for pid in place_ids if isinstance(pid, str) and pid))
+    found, missing = restaurant_catalog.get_many(unique_ids)
+    print(f"Catalog lookup: {len(found)} of {len(unique_ids)} place_ids resolved, {len(missing)} missing.", file=sys.stderr)
+
+    to_fetch = _ids_to_fetch(missing, fetch_missing, max_fetch)
+    if to_fetch:
+        fetched = [r for r in await asyncio.gather(*[run_io(_fetch_restaurant_details, pid, None, "") for pid in to_fetch]) if r]
+        await run_io(_ingest_restaurants, fetched)
+        for restaurant in fetched:
+            found[restaurant['place_id']] = dict(restaurant)
+
+    restaurants = [found[pid] for pid in unique_ids if pid in found]
+    unresolved = [pid for pid in unique_ids if pid not in found]
+    return restaurants, unresolved
 # --- End of your helper functions ---
 
 @require_GET # Ensures this view only accepts GET requests
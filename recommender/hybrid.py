@@ -1,12 +1,23 @@
+from django.conf import settings
 from .content_based import get_content_based_recommendations
 from .collaborative import get_collaborative_filtering_recommendations
-from .reinforcement_learning import DQNAgent, extract_rl_features # Import RL components
+from .reinforcement_learning import build_rl_feature_matrix, dqn_q_values # Import RL components
 from .constants import CATEGORY_KEYS # Import from constants
+from .affinity import affinity_store
+from .storage import get_store
+from .bandit import BANDIT_COLLECTION, get_ranker_name, load_linucb_ranker
+from .feature_store import CATEGORY_BITS, category_mask
 import json
 import os
 
+# Weights used to combine the model scores.
+HYBRID_WEIGHTS = {'content': 0.6, 'collab': 0.4}
+RL_SCORE_WEIGHT = 0.3 # How much influence the RL agent's 'like' Q-value has on the final score
+
 def _save_hybrid_log(log_data):
     """Saves recommendation data to a JSON file for debugging."""
+    if not getattr(settings, 'RECOMMENDER_DEBUG_LOGS', True):
+        return
     try:
         # Define the path relative to the project's base directory
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -28,6 +39,45 @@ def _save_hybrid_log(log_data):
         # Print error but don't crash the recommendation request
         print(f"Error saving debug log: {e}")
 
+def restriction_check(user_profile):
+    """
+    Returns a predicate telling whether a restaurant carries ALL of the user's restriction
+    categories (one bitmask test per restaurant), or None if the user has no restrictions.
+    """
+    restrictions = set(user_profile.get('restrictions', []))
+    if not restrictions:
+        return None
+
+    required = category_mask(restrictions)
+    # Restrictions outside CATEGORY_KEYS have no bit and are checked by name.
+    extra = restrictions - set(CATEGORY_BITS)
+
+    def is_eligible(restaurant):
+        categories = restaurant.get('categories') or []
+        return category_mask(categories) & required == required and (not extra or extra <= set(categories))
+    return is_eligible
+
+def split_restricted_candidates(user_profile, restaurants_data):
+    """
+    Separates the candidates that carry ALL of the user's restriction categories from the rest,
+    so the scorers only see eligible candidates.
+
+    Args:
+        user_profile (dict): The user's profile data, with an optional 'restrictions' list.
+        restaurants_data (list): A list of restaurant dictionaries.
+
+    Returns:
+        tuple: (eligible, restricted), both in the original order.
+    """
+    is_eligible = restriction_check(user_profile)
+    if is_eligible is None:
+        return list(restaurants_data), []
+
+    eligible, restricted = [], []
+    for restaurant in restaurants_data:
+        (eligible if is_eligible(restaurant) else restricted).append(restaurant)
+    return eligible, restricted
+
 def _combine_and_rank_recommendations(content_recs, collab_recs, weights):
     """
     Combines scores from content-based and collaborative models using weighted averaging.
@@ -68,19 +118,33 @@ def _combine_and_rank_recommendations(content_recs, collab_recs, weights):
     return sorted(final_recommendations, key=lambda x: x['final_score'], reverse=True)
 
 
-def get_hybrid_recommendations(user_profile, restaurants_data):
+def get_hybrid_recommendations(user_profile, restaurants_data, ranker=None, restricted=None):
     """
     Orchestrates the hybrid recommendation process.
     
     Args:
         user_profile (dict): A dictionary containing the user's profile data (uid, preferences, etc.).
         restaurants_data (list): A list of restaurant dictionaries from the Flutter app.
+        ranker (str): The re-ranker, 'dqn' or 'linucb'. Defaults to settings.RECOMMENDER_RANKER.
+        restricted (str): What to do with candidates that fail the user's restrictions: 'append'
+                          them unscored after the ranked ones, or 'drop' them. Defaults to
+                          settings.RESTRICTED_CANDIDATES.
 
     Returns:
         list: A sorted list of recommended restaurants.
     """
     user_id = user_profile.get('uid', 'unknown_user')
     print(f"\n--- [HYBRID] START: Generating hybrid recommendations for user {user_id} ---")
+    restricted = restricted or getattr(settings, 'RESTRICTED_CANDIDATES', 'append')
+    if restricted not in ('append', 'drop'):
+        raise ValueError(f"restricted must be 'append' or 'drop', got {restricted!r}")
+
+    # 0. Set aside the candidates that fail the user's restrictions. They would only get a content
+    # score of 0, so all the work below is spent on the eligible candidates.
+    restaurants_data, restricted_recs = split_restricted_candidates(user_profile, restaurants_data)
+    if restricted_recs:
+        print(f"[HYBRID] {len(restricted_recs)} candidates fail the user's restrictions; {len(restaurants_data)} remain.")
+
     # 1. Get content-based recommendations.
     print("[HYBRID] Calling Content-Based model...")
     content_recs = get_content_based_recommendations(user_profile, restaurants_data)
@@ -93,7 +157,7 @@ def get_hybrid_recommendations(user_profile, restaurants_data):
 
     # 3. Combine the results.
     print("[HYBRID] Combining scores...")
-    weights = {'content': 0.6, 'collab': 0.4}
+    weights = HYBRID_WEIGHTS
     final_recommendations = _combine_and_rank_recommendations(content_recs, collab_recs, weights)
     print(f"[HYBRID] Combination complete. Total recommendations: {len(final_recommendations)}")
 
@@ -102,26 +166,49 @@ def get_hybrid_recommendations(user_profile, restaurants_data):
     # top_hybrid_recs = final_recommendations[:20]
 
     # --- 4. RL Re-ranking ---
-    print(f"[HYBRID] Re-ranking using RL agent for user {user_id}...")
-    
-    # Instantiate a specific agent for this user
-    rl_agent = DQNAgent(state_size=35, action_size=4, user_id=user_id)
+    # Score with the user's saved model if there is one. The scorers run on the stored weights
+    # directly (in place when the store shares them between workers), so no Keras model is built.
+    # Cold users (no trained model, or a bandit with fewer than BANDIT_MIN_UPDATES updates) are
+    # scored with their category affinities.
+    ranker = get_ranker_name(ranker)
+    states = build_rl_feature_matrix(top_hybrid_recs, CATEGORY_KEYS)
+    if ranker == 'linucb':
+        # The bandit scores the same feature vectors as the DQN, as an expected reward plus an exploration bonus.
+        collection = BANDIT_COLLECTION
+        min_updates = getattr(settings, 'BANDIT_MIN_UPDATES', 10)
+
+        def score(model_weights):
+            bandit = load_linucb_ranker(user_id, model_weights)
+            # False (not None, which the weight arena takes for a miss) marks a bandit with too few updates.
+            return bandit.score_batch(states) if bandit.num_updates >= min_updates else False
+    else:
+        # The Q-value for the 'like' action (index 0) is the agent's belief that the user will like the item.
+        collection = 'rl_models'
+        score = lambda model_weights: dqn_q_values(model_weights, states)[:, 0]
+    try:
+        rl_scores = get_store().with_model_weights(user_id, score, collection=collection)
+    except Exception as e:
+        print(f"[HYBRID] WARNING: Could not load the {ranker} model for user {user_id}. Error: {e}")
+        rl_scores = None
+    if rl_scores is False:
+        rl_scores = None
+
+    if rl_scores is not None:
+        print(f"[HYBRID] Re-ranked using the {ranker} model of user {user_id}.")
+    else:
+        print(f"[HYBRID] No trained {ranker} model for user {user_id}. Re-ranking using category affinities...")
+        affinity_store.load_history(user_id)
+        rl_scores = affinity_store.score_restaurants(user_id, top_hybrid_recs) if top_hybrid_recs else []
+        if rl_scores is None:
+            rl_scores = [0.0] * len(top_hybrid_recs)
 
     reranked_recs = []
-    for rec in top_hybrid_recs:
-        # Create the state vector for the RL agent.
-        state = extract_rl_features(rec, CATEGORY_KEYS)
-        
-        # Get Q-values (predicted scores for each action) from the RL model.
-        q_values = rl_agent.get_q_values(state)
-        
-        # Use the Q-value for the 'like' action (index 0) as the RL score.
-        # This score represents the agent's belief that the user will like this item.
-        rl_score = q_values[0]
-        
+    for rec, rl_score in zip(top_hybrid_recs, rl_scores):
+        rl_score = float(rl_score)
+
         # Add a new score that combines the hybrid score and the RL agent's score.
-        # The weight (e.g., 0.3) controls how much influence the RL agent has.
-        rec['final_score_with_rl'] = rec.get('final_score', 0.0) + (rl_score * 0.3)
+        # The weight (RL_SCORE_WEIGHT) controls how much influence the RL agent has.
+        rec['final_score_with_rl'] = rec.get('final_score', 0.0) + (rl_score * RL_SCORE_WEIGHT)
         reranked_recs.append(rec)
 
     # Sort the list by the new final score that includes the RL agent's input.
@@ -130,11 +217,17 @@ def get_hybrid_recommendations(user_profile, restaurants_data):
     # Log the re-ranking process
     print(f"[HYBRID] RL re-ranking complete. Total recommendations after re-ranking: {len(final_reranked_list)}")
 
+    if restricted == 'append':
+        # Unscored (no final_score keys) and flagged, after every eligible restaurant.
+        final_reranked_list.extend(dict(rec, restricted=True) for rec in restricted_recs)
+
     # --- Save log for debugging ---
     _save_hybrid_log({
         "user_id": user_id,
         "user_profile_received": user_profile,
         "weights": weights,
+        "ranker": ranker,
+        "restricted_place_ids": [rec.get('place_id') for rec in restricted_recs],
         "content_recs_with_scores": content_recs,
         "collab_recs_with_scores": collab_recs,
         "final_hybrid_recommendations": final_recommendations,
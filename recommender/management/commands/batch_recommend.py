@@ -0,0 +1,54 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from recommender.batch import get_batch_hybrid_recommendations
+from recommender.synthetic import make_restaurants, make_user_profiles, make_user_favourites
+
+
+class Command(BaseCommand):
+    help = "Generates hybrid recommendations for many users against a shared candidate set."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--input', help='JSON file with {"user_profiles": [...], "restaurants": [...]}.')
+        parser.add_argument('--output', help="Where to write the recommendations JSON (default: stdout summary only).")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument('--use-rl', action='store_true', help="Re-rank with each user's DQN agent.")
+        parser.add_argument('--synthetic-users', type=int, default=0,
+                            help="Benchmark mode: generate this many synthetic users instead of reading --input.")
+        parser.add_argument('--synthetic-restaurants', type=int, default=60)
+
+    def handle(self, *args, **options):
+        all_user_favorites = None
+        if options['synthetic_users']:
+            restaurants = make_restaurants(options['synthetic_restaurants'])
+            user_profiles = make_user_profiles(options['synthetic_users'], restaurants)
+            # Offline favourites index, so the benchmark does not touch Firestore.
+            all_user_favorites = make_user_favourites(options['synthetic_users'], [r['place_id'] for r in restaurants])
+        elif options['input']:
+            with open(options['input'], encoding='utf-8') as f:
+                data = json.load(f)
+            user_profiles = data.get('user_profiles', [])
+            restaurants = data.get('restaurants', [])
+        else:
+            raise CommandError("Provide --input or --synthetic-users.")
+
+        try:
+            batch = get_batch_hybrid_recommendations(
+                user_profiles,
+                restaurants,
+                top_k=options['top_k'],
+                workers=options['workers'],
+                use_rl=options['use_rl'],
+                all_user_favorites=all_user_favorites,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(batch, f)
+            self.stdout.write(f"Recommendations written to {options['output']}")
+        self.stdout.write(
+            f"{batch['users']} users in {batch['elapsed_seconds']:.2f}s "
+            f"({batch['users_per_second']:.1f} users/sec)"
+        )
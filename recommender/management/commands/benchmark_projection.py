@@ -0,0 +1,58 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from recommender.projection import project_restaurants, LAYOUT_ROWS, LAYOUT_COLUMNAR
+from recommender.synthetic import make_restaurants
+
+
+class Command(BaseCommand):
+    help = "Benchmarks serialization time and payload size of the full vs. projected/columnar response formats."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='20,60,200,1000', help="Comma-separated numbers of restaurants.")
+        parser.add_argument('--fields', default='place_id,name,final_score_with_rl',
+                            help="Projection used for the compact formats.")
+        parser.add_argument('--repeat', type=int, default=20, help="Serializations per measurement.")
+        parser.add_argument('--output', help="Optional path to write the JSON report to.")
+
+    def handle(self, *args, **options):
+        fields = [f for f in options['fields'].split(',') if f]
+        repeat = options['repeat']
+        results = []
+
+        for size in [int(s) for s in options['sizes'].split(',') if s]:
+            restaurants = make_restaurants(size)
+            rng = random.Random(size)
+            for r in restaurants:
+                # The hybrid endpoint adds these intermediate scores to every restaurant.
+                r['final_score'] = rng.random()
+                r['final_score_with_rl'] = r['final_score'] + rng.random() * 0.3
+
+            formats = {
+                'full': (None, LAYOUT_ROWS),
+                'rows_projected': (fields, LAYOUT_ROWS),
+                'columnar_projected': (fields, LAYOUT_COLUMNAR),
+            }
+            for name, (format_fields, layout) in formats.items():
+                # Time projection + serialization, as done by JsonResponse.
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    body = json.dumps(project_restaurants(restaurants, format_fields, layout), cls=DjangoJSONEncoder)
+                elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+                results.append({
+                    'restaurants': size,
+                    'format': name,
+                    'serialize_ms': round(elapsed_ms, 4),
+                    'payload_bytes': len(body.encode('utf-8')),
+                })
+                self.stdout.write(f"{size:>6} restaurants  {name:<20} {elapsed_ms:>9.3f} ms  {len(body):>10} bytes")
+
+        report = json.dumps({'fields': fields, 'repeat': repeat, 'results': results}, indent=2)
+        if options.get('output'):
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(report)
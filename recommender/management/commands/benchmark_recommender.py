@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from recommender.collaborative import get_collaborative_filtering_recommendations
+from recommender.constants import CATEGORY_DICT, CATEGORY_KEYS
+from recommender.content_based import get_content_based_recommendations
+from recommender.fakes import place_details_result
+from recommender.get_restaurants import get_final_categories, get_keyword_category
+from recommender.hybrid import HYBRID_WEIGHTS, _combine_and_rank_recommendations
+from recommender.reinforcement_learning import DQNAgent, STATE_SIZE, ACTION_SIZE, extract_rl_features
+from recommender.storage import RecommenderStore, set_store
+from recommender.synthetic import make_restaurants, make_user_profiles, make_user_favourites
+
+
+class _InMemoryFavourites(RecommenderStore):
+    """Serves a prebuilt favourites mapping, so the collaborative stage is measured without I/O."""
+    def __init__(self, favourites):
+        self.favourites = favourites
+
+    def get_all_favourites(self):
+        return self.favourites
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        return {}
+
+
+# --- Stages ---
+# Each stage builds its inputs for a size (untimed) and returns the function to time.
+# Stages whose function mutates its inputs are rebuilt before every repetition.
+def _keyword_category(size):
+    details = [place_details_result(r) for r in make_restaurants(size)]
+    return lambda: [get_keyword_category(d, CATEGORY_DICT, 'sushi') for d in details]
+
+
+def _final_categories(size):
+    details = [place_details_result(r) for r in make_restaurants(size)]
+    return lambda: [get_final_categories(d, 'sushi', CATEGORY_DICT) for d in details]
+
+
+def _content_based(size):
+    restaurants = make_restaurants(size)
+    profile = make_user_profiles(1, restaurants, seed=1)[0]
+    return lambda: get_content_based_recommendations(profile, restaurants)
+
+
+def _collaborative(size, num_restaurants=200):
+    restaurants = make_restaurants(num_restaurants)
+    set_store(_InMemoryFavourites(make_user_favourites(size, [r['place_id'] for r in restaurants])))
+    profile = make_user_profiles(1, restaurants, seed=1)[0]
+    return lambda: get_collaborative_filtering_recommendations(profile, restaurants)
+
+
+def _combine_and_rank(size):
+    restaurants = make_restaurants(size)
+    content_recs = [dict(r, score=(i % 97) / 97) for i, r in enumerate(restaurants)]
+    collab_recs = [{'place_id': r['place_id'], 'score': (i % 13) / 13} for i, r in enumerate(restaurants)]
+    return lambda: _combine_and_rank_recommendations(content_recs, collab_recs, HYBRID_WEIGHTS)
+
+
+def _extract_rl_features(size):
+    restaurants = make_restaurants(size)
+    return lambda: [extract_rl_features(r, CATEGORY_KEYS) for r in restaurants]
+
+
+def _dqn_agent():
+    set_store(_InMemoryFavourites({}))
+    return DQNAgent(state_size=STATE_SIZE, action_size=ACTION_SIZE, user_id='__benchmark__')
+
+
+def _dqn_get_q_values(size):
+    agent = _dqn_agent()
+    states = [extract_rl_features(r, CATEGORY_KEYS) for r in make_restaurants(size)]
+    return lambda: [agent.get_q_values(state) for state in states]
+
+
+def _dqn_get_q_values_batch(size):
+    agent = _dqn_agent()
+    states = np.vstack([extract_rl_features(r, CATEGORY_KEYS) for r in make_restaurants(size)])
+    return lambda: agent.get_q_values_batch(states)
+
+
+# name -> (prepare, size axis, mutates inputs)
+STAGES = {
+    'get_keyword_category': (_keyword_category, 'restaurants', False),
+    'get_final_categories': (_final_categories, 'restaurants', False),
+    'get_content_based_recommendations': (_content_based, 'restaurants', False),
+    'get_collaborative_filtering_recommendations': (_collaborative, 'users', False),
+    '_combine_and_rank_recommendations': (_combine_and_rank, 'restaurants', True),
+    'extract_rl_features': (_extract_rl_features, 'restaurants', False),
+    'DQNAgent.get_q_values': (_dqn_get_q_values, 'restaurants', False),
+    'DQNAgent.get_q_values_batch': (_dqn_get_q_values_batch, 'restaurants', False),
+}
+
+
+def _git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip() != ''
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks each recommender stage on synthetic data of growing size and records the time "
+            "and peak Python memory (tracemalloc) per size as JSON, for comparing commits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', default=','.join(STAGES), help="Comma-separated stages to run.")
+        parser.add_argument('--restaurant-sizes', default='50,500,5000,50000,100000')
+        parser.add_argument('--user-sizes', default='100,1000,10000,100000,1000000')
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per size; the best is reported.")
+        parser.add_argument('--stage-budget', type=float, default=30.0,
+                            help="Once a size takes longer than this (seconds), larger sizes of the stage are skipped.")
+        parser.add_argument('--no-memory', action='store_true', help="Skip the extra tracemalloc run per size.")
+        parser.add_argument('--output', help="Path of the JSON report (default: benchmark_<commit>.json in the cwd).")
+
+    def handle(self, *args, **options):
+        stages = [s for s in options['stages'].split(',') if s]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown))}")
+        sizes = {
+            'restaurants': [int(s) for s in options['restaurant_sizes'].split(',') if s],
+            'users': [int(s) for s in options['user_sizes'].split(',') if s],
+        }
+
+        commit, dirty = _git_revision()
+        report = {
+            'git_commit': commit,
+            'git_dirty': dirty,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': options['repeat'],
+            'results': [],
+        }
+
+        # Debug logs would dominate (and pollute assets/) at large sizes.
+        with override_settings(RECOMMENDER_DEBUG_LOGS=False, FEATURE_STORE_ENABLED=False):
+            for stage in stages:
+                prepare, axis, mutates = STAGES[stage]
+                over_budget = False
+                for size in sizes[axis]:
+                    result = {'stage': stage, 'axis': axis, 'size': size}
+                    if over_budget:
+                        result['skipped'] = 'previous size exceeded --stage-budget'
+                        report['results'].append(result)
+                        continue
+                    result.update(self._measure(prepare, size, mutates, options))
+                    report['results'].append(result)
+                    self.stdout.write(
+                        f"{stage:45s} {axis}={size:<8d} {result['seconds'] * 1000:10.1f} ms"
+                        + (f" {result['peak_memory_mb']:9.1f} MB" if 'peak_memory_mb' in result else ''))
+                    over_budget = result['seconds'] > options['stage_budget']
+
+        output = options['output'] or f"benchmark_{(commit or 'unknown')[:12]}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Report written to {output}")
+
+    def _measure(self, prepare, size, mutates, options):
+        run = prepare(size)
+        times = []
+        for i in range(max(1, options['repeat'])):
+            if mutates and i:
+                run = prepare(size)
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        result = {'seconds': min(times), 'per_item_us': min(times) / size * 1e6}
+
+        if not options['no_memory']:
+            # A separate run, since tracing slows the code down. Native (e.g. TensorFlow) memory is not traced.
+            if mutates:
+                run = prepare(size)
+            tracemalloc.start()
+            try:
+                run()
+                result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            finally:
+                tracemalloc.stop()
+        return result
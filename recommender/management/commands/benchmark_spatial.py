@@ -0,0 +1,70 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from recommender.spatial import SpatialIndex, haversine_distances_m
+from recommender.synthetic import DEFAULT_CENTER
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks radius queries on the spatial index against a full vectorized haversine scan, "
+            "over uniformly scattered synthetic places.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1000000, help="Indexed places.")
+        parser.add_argument('--spread-deg', type=float, default=0.5,
+                            help="Places are scattered uniformly within +/- this many degrees of the centre.")
+        parser.add_argument('--radii', default='500,1500,5000', help="Comma-separated query radii in metres.")
+        parser.add_argument('--queries', type=int, default=1000, help="Queries per radius.")
+        parser.add_argument('--cell-degrees', type=float, default=0.01)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Optional path to write the JSON report to.")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n, spread = options['points'], options['spread_deg']
+        lats = DEFAULT_CENTER[0] + rng.uniform(-spread, spread, n)
+        lons = DEFAULT_CENTER[1] + rng.uniform(-spread, spread, n)
+        place_ids = [f"bench_{i}" for i in range(n)]
+
+        index = SpatialIndex(cell_degrees=options['cell_degrees'])
+        start = time.perf_counter()
+        # A bulk add this size is merged into the sorted arrays straight away.
+        index.add_many(place_ids, lats.tolist(), lons.tolist())
+        build_seconds = time.perf_counter() - start
+        self.stdout.write(f"Indexed {n} places in {build_seconds:.2f}s")
+
+        report = {'points': n, 'spread_deg': spread, 'cell_degrees': options['cell_degrees'],
+                  'build_seconds': build_seconds, 'results': []}
+        centres = np.column_stack([DEFAULT_CENTER[0] + rng.uniform(-spread / 2, spread / 2, options['queries']),
+                                   DEFAULT_CENTER[1] + rng.uniform(-spread / 2, spread / 2, options['queries'])])
+        for radius in [float(r) for r in options['radii'].split(',') if r]:
+            index_ms, found = [], []
+            for lat, lon in centres:
+                t = time.perf_counter()
+                ids, _ = index.query(lat, lon, radius)
+                index_ms.append((time.perf_counter() - t) * 1000)
+                found.append(len(ids))
+
+            # Baseline: the same filter over every point, on a sample of the queries.
+            scan_ms = []
+            for lat, lon in centres[:min(20, len(centres))]:
+                t = time.perf_counter()
+                np.flatnonzero(haversine_distances_m(lat, lon, lats, lons) <= radius)
+                scan_ms.append((time.perf_counter() - t) * 1000)
+
+            result = {
+                'radius_m': radius,
+                'mean_results': float(np.mean(found)),
+                'index_ms': {'p50': float(np.percentile(index_ms, 50)), 'p99': float(np.percentile(index_ms, 99))},
+                'full_scan_ms': {'p50': float(np.percentile(scan_ms, 50))},
+            }
+            report['results'].append(result)
+            self.stdout.write(f"radius {radius:>7.0f} m  {result['mean_results']:>9.1f} results  "
+                              f"index p50 {result['index_ms']['p50']:.3f} ms p99 {result['index_ms']['p99']:.3f} ms  "
+                              f"full scan p50 {result['full_scan_ms']['p50']:.1f} ms")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
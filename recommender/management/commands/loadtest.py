@@ -0,0 +1,228 @@
+import asyncio
+import json
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from recommender.fakes import FakeFirestoreClient, FakeGoogleMapsClient, LatencyModel
+from recommender.feedback_log import feedback_buffer
+from recommender import get_restaurants
+from recommender.get_restaurants import set_gmaps_client
+from recommender.singleflight import nearby_search_flight
+from recommender.storage import FirestoreStore, set_store
+from recommender.synthetic import DEFAULT_CENTER, make_restaurants, make_user_profiles, make_user_favourites
+
+# endpoint -> (request builder, URL name, async). The async endpoints are driven from a single
+# event loop thread, as one ASGI worker would serve them.
+ENDPOINTS = {
+    'get_restaurants': ('_request_get_restaurants', 'get_restaurants_api', False),
+    'hybrid_recommendations': ('_request_hybrid_recommendations', 'get_hybrid_recommendations_api', False),
+    'record_feedback': ('_request_record_feedback', 'record_feedback', False),
+    'async_get_restaurants': ('_request_get_restaurants', 'get_restaurants_api_async', True),
+    'async_hybrid_recommendations': ('_request_hybrid_recommendations', 'get_hybrid_recommendations_api_async', True),
+}
+FEEDBACK_ACTIONS = ['like', 'dislike', 'click_details', 'skip']
+
+
+class Command(BaseCommand):
+    help = ("Load-tests the recommender endpoints against fake Google Maps and Firestore clients with "
+            "log-normal latencies, and reports throughput and p50/p95/p99 latency per endpoint as JSON. "
+            "Runs against a throw-away test database and feature store.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', default='get_restaurants,hybrid_recommendations,record_feedback', help="Comma-separated endpoints to test.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent client threads.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per endpoint.")
+        parser.add_argument('--restaurants', type=int, default=500, help="Synthetic restaurants behind the fake APIs.")
+        parser.add_argument('--candidates', type=int, default=60, help="Restaurants sent per hybrid request.")
+        parser.add_argument('--users', type=int, default=200, help="Synthetic users (with favourites in the fake Firestore).")
+        parser.add_argument('--maps-latency-ms', type=float, default=150, help="Median latency of a Google Maps call.")
+        parser.add_argument('--firestore-latency-ms', type=float, default=30, help="Median latency of a Firestore call.")
+        parser.add_argument('--maps-quota-qps', type=float,
+                            help="Google Maps calls per second the fake allows before answering OVER_QUERY_LIMIT.")
+        parser.add_argument('--maps-throttle-rate', type=float, default=0.0,
+                            help="Fraction of Google Maps calls the fake fails with OVER_QUERY_LIMIT at random.")
+        parser.add_argument('--page-token-delay', type=float, default=2.0,
+                            help="Seconds before the fake accepts a next_page_token (Google takes about 2).")
+        parser.add_argument('--latency-sigma', type=float, default=0.5, help="Log-normal sigma of the fake latencies.")
+        parser.add_argument('--locations', type=int, default=0,
+                            help="Distinct search locations for get_restaurants (0: a random location per request). "
+                                 "Few locations make concurrent searches identical, exercising request coalescing.")
+        parser.add_argument('--ranker', help="Ranker sent with hybrid/feedback requests (default: the configured one).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Optional path to write the JSON report to.")
+
+    def handle(self, *args, **options):
+        endpoints = [e for e in options['endpoints'].split(',') if e]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        # --- Fake backends with synthetic data ---
+        restaurants = make_restaurants(options['restaurants'], seed=options['seed'])
+        profiles = make_user_profiles(options['users'], restaurants, seed=options['seed'])
+        favourites = make_user_favourites(options['users'], [r['place_id'] for r in restaurants], seed=options['seed'])
+        set_gmaps_client(FakeGoogleMapsClient(
+            restaurants, latency=LatencyModel(options['maps_latency_ms'], options['latency_sigma'], options['seed']),
+            quota_qps=options['maps_quota_qps'], over_query_limit_rate=options['maps_throttle_rate'],
+            page_token_delay=options['page_token_delay'], seed=options['seed']))
+        set_store(FirestoreStore(client=FakeFirestoreClient.with_favourites(
+            favourites, {r['place_id']: r for r in restaurants},
+            latency=LatencyModel(options['firestore_latency_ms'], options['latency_sigma'], options['seed'] + 1))))
+
+        # The feedback log goes to a test database, the feature store to a temporary directory,
+        # and the per-request debug logs are switched off.
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as feature_dir, \
+                    override_settings(FEATURE_STORE_DIR=feature_dir, RECOMMENDER_DEBUG_LOGS=False):
+                report = {
+                    'config': {k: options[k] for k in ('concurrency', 'requests', 'restaurants', 'candidates', 'users',
+                                                       'maps_latency_ms', 'firestore_latency_ms', 'latency_sigma',
+                                                       'maps_quota_qps', 'maps_throttle_rate', 'page_token_delay',
+                                                       'locations', 'ranker', 'seed')},
+                    'endpoints': {},
+                }
+                for endpoint in endpoints:
+                    self.stdout.write(f"Load-testing {endpoint}...")
+                    builder, url_name, is_async = ENDPOINTS[endpoint]
+                    run = self._run_async if is_async else self._run
+                    flight_before = nearby_search_flight.stats()
+                    # Looked up on the module, since set_places_scheduler may have replaced it.
+                    places_before = get_restaurants.places_scheduler.stats()
+                    report['endpoints'][endpoint] = run(getattr(self, builder), reverse(url_name),
+                                                        restaurants, profiles, options)
+                    if builder == '_request_get_restaurants':
+                        report['endpoints'][endpoint]['coalescing'] = self._coalescing(
+                            flight_before, nearby_search_flight.stats())
+                        report['endpoints'][endpoint]['google_maps'] = self._places_calls(
+                            places_before, get_restaurants.places_scheduler.stats())
+        finally:
+            feedback_buffer.flush()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    def _run(self, make_request, url, restaurants, profiles, options):
+        """Sends options['requests'] requests from options['concurrency'] threads and summarizes them."""
+        local = threading.local()
+        rngs = self._request_rngs(options)
+
+        def one_request(i):
+            if not hasattr(local, 'client'):
+                local.client = Client() # Client instances are not thread-safe
+            method, data = make_request(rngs[i], restaurants, profiles, options)
+            start = time.perf_counter()
+            response = self._send(local.client, method, url, data)
+            return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(one_request, range(options['requests'])))
+        return self._summarize(results, time.perf_counter() - start)
+
+    def _run_async(self, make_request, url, restaurants, profiles, options):
+        """Sends the requests from one event loop, with at most options['concurrency'] in flight."""
+        rngs = self._request_rngs(options)
+
+        async def run_all():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def one_request(i):
+                method, data = make_request(rngs[i], restaurants, profiles, options)
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await self._send(client, method, url, data)
+                    return time.perf_counter() - start, response.status_code
+
+            return await asyncio.gather(*[one_request(i) for i in range(options['requests'])])
+
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        return self._summarize(results, time.perf_counter() - start)
+
+    def _request_rngs(self, options):
+        # One generator per request, so every run sends the same requests whatever the scheduling.
+        rng = random.Random(options['seed'])
+        return [random.Random(rng.getrandbits(64)) for _ in range(options['requests'])]
+
+    def _send(self, client, method, url, data):
+        if method == 'get':
+            return client.get(url, data)
+        return client.post(url, json.dumps(data), content_type='application/json')
+
+    def _summarize(self, results, wall):
+        latencies = np.array([r[0] for r in results]) * 1000
+        statuses = [r[1] for r in results]
+        return {
+            'requests': len(results),
+            'errors': sum(1 for s in statuses if s >= 400),
+            'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+            'wall_seconds': wall,
+            'throughput_rps': len(results) / wall if wall > 0 else 0.0,
+            'latency_ms': {
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max()),
+            },
+        }
+
+    def _coalescing(self, before, after):
+        executions = after['executions'] - before['executions']
+        coalesced = after['coalesced'] - before['coalesced']
+        return {
+            'executions': executions,
+            'coalesced': coalesced,
+            'coalesce_ratio': coalesced / (executions + coalesced) if executions + coalesced else 0.0,
+            'max_waiters': after['max_waiters'],
+        }
+
+    def _places_calls(self, before, after):
+        calls = {key: after[key] - before[key] for key in before if key != 'concurrency_limit'}
+        calls['concurrency_limit'] = after['concurrency_limit']
+        return calls
+
+    # --- Request builders ---
+    # Each returns (method, data) for one request.
+    def _request_get_restaurants(self, rng, restaurants, profiles, options):
+        if options['locations']:
+            # Pick one of a fixed set of spots, the same for every run.
+            rng = random.Random(rng.randrange(options['locations']))
+        return 'get', {
+            'lat': DEFAULT_CENTER[0] + rng.uniform(-0.02, 0.02),
+            'lon': DEFAULT_CENTER[1] + rng.uniform(-0.02, 0.02),
+            'radius': 1500,
+        }
+
+    def _request_hybrid_recommendations(self, rng, restaurants, profiles, options):
+        body = {
+            'user_profile': rng.choice(profiles),
+            'restaurants': rng.sample(restaurants, min(options['candidates'], len(restaurants))),
+        }
+        if options['ranker']:
+            body['ranker'] = options['ranker']
+        return 'post', body
+
+    def _request_record_feedback(self, rng, restaurants, profiles, options):
+        body = {
+            'user_id': rng.choice(profiles)['uid'],
+            'restaurant_data': rng.choice(restaurants),
+            'action': rng.choice(FEEDBACK_ACTIONS),
+        }
+        if options['ranker']:
+            body['ranker'] = options['ranker']
+        return 'post', body
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so the numbers reflect a cold worker.
+_CHILD_SCRIPT = r"""
+import json, os, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_seconds = time.perf_counter() - start
+rss_after_setup = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import recommender.views
+import_seconds = time.perf_counter() - start
+heavy = ['tensorflow', 'pandas', 'sklearn', 'surprise', 'google.cloud.firestore']
+print(json.dumps({
+    'django_setup_seconds': setup_seconds,
+    'import_views_seconds': import_seconds,
+    'max_rss_mb_after_setup': rss_after_setup / 1024,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules_loaded': [m for m in heavy if m in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measures the import time and peak RSS of a fresh worker importing recommender.views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--warmup', action='store_true', help="Also measure with RECOMMENDER_WARMUP=True.")
+
+    def handle(self, *args, **options):
+        modes = [('lazy', 'False')] + ([('warmup', 'True')] if options['warmup'] else [])
+        report = {}
+        for mode, warmup in modes:
+            env = dict(os.environ, RECOMMENDER_WARMUP=warmup,
+                       DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'django_project.settings'))
+            runs = []
+            for _ in range(options['runs']):
+                result = subprocess.run([sys.executable, '-c', _CHILD_SCRIPT], cwd=settings.BASE_DIR, env=env,
+                                        capture_output=True, text=True, check=True)
+                # The last line of stdout is the JSON report; anything before it is log output.
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            report[mode] = {
+                'runs': runs,
+                'best_total_seconds': min(r['django_setup_seconds'] + r['import_views_seconds'] for r in runs),
+                'max_rss_mb': max(r['max_rss_mb'] for r in runs),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommender.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = ("Prints a signed value for the X-Recommender-Profile header, which makes the server profile that "
+            "request (requires PROFILING_HEADER_ENABLED).")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'PROFILING_HEADER_ENABLED', False):
+            self.stderr.write("Note: PROFILING_HEADER_ENABLED is off, so the server will ignore this header.")
+        self.stdout.write(make_profiling_token())
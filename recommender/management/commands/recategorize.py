@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from recommender.categorization import CATEGORY_DICT_VERSION, recategorize_entries
+from recommender.get_restaurants import categorize
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the cached categories of every place from their stored inputs, after CATEGORY_DICT "
+            "was edited, so workers find them current instead of recategorizing on their next fetch.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Also recompute entries already at the current CATEGORY_DICT version.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        recomputed, changed = recategorize_entries(categorize, recompute_all=options['all'],
+                                                   batch_size=options['batch_size'])
+        self.stdout.write(f"Recategorized {recomputed} cache entries ({changed} changed) for CATEGORY_DICT version "
+                          f"{CATEGORY_DICT_VERSION} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from recommender.favourites_snapshot import favourites_snapshot, write_favourites_snapshot
+from recommender.storage import get_store
+
+
+class Command(BaseCommand):
+    help = ("Writes every user's favourites from the configured store as a new memory-mapped snapshot, "
+            "which the workers pick up on their next collaborative scoring. Run one per host, from cron "
+            "or with --interval.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="If set, write a new snapshot every this many seconds instead of exiting.")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            all_user_favorites = get_store().get_all_favourites()
+            write_favourites_snapshot(all_user_favorites, favourites_snapshot.directory)
+            self.stdout.write(f"Snapshot of {len(all_user_favorites)} users ({favourites_snapshot.nbytes() / 1e6:.1f} MB) "
+                              f"written in {time.perf_counter() - start:.1f}s")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
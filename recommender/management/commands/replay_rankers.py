@@ -0,0 +1,165 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from recommender.bandit import RANKERS, LinUCBRanker
+from recommender.constants import CATEGORY_KEYS, FEEDBACK_ACTION_INDEX, FEEDBACK_REWARDS
+from recommender.reinforcement_learning import DQNAgent, STATE_SIZE, ACTION_SIZE, build_rl_feature_matrix
+from recommender.storage import SQLiteStore, set_store
+from recommender.synthetic import make_restaurants, make_user_profiles, make_feedback_events
+
+
+def _percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+class _DQNReplay:
+    """Online DQN as in record_feedback: load weights, one fit on the event, save weights."""
+    def __init__(self):
+        self._weights = {}
+        self._agent = None
+
+    def _agent_for(self, user_id):
+        # One Keras model is reused and the per-user weights are swapped in, as a load would.
+        if self._agent is None:
+            self._agent = DQNAgent(state_size=STATE_SIZE, action_size=ACTION_SIZE, user_id=user_id)
+            self._initial_weights = self._agent.model.get_weights()
+        self._agent.model.set_weights(self._weights.get(user_id, self._initial_weights))
+        return self._agent
+
+    def score(self, user_id, states):
+        return self._agent_for(user_id).get_q_values_batch(states)[:, 0]
+
+    def update(self, user_id, state, action_index, reward):
+        agent = self._agent_for(user_id)
+        state = state.reshape(1, -1)
+        target_f = agent.model.predict(state, verbose=0)
+        target_f[0][action_index] = reward
+        agent.model.fit(state, target_f, epochs=1, verbose=0)
+        self._weights[user_id] = agent.model.get_weights()
+
+
+class _LinUCBReplay:
+    """Online LinUCB as in record_feedback: decode the compact state, one update, encode it again."""
+    def __init__(self):
+        self._weights = {}
+
+    def _ranker_for(self, user_id):
+        weights = self._weights.get(user_id)
+        return LinUCBRanker.from_weights(user_id, weights) if weights else LinUCBRanker(user_id)
+
+    def score(self, user_id, states):
+        return self._ranker_for(user_id).score_batch(states)
+
+    def update(self, user_id, state, action_index, reward):
+        ranker = self._ranker_for(user_id)
+        ranker.update(state, reward)
+        self._weights[user_id] = ranker.to_weights()
+
+
+_REPLAYS = {'dqn': _DQNReplay, 'linucb': _LinUCBReplay}
+
+
+class Command(BaseCommand):
+    help = ("Replays logged feedback through each ranker in chronological order (score each event, then learn "
+            "from it) and compares update/scoring latency and ranking quality (AUC of liked vs. other events). "
+            "Models are kept in memory; stored user models are never read or written.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rankers', default=','.join(RANKERS), help="Comma-separated rankers to compare.")
+        parser.add_argument('--limit', type=int, default=5000, help="Maximum number of logged events to replay.")
+        parser.add_argument('--synthetic-users', type=int, default=0,
+                            help="Replay generated events for this many users instead of the UserFeedback table.")
+        parser.add_argument('--events-per-user', type=int, default=40)
+        parser.add_argument('--synthetic-restaurants', type=int, default=200)
+        parser.add_argument('--candidates', type=int, default=100,
+                            help="Size of the candidate set used to time batch scoring.")
+        parser.add_argument('--output', help="Optional path to write the JSON report to.")
+
+    def handle(self, *args, **options):
+        rankers = [r for r in options['rankers'].split(',') if r]
+        unknown = set(rankers) - set(_REPLAYS)
+        if unknown:
+            raise CommandError(f"Unknown rankers: {', '.join(sorted(unknown))}")
+        # The DQN's constructor loads weights from the store; keep the replay away from the real one.
+        set_store(SQLiteStore())
+
+        if options['synthetic_users']:
+            restaurants = make_restaurants(options['synthetic_restaurants'])
+            profiles = make_user_profiles(options['synthetic_users'], restaurants)
+            events = make_feedback_events(profiles, restaurants, events_per_user=options['events_per_user'])
+            restaurants_by_id = {r['place_id']: r for r in restaurants}
+        else:
+            events = self._load_logged_events(options['limit'])
+            # The catalog lives in the server's workers and is always empty in a command process;
+            # logged restaurants are represented by their place_id and their features come from the
+            # host's feature store (build_rl_feature_matrix gathers them by place_id).
+            restaurants_by_id = {}
+        events = [e for e in events if e['action'] in FEEDBACK_ACTION_INDEX]
+        if not events:
+            raise CommandError("No feedback events to replay.")
+
+        # Contexts are built as at recommendation time: restaurant features plus the hybrid score.
+        # Restaurants missing from the feature store get empty features.
+        contexts = []
+        for e in events:
+            restaurant = dict(restaurants_by_id.get(e['restaurant_id'], {'place_id': e['restaurant_id']}))
+            restaurant['final_score'] = e['score_at_recommendation']
+            contexts.append(restaurant)
+        states = build_rl_feature_matrix(contexts, CATEGORY_KEYS)
+        candidates = states[:options['candidates']]
+        labels = np.array([1 if e['action'] == 'like' else 0 for e in events])
+
+        report = {'events': len(events), 'users': len({e['user_id'] for e in events}), 'rankers': {}}
+        for name in rankers:
+            self.stdout.write(f"Replaying {len(events)} events through '{name}'...")
+            replay = _REPLAYS[name]()
+            scores = np.zeros(len(events))
+            score_times, update_times, batch_times = [], [], []
+            for i, e in enumerate(events):
+                start = time.perf_counter()
+                scores[i] = replay.score(e['user_id'], states[i:i + 1])[0]
+                score_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                replay.update(e['user_id'], states[i], FEEDBACK_ACTION_INDEX[e['action']], FEEDBACK_REWARDS[e['action']])
+                update_times.append(time.perf_counter() - start)
+
+                if i % 50 == 0:
+                    start = time.perf_counter()
+                    replay.score(e['user_id'], candidates)
+                    batch_times.append(time.perf_counter() - start)
+
+            report['rankers'][name] = {
+                'auc': self._auc(labels, scores),
+                'update_ms_p50': _percentile_ms(update_times, 50),
+                'update_ms_p95': _percentile_ms(update_times, 95),
+                'score_one_ms_p50': _percentile_ms(score_times, 50),
+                f'score_{len(candidates)}_candidates_ms_p50': _percentile_ms(batch_times, 50),
+                'total_seconds': float(sum(update_times) + sum(score_times)),
+            }
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    def _load_logged_events(self, limit):
+        from recommender.feedback_log import feedback_buffer
+        from recommender.models import UserFeedback
+
+        feedback_buffer.flush()
+        rows = UserFeedback.objects.order_by('-timestamp').values_list(
+            'user_id', 'restaurant_id', 'action', 'score_at_recommendation', 'timestamp')[:limit]
+        events = [
+            {'user_id': u, 'restaurant_id': r, 'action': a, 'score_at_recommendation': s, 'timestamp': t.timestamp()}
+            for u, r, a, s, t in rows
+        ]
+        events.reverse()
+        return events
+
+    def _auc(self, labels, scores):
+        if labels.min() == labels.max():
+            return None # AUC is undefined with a single class
+        from sklearn.metrics import roc_auc_score
+        return float(roc_auc_score(labels, scores))
@@ -0,0 +1,30 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from recommender.bandit import RANKERS
+from recommender.retraining import retrain_from_feedback
+
+
+class Command(BaseCommand):
+    help = ("Retrains the per-user rankers on the UserFeedback events not yet trained on, "
+            "in a process pool. Run it from cron, or with --interval to keep it running.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ranker', choices=RANKERS, help="Model to train (default: settings.RECOMMENDER_RANKER).")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+        parser.add_argument('--lag-seconds', type=int, default=0,
+                            help="Leave events newer than this for a later run.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="If set, run again every this many seconds instead of exiting.")
+
+    def handle(self, *args, **options):
+        while True:
+            summary = retrain_from_feedback(
+                ranker=options['ranker'],
+                workers=options['workers'],
+                lag_seconds=options['lag_seconds'],
+            )
+            self.stdout.write(json.dumps(summary))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:06
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFeedback',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.CharField(db_index=True, max_length=255)),
+                ('restaurant_id', models.CharField(db_index=True, max_length=255)),
+                ('action', models.CharField(choices=[('like', 'Like'), ('dislike', 'Dislike'), ('click_details', 'Click Details'), ('skip', 'Skip')], max_length=15)),
+                ('score_at_recommendation', models.FloatField(default=0.0)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'timestamp'], name='feedback_user_time_idx')],
+            },
+        ),
+    ]
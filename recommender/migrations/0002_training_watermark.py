@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingWatermark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('trained_until', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userfeedback',
+            index=models.Index(fields=['timestamp'], name='feedback_time_idx'),
+        ),
+    ]
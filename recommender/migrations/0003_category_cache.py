@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0002_training_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCacheEntry',
+            fields=[
+                ('place_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('inputs_hash', models.CharField(max_length=32)),
+                ('dictionary_version', models.CharField(db_index=True, max_length=16)),
+                ('inputs', models.JSONField()),
+                ('categories', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
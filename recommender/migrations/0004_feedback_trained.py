@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:13
+
+from django.db import migrations, models
+
+
+def mark_consumed_events_trained(apps, schema_editor):
+    # Events up to the last watermark were consumed by the retraining job before it tracked them per event.
+    TrainingWatermark = apps.get_model('recommender', 'TrainingWatermark')
+    UserFeedback = apps.get_model('recommender', 'UserFeedback')
+    latest = TrainingWatermark.objects.order_by('-trained_until').values_list('trained_until', flat=True).first()
+    if latest is not None:
+        UserFeedback.objects.filter(timestamp__lte=latest).update(trained=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0003_category_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfeedback',
+            name='ranker',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='userfeedback',
+            name='trained',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='userfeedback',
+            index=models.Index(fields=['trained', 'ranker', 'timestamp'], name='feedback_untrained_idx'),
+        ),
+        migrations.RunPython(mark_consumed_events_trained, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The table only caches computed categories, so it is recreated rather than migrated:
+    # its primary key changes from place_id to an id, with one row per (place_id, inputs_hash).
+
+    dependencies = [
+        ('recommender', '0004_feedback_trained'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CategoryCacheEntry',
+        ),
+        migrations.CreateModel(
+            name='CategoryCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place_id', models.CharField(max_length=255)),
+                ('inputs_hash', models.CharField(max_length=32)),
+                ('dictionary_version', models.CharField(db_index=True, max_length=16)),
+                ('inputs', models.JSONField()),
+                ('categories', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('place_id', 'inputs_hash'), name='category_cache_place_inputs_uniq')],
+            },
+        ),
+    ]
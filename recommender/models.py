@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 
 class UserFeedback(models.Model):
@@ -17,7 +18,57 @@ class UserFeedback(models.Model):
     restaurant_id = models.CharField(max_length=255, db_index=True)
     action = models.CharField(max_length=15, choices=ACTION_CHOICES)
     score_at_recommendation = models.FloatField(default=0.0) # The hybrid score when it was shown
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event is received, not when the buffered batch is written.
+    timestamp = models.DateTimeField(default=timezone.now)
+    ranker = models.CharField(max_length=16, blank=True, default='') # Ranker the feedback was for; empty on older events
+    # Whether a ranker has been trained on the event: online in record_feedback, or by the retraining job.
+    trained = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Range reads of a user's recent history
+            models.Index(fields=['user_id', 'timestamp'], name='feedback_user_time_idx'),
+            # Range reads of events by time
+            models.Index(fields=['timestamp'], name='feedback_time_idx'),
+            # Untrained events, read by the retraining job
+            models.Index(fields=['trained', 'ranker', 'timestamp'], name='feedback_untrained_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user_id} -> {self.action} -> {self.restaurant_id}"
+
+
+class TrainingWatermark(models.Model):
+    """
+    Records the last run of the retraining job, one row per model type. Which events have been
+    trained on is tracked per event (UserFeedback.trained).
+    """
+    name = models.CharField(max_length=64, primary_key=True) # e.g. 'dqn' or 'linucb'
+    trained_until = models.DateTimeField() # Time of the last completed run
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} trained until {self.trained_until}"
+
+
+class CategoryCacheEntry(models.Model):
+    """
+    The categories computed for a place from one set of inputs, so they are only recomputed when
+    the inputs or CATEGORY_DICT change (see categorization.py). A place has one entry per search
+    keyword; entries superseded by new inputs for the same keyword are deleted when it is stored.
+    """
+    place_id = models.CharField(max_length=255)
+    inputs_hash = models.CharField(max_length=32) # Hash of the categorization inputs, including the search keyword
+    dictionary_version = models.CharField(max_length=16, db_index=True) # Hash of the CATEGORY_DICT used
+    inputs = models.JSONField() # Name, vicinity, description, types, review texts and keyword, for recategorize
+    categories = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also the index of the lookups, which are by both
+            models.UniqueConstraint(fields=['place_id', 'inputs_hash'], name='category_cache_place_inputs_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.place_id} -> {self.categories}"
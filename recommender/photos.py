@@ -0,0 +1,268 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from django.conf import settings
+from .singleflight import photo_flight
+
+try:
+    from PIL import Image # Optional: without Pillow every width is fetched from Google instead of resized here
+except ImportError:
+    Image = None
+
+# =================== # # Restaurant photos served by the backend: a photo reference is fetched from Google
+# === Photo Proxy === # # once, kept in a size-bounded on-disk LRU cache with its resized variants and served
+# =================== # # from disk, so the app needs no API key and repeat views cost no API calls.
+
+# Widths we serve; a requested width is rounded up to the next one, so a photo has at most this many variants.
+# The largest is the Places API maximum and is the source the others are resized from.
+PHOTO_WIDTHS = (100, 200, 400, 800, 1600)
+SOURCE_WIDTH = PHOTO_WIDTHS[-1]
+DEFAULT_PHOTO_WIDTH = 400
+
+# Photo references are opaque URL-safe tokens.
+_REFERENCE_RE = re.compile(r'^[A-Za-z0-9_-]{1,2048}$')
+
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+class PhotoNotFound(Exception):
+    """Google did not return an image for the photo reference."""
+
+
+def is_valid_photo_reference(photo_reference):
+    return bool(_REFERENCE_RE.match(photo_reference or ''))
+
+
+def snap_width(width):
+    """Rounds a requested width up to one of PHOTO_WIDTHS (the largest if it is wider than all of them)."""
+    for candidate in PHOTO_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return PHOTO_WIDTHS[-1]
+
+
+def image_content_type(head):
+    """Returns the MIME type of an image from its first bytes, or None if they are not a known image format."""
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def resize_image(data, width):
+    """
+    Scales an image down to `width` pixels wide, keeping its format and aspect ratio.
+
+    Returns:
+        bytes: The resized image, or the original bytes if it is not wider than `width`.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width <= width:
+            return data
+        image_format = image.format
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        if image_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+            resized = resized.convert('RGB')
+        out = io.BytesIO()
+        save_options = {'quality': 85, 'optimize': True} if image_format == 'JPEG' else {'optimize': True}
+        resized.save(out, format=image_format, **save_options)
+        return out.getvalue()
+
+
+class PhotoCache:
+    """
+    A size-bounded directory of photo files, shared by the worker processes on the host.
+
+    Files are named by a hash of the photo reference and the width. Hits refresh the file's mtime
+    (at most once a minute), and when the directory grows past max_bytes the least recently used
+    files are removed until it is back under 90% of it. Files are written to a temporary name
+    and renamed, so readers never see a partial file.
+
+    References Google had no image for are remembered (per process) for not_found_ttl seconds,
+    so clients repeating a bad reference do not each cost an API call.
+    """
+    TOUCH_INTERVAL = 60
+    LOW_WATERMARK = 0.9
+    MAX_NOT_FOUND = 10000
+
+    def __init__(self, directory, max_bytes, not_found_ttl=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.not_found_ttl = not_found_ttl
+        self._total_bytes = None  # Counted on the first write
+        self._not_found = {}  # photo_reference -> expiry (monotonic)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(photo_reference):
+        return hashlib.sha256(photo_reference.encode('utf-8')).hexdigest()[:32]
+
+    def path(self, photo_reference, variant):
+        return os.path.join(self.directory, f"{self.key(photo_reference)}_{variant}")
+
+    def get(self, photo_reference, variant):
+        """Returns the path of the cached file, or None on a miss."""
+        path = self.path(photo_reference, variant)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - mtime > self.TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return None  # Evicted by another worker meanwhile
+        return path
+
+    def is_not_found(self, photo_reference):
+        """True if Google recently answered the reference without an image."""
+        with self._lock:
+            expires = self._not_found.get(photo_reference)
+            if expires is None:
+                return False
+            if expires > time.monotonic():
+                return True
+            del self._not_found[photo_reference]
+            return False
+
+    def mark_not_found(self, photo_reference):
+        if self.not_found_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._not_found) >= self.MAX_NOT_FOUND:
+                self._not_found = {ref: expires for ref, expires in self._not_found.items() if expires > now}
+                if len(self._not_found) >= self.MAX_NOT_FOUND:
+                    self._not_found.clear()
+            self._not_found[photo_reference] = now + self.not_found_ttl
+
+    def put(self, photo_reference, variant, data):
+        """Stores the bytes and returns the path of the file."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(photo_reference, variant)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _entries(self):
+        try:
+            return [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith('.tmp')]
+        except FileNotFoundError:
+            return []
+
+    def _scan_size(self):
+        total = 0
+        for entry in self._entries():
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self, keep=None):
+        """Removes the least recently used files until the cache is under the low watermark. Caller holds the lock."""
+        files = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        # Other workers write to the same directory, so start from the real size.
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * self.LOW_WATERMARK
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Evicted by another worker
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        if removed:
+            print(f"[PHOTO] Evicted {removed} cached photos; cache is now {total / 1e6:.1f} MB.")
+
+
+def get_photo(photo_reference, width, fetch, cache=None):
+    """
+    Returns the cached file of a photo at a served width, fetching it on a miss. With Pillow installed
+    the photo is fetched from Google once, at SOURCE_WIDTH, and the smaller widths are resized from
+    that; without it each width is fetched separately. Concurrent misses for the same file share one fetch.
+
+    Args:
+        photo_reference (str): The Places photo reference.
+        width (int): The requested width in pixels; rounded up with snap_width.
+        fetch (callable): fetch(photo_reference, max_width) -> image bytes; raises PhotoNotFound.
+        cache (PhotoCache): Defaults to the shared photo_cache.
+
+    Returns:
+        tuple: (path, hit) - the file to serve, and whether it was already cached.
+
+    Raises:
+        PhotoNotFound: From fetch, or without calling it if the reference recently was not found.
+    """
+    cache = cache or photo_cache
+    width = snap_width(width)
+    variant = f"w{width}"
+    path = cache.get(photo_reference, variant)
+    if path is not None:
+        return path, True
+    if cache.is_not_found(photo_reference):
+        raise PhotoNotFound(photo_reference)
+
+    def load():
+        cached = cache.get(photo_reference, variant)
+        if cached is not None:
+            return cached
+        if Image is None or width == SOURCE_WIDTH:
+            try:
+                data = fetch(photo_reference, width)
+            except PhotoNotFound:
+                cache.mark_not_found(photo_reference)
+                raise
+        else:
+            source_path, _ = get_photo(photo_reference, SOURCE_WIDTH, fetch, cache)
+            with open(source_path, 'rb') as f:
+                data = resize_image(f.read(), width)
+        return cache.put(photo_reference, variant, data)
+
+    return photo_flight.do((photo_reference, width), load), False
+
+
+def make_photo_cache():
+    return PhotoCache(
+        directory=getattr(settings, 'PHOTO_CACHE_DIR', os.path.join(settings.BASE_DIR, 'photo_cache')),
+        max_bytes=getattr(settings, 'PHOTO_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+        not_found_ttl=getattr(settings, 'PHOTO_NOT_FOUND_TTL_SECONDS', 300),
+    )
+
+
+photo_cache = make_photo_cache()
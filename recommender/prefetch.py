@@ -0,0 +1,204 @@
+import math
+import sys
+import threading
+import time
+from django.conf import settings
+from .get_restaurants import refresh_nearby_restaurants
+from .rate_limit import TokenBucket
+from .spatial import haversine_distances_m
+
+# ======================== # # Searches cluster around a few malls and campuses. Query locations feed a decayed
+# === Area Prefetching === # # heat map of grid tiles, and while the worker is idle the hottest tiles are searched
+# ======================== # # in the background, within a budget, so user searches there are answered locally.
+
+# Google returns at most 60 results per Nearby Search; prefetched answers are capped the same way.
+# A prefetch search that hit the cap may have missed places, so its circle answers no searches.
+PREFETCH_RESULT_LIMIT = 60
+PREFETCH_POLL_SECONDS = 5.0
+
+
+class HeatMap:
+    """
+    Thread-safe exponentially decayed query counts per grid tile. A query adds 1 to its tile and
+    heat halves every half_life_seconds. Beyond max_tiles, the coldest tiles are forgotten.
+    """
+    def __init__(self, tile_degrees=0.01, half_life_seconds=3600, max_tiles=10000):
+        self.tile_degrees = tile_degrees
+        self.half_life_seconds = half_life_seconds
+        self.max_tiles = max_tiles
+        self._tiles = {}  # (row, col) -> (heat, updated_at)
+        self._lock = threading.Lock()
+
+    def tile(self, latitude, longitude):
+        return math.floor(latitude / self.tile_degrees), math.floor(longitude / self.tile_degrees)
+
+    def tile_center(self, tile):
+        return (tile[0] + 0.5) * self.tile_degrees, (tile[1] + 0.5) * self.tile_degrees
+
+    def _decayed(self, heat, updated_at, now):
+        return heat * 0.5 ** ((now - updated_at) / self.half_life_seconds)
+
+    def record(self, latitude, longitude, now=None):
+        now = time.time() if now is None else now
+        tile = self.tile(latitude, longitude)
+        with self._lock:
+            heat, updated_at = self._tiles.get(tile, (0.0, now))
+            self._tiles[tile] = (self._decayed(heat, updated_at, now) + 1.0, now)
+            if len(self._tiles) > self.max_tiles:
+                coldest = sorted(self._tiles, key=lambda t: self._decayed(*self._tiles[t], now))
+                for t in coldest[:len(self._tiles) - self.max_tiles]:
+                    del self._tiles[t]
+
+    def hottest(self, min_heat=0.0, now=None):
+        """Returns [(tile, heat)] of the tiles with at least min_heat, hottest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            heats = [(tile, self._decayed(heat, updated_at, now)) for tile, (heat, updated_at) in self._tiles.items()]
+        return sorted(((tile, heat) for tile, heat in heats if heat >= min_heat), key=lambda item: -item[1])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tiles)
+
+
+class AreaPrefetcher:
+    """
+    Refreshes the restaurants of hot tiles in a background thread and tells the views which
+    searches the prefetched data already covers.
+
+    Args:
+        heat_map (HeatMap): Where query locations are recorded.
+        refresh (callable): refresh(latitude, longitude, radius_m, max_age) searches an area, stores
+                            the results and returns (results returned, details calls)
+                            (see get_restaurants.refresh_nearby_restaurants).
+        radius_m (float): Radius of the search made around each tile's centre.
+        refreshes_per_hour (float): Budget of background searches.
+        min_heat (float): Tiles cooler than this are not prefetched.
+        refresh_seconds (float): A tile is searched again once its data is this old.
+        fresh_seconds (float): Prefetched data older than this no longer answers searches.
+        idle_seconds (float): Only prefetch after this long without a search on this worker.
+    """
+    def __init__(self, heat_map, refresh, radius_m=6000, refreshes_per_hour=20, min_heat=3.0,
+                 refresh_seconds=1800, fresh_seconds=3600, idle_seconds=5.0):
+        self.heat_map = heat_map
+        self.refresh = refresh
+        self.radius_m = radius_m
+        self.budget = TokenBucket(refreshes_per_hour / 3600.0, burst=1)
+        self.min_heat = min_heat
+        self.refresh_seconds = refresh_seconds
+        self.fresh_seconds = fresh_seconds
+        self.idle_seconds = idle_seconds
+        self._refreshed = {}  # tile -> (time of the last background search, results it returned)
+        self._last_query = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'refreshes': 0, 'refresh_errors': 0, 'details_calls': 0, 'over_budget': 0, 'served': 0}
+
+    def record_query(self, latitude, longitude):
+        """Counts a search and starts the background thread on first use."""
+        self.heat_map.record(latitude, longitude)
+        with self._lock:
+            self._last_query = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='area-prefetcher', daemon=True)
+                self._thread.start()
+
+    def covers(self, latitude, longitude, radius):
+        """
+        True if a freshly prefetched search circle contains the whole query circle, so the
+        restaurants in the catalog are as complete as a new Google search would make them.
+        Circles whose search returned PREFETCH_RESULT_LIMIT results were truncated and do not count.
+        """
+        now = time.time()
+        row, col = self.heat_map.tile(latitude, longitude)
+        with self._lock:
+            fresh = []
+            for tile in ((row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)):
+                stamp, found = self._refreshed.get(tile, (0, 0))
+                if now - stamp <= self.fresh_seconds and found < PREFETCH_RESULT_LIMIT:
+                    fresh.append(tile)
+        for tile in fresh:
+            center_lat, center_lon = self.heat_map.tile_center(tile)
+            distance = float(haversine_distances_m(latitude, longitude, [center_lat], [center_lon])[0])
+            if distance + radius <= self.radius_m:
+                with self._lock:
+                    self._stats['served'] += 1
+                return True
+        return False
+
+    def _idle(self):
+        with self._lock:
+            return time.monotonic() - self._last_query >= self.idle_seconds
+
+    def run_once(self):
+        """Prefetches the hottest tile that is due, if the worker is idle and the budget allows. Returns the tile or None."""
+        if not self._idle():
+            return None
+        now = time.time()
+        with self._lock:
+            due = [tile for tile, _ in self.heat_map.hottest(self.min_heat, now)
+                   if now - self._refreshed.get(tile, (0, 0))[0] >= self.refresh_seconds]
+        if not due:
+            return None
+        if not self.budget.try_acquire():
+            with self._lock:
+                self._stats['over_budget'] += 1
+            return None
+
+        tile = due[0]
+        center_lat, center_lon = self.heat_map.tile_center(tile)
+        start = time.monotonic()
+        try:
+            found, details_calls = self.refresh(center_lat, center_lon, self.radius_m, self.refresh_seconds)
+        except Exception as e:
+            print(f"[PREFETCH] ERROR: Could not refresh tile {tile}: {e}", file=sys.stderr)
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+            return None
+        with self._lock:
+            # Stamped with the start time: the data is at least as fresh as the search.
+            self._refreshed[tile] = (now, found)
+            self._stats['refreshes'] += 1
+            self._stats['details_calls'] += details_calls
+        print(f"[PREFETCH] Refreshed tile {tile} around ({center_lat:.4f}, {center_lon:.4f}): {found} places, "
+              f"{details_calls} details calls, {time.monotonic() - start:.1f}s.")
+        return tile
+
+    def _run(self):
+        while True:
+            time.sleep(PREFETCH_POLL_SECONDS)
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[PREFETCH] ERROR: {e}", file=sys.stderr)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            stats = dict(self._stats)
+            fresh = [found for stamp, found in self._refreshed.values() if now - stamp <= self.fresh_seconds]
+            stats['fresh_tiles'] = len(fresh)
+            stats['truncated_tiles'] = sum(1 for found in fresh if found >= PREFETCH_RESULT_LIMIT)
+        stats['tracked_tiles'] = len(self.heat_map)
+        return stats
+
+
+def make_area_prefetcher():
+    """Builds the prefetcher from the PREFETCH_* settings, or returns None if PREFETCH_ENABLED is off."""
+    if not getattr(settings, 'PREFETCH_ENABLED', False):
+        return None
+    return AreaPrefetcher(
+        HeatMap(tile_degrees=getattr(settings, 'PREFETCH_TILE_DEGREES', 0.01),
+                half_life_seconds=getattr(settings, 'PREFETCH_HALF_LIFE_SECONDS', 3600)),
+        refresh_nearby_restaurants,
+        radius_m=getattr(settings, 'PREFETCH_RADIUS_M', 6000),
+        refreshes_per_hour=getattr(settings, 'PREFETCH_REFRESHES_PER_HOUR', 20),
+        min_heat=getattr(settings, 'PREFETCH_MIN_HEAT', 3.0),
+        refresh_seconds=getattr(settings, 'PREFETCH_REFRESH_SECONDS', 1800),
+        fresh_seconds=getattr(settings, 'PREFETCH_FRESH_SECONDS', 3600),
+        idle_seconds=getattr(settings, 'PREFETCH_IDLE_SECONDS', 5.0),
+    )
+
+
+# Shared prefetcher of this worker process (None when prefetching is disabled).
+area_prefetcher = make_area_prefetcher()
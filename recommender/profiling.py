@@ -0,0 +1,149 @@
+import contextvars
+import cProfile
+import os
+import pstats
+import random
+import sys
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+# ========================= # # Opt-in cProfile of single requests. A request is profiled when it carries a valid
+# === Request Profiling === # # signed header, or is picked by PROFILING_SAMPLE_RATE. With neither enabled the
+# ========================= # # middleware removes itself at startup, so it costs nothing.
+
+PROFILING_HEADER = 'HTTP_X_RECOMMENDER_PROFILE'  # X-Recommender-Profile
+_TOKEN_SALT = 'recommender.profiling'
+
+# Profiles of the executor jobs (see run_profiled) of the request being profiled, or None.
+_job_profiles = contextvars.ContextVar('recommender_job_profiles', default=None)
+
+
+def current_job_profiles():
+    """The list collecting the profiles of the current request's executor jobs, or None if it is not profiled."""
+    return _job_profiles.get()
+
+
+def run_profiled(profiles, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) under a profiler of its own and appends the profile to `profiles`.
+    cProfile only sees the thread it runs in, so executor jobs of a profiled request (run_io)
+    are profiled this way and merged into the request's profile.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Only one profiler can be active at a time on this Python version.
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiles.append(profiler)
+
+
+def make_profiling_token():
+    """Returns a value for the X-Recommender-Profile header, valid for PROFILING_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=_TOKEN_SALT).sign('profile')
+
+
+def _valid_token(value):
+    try:
+        signing.TimestampSigner(salt=_TOKEN_SALT).unsign(
+            value, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 24 * 60 * 60))
+        return True
+    except signing.BadSignature:
+        return False
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected requests under PROFILING_PATH_PREFIX and writes each profile as a pstats
+    file (open with `python -m pstats` or snakeviz) to PROFILING_DIR.
+
+    Retention: profiles requested by header and profiles slower than PROFILING_SLOW_MS are always
+    kept; other sampled profiles are kept with probability PROFILING_RETAIN_RATE. Only the newest
+    PROFILING_MAX_FILES files are kept.
+
+    The async views run the pipeline on run_io executor threads. Those jobs are profiled in their
+    own threads and merged into the request's profile; code running directly on the event loop
+    (request parsing, projection) is not in it.
+    """
+    def __init__(self, get_response):
+        self.header_enabled = getattr(settings, 'PROFILING_HEADER_ENABLED', False)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if not self.header_enabled and self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path_prefix = getattr(settings, 'PROFILING_PATH_PREFIX', '/recommender/')
+        self.directory = getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 1000)
+        self.retain_rate = getattr(settings, 'PROFILING_RETAIN_RATE', 0.1)
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 200)
+
+    def _requested(self, request):
+        """Returns 'header', 'sample' or None."""
+        if not request.path.startswith(self.path_prefix):
+            return None
+        if self.header_enabled and PROFILING_HEADER in request.META and _valid_token(request.META[PROFILING_HEADER]):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        reason = self._requested(request)
+        if reason is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process.
+            return self.get_response(request)
+        job_profiles = []
+        token = _job_profiles.set(job_profiles)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            _job_profiles.reset(token)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if reason == 'header' or elapsed_ms >= self.slow_ms or random.random() < self.retain_rate:
+            try:
+                response['X-Profile-Id'] = self._save(profiler, job_profiles, request, elapsed_ms)
+            except OSError as e:
+                print(f"[PROFILE] ERROR: Could not write the profile: {e}", file=sys.stderr)
+        return response
+
+    def _save(self, profiler, job_profiles, request, elapsed_ms):
+        os.makedirs(self.directory, exist_ok=True)
+        name = request.path.strip('/').replace('/', '_') or 'root'
+        profile_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{int(elapsed_ms)}ms_{name}_{os.getpid()}_{random.getrandbits(24):06x}"
+        stats = pstats.Stats(profiler)
+        for job_profile in job_profiles:
+            stats.add(job_profile)
+        stats.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+
+        # A short summary in the log: the recommender functions with the most cumulative time.
+        own = sorted(((value[3], func) for func, value in stats.stats.items() if f"{os.sep}recommender{os.sep}" in func[0]),
+                     reverse=True)[:5]
+        summary = ', '.join(f"{func[2]} {cumulative * 1000:.0f}ms" for cumulative, func in own)
+        print(f"[PROFILE] {request.method} {request.path} took {elapsed_ms:.0f}ms ({profile_id}). Top: {summary}")
+
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        files = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.prof')),
+                       key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Pruned by another worker
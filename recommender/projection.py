@@ -0,0 +1,73 @@
+"""
+Response projection for the recommendation endpoints.
+
+Clients can ask for a subset of fields (e.g. `fields=place_id,name,final_score_with_rl`)
+and for a compact columnar layout, where each field is sent once as a key followed by a
+list of values, instead of repeating every key for every restaurant.
+"""
+
+LAYOUT_ROWS = 'rows'
+LAYOUT_COLUMNAR = 'columnar'
+LAYOUTS = (LAYOUT_ROWS, LAYOUT_COLUMNAR)
+
+
+def parse_projection(params):
+    """
+    Reads the projection options from a dict-like object (request.GET or a JSON body).
+
+    Args:
+        params: An object with a .get() method. 'fields' may be a comma-separated string
+                or a list of field names; 'layout' is either 'rows' or 'columnar'.
+
+    Returns:
+        tuple: (fields, layout) where fields is None when no projection was requested.
+
+    Raises:
+        ValueError: If the layout is unknown or fields has the wrong type.
+    """
+    fields = params.get('fields')
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    elif fields is not None and not (isinstance(fields, list) and all(isinstance(f, str) for f in fields)):
+        raise ValueError("fields must be a comma-separated string or a list of field names.")
+
+    layout = params.get('layout') or LAYOUT_ROWS
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of: {', '.join(LAYOUTS)}.")
+
+    if fields:
+        # Remove duplicates while keeping the requested order.
+        fields = list(dict.fromkeys(fields))
+    return fields or None, layout
+
+
+def project_restaurants(restaurants, fields=None, layout=LAYOUT_ROWS):
+    """
+    Builds the response payload for a list of restaurant dictionaries.
+
+    Args:
+        restaurants (list): The restaurant dictionaries to return.
+        fields (list): The keys to keep, or None to keep every key.
+        layout (str): 'rows' returns a list of dicts, 'columnar' returns
+                      {"fields": [...], "count": n, "columns": {field: [values...]}}.
+                      Without fields, the columns are every key of any restaurant, in the
+                      order they first appear; restaurants without a key get None there.
+
+    Returns:
+        list | dict: A JSON-serializable payload. The original dictionaries are
+                     returned untouched when no projection is requested; projected rows
+                     leave out the fields a restaurant does not have.
+    """
+    if layout == LAYOUT_COLUMNAR:
+        if fields is None:
+            # Rows differ in their keys, e.g. 'restricted', or basic and full details.
+            fields = list(dict.fromkeys(key for r in restaurants for key in r))
+        return {
+            'fields': fields,
+            'count': len(restaurants),
+            'columns': {field: [r.get(field) for r in restaurants] for field in fields},
+        }
+
+    if fields is None:
+        return restaurants
+    return [{field: r[field] for field in fields if field in r} for r in restaurants]
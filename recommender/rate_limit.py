@@ -0,0 +1,249 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+# ================================ # # Every Google Places call goes through one scheduler per process: a token
+# === Places API Rate Limiting === # # bucket per endpoint keeps us inside the quota, an AIMD concurrency limit
+# ================================ # # backs off when Google throttles, and failed calls are retried with jitter.
+
+# Places API statuses worth retrying; OVER_QUERY_LIMIT also means we are sending too fast.
+RETRYABLE_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+
+def is_throttled(error):
+    """True if the error means Google is rate-limiting us."""
+    if isinstance(error, ApiError):
+        return error.status == 'OVER_QUERY_LIMIT'
+    return isinstance(error, HTTPError) and error.status_code == 429
+
+
+def is_retryable(error):
+    if isinstance(error, ApiError):
+        return error.status in RETRYABLE_STATUSES
+    if isinstance(error, HTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (Timeout, TransportError))
+
+
+def is_page_token_pending(error):
+    """A next_page_token used before Google has activated it is answered with INVALID_REQUEST."""
+    return isinstance(error, ApiError) and error.status == 'INVALID_REQUEST'
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average and bursts of up to `burst` calls. Thread-safe."""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token, going into debt if there is none. Returns how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self):
+        """Takes a token if one is available, without waiting. Returns True if it did."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self):
+        """Blocks until a call is allowed. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Caps the calls in flight with an AIMD limit: each success raises the limit by 1/limit
+    (about +1 per round trip), each throttled call halves it.
+    """
+    def __init__(self, initial, minimum=1, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class PlacesCallScheduler:
+    """
+    Runs Google Maps client calls under the per-endpoint rate budgets and the adaptive
+    concurrency limit, retrying retryable failures with full-jitter exponential backoff.
+
+    Args:
+        budgets (dict): {endpoint: calls per second}, e.g. {'places_nearby': 5, 'place': 20}. 0 disables a bucket.
+        max_retries (int): Retries after the first attempt.
+        max_concurrency (int): Upper bound (and start value) of the adaptive concurrency limit.
+        backoff_base (float): Backoff of the first retry, in seconds; doubles per retry.
+        backoff_cap (float): Longest backoff, in seconds.
+        page_token_delay (float): Wait before the first use of a next_page_token, in seconds.
+        page_token_poll (float): Wait between further attempts while the token is not yet active.
+        page_token_timeout (float): Total time to wait for a token before giving up.
+        seed (int): Seed of the backoff jitter.
+    """
+    def __init__(self, budgets, max_retries=4, max_concurrency=16, backoff_base=0.2, backoff_cap=5.0,
+                 page_token_delay=1.5, page_token_poll=0.5, page_token_timeout=10.0, seed=None):
+        self.buckets = {endpoint: TokenBucket(rate) for endpoint, rate in budgets.items()}
+        self.concurrency = AdaptiveConcurrencyLimit(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.page_token_delay = page_token_delay
+        self.page_token_poll = page_token_poll
+        self.page_token_timeout = page_token_timeout
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'attempts': 0, 'retries': 0, 'throttled': 0, 'failed': 0,
+                       'page_token_polls': 0, 'rate_limit_wait_seconds': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def backoff(self, attempt):
+        """Full jitter: a uniform delay up to base * 2**attempt, capped."""
+        with self._lock:
+            return self._rng.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(self, endpoint, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) as a call to `endpoint`, with rate limiting and retries."""
+        self._count('calls')
+        bucket = self.buckets.get(endpoint)
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited:
+                    self._count('rate_limit_wait_seconds', waited)
+            self.concurrency.acquire()
+            self._count('attempts')
+            throttled = False
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if 'page_token' in kwargs and is_page_token_pending(e):
+                    raise  # Not a failure; next_page polls again
+                throttled = is_throttled(e)
+                if throttled:
+                    self._count('throttled')
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+            finally:
+                self.concurrency.release(throttled=throttled)
+            self._count('retries')
+            delay = self.backoff(attempt)
+            print(f"[RATE_LIMIT] {endpoint} attempt {attempt + 1} failed, retrying in {delay:.2f}s.")
+            time.sleep(delay)
+
+    def page_token_delays(self):
+        """Waits before each attempt to use a next_page_token: the initial delay, then polls until the timeout."""
+        delays = [self.page_token_delay]
+        elapsed = self.page_token_delay
+        while elapsed + self.page_token_poll <= self.page_token_timeout:
+            delays.append(self.page_token_poll)
+            elapsed += self.page_token_poll
+        return delays
+
+    def next_page(self, places_nearby, page_token):
+        """Fetches the next results page, polling until the token is active."""
+        error = None
+        for delay in self.page_token_delays():
+            time.sleep(delay)
+            self._count('page_token_polls')
+            try:
+                return self.call('places_nearby', places_nearby, page_token=page_token)
+            except ApiError as e:
+                if not is_page_token_pending(e):
+                    raise
+                error = e
+        raise error
+
+    async def anext_page(self, places_nearby, page_token, run_io):
+        """Async version of next_page; the waits are asyncio sleeps and the calls go through run_io."""
+        error = None
+        for delay in self.page_token_delays():
+            await asyncio.sleep(delay)
+            self._count('page_token_polls')
+            try:
+                return await run_io(self.call, 'places_nearby', places_nearby, page_token=page_token)
+            except ApiError as e:
+                if not is_page_token_pending(e):
+                    raise
+                error = e
+        raise error
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['concurrency_limit'] = self.concurrency.limit
+        return stats
+
+
+class KeyedRateLimit:
+    """A TokenBucket per key (e.g. per client address), for the max_keys most recently seen keys. Thread-safe."""
+    def __init__(self, rate, burst=None, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_acquire()
+
+
+def make_places_scheduler():
+    """Builds a scheduler from the GOOGLE_PLACES_* / GOOGLE_MAPS_* settings."""
+    return PlacesCallScheduler(
+        budgets={
+            'places_nearby': getattr(settings, 'GOOGLE_PLACES_NEARBY_QPS', 5),
+            'place': getattr(settings, 'GOOGLE_PLACES_DETAILS_QPS', 20),
+            'photo': getattr(settings, 'GOOGLE_PLACES_PHOTO_QPS', 20),
+        },
+        max_retries=getattr(settings, 'GOOGLE_MAPS_MAX_RETRIES', 4),
+        max_concurrency=getattr(settings, 'GOOGLE_MAPS_MAX_CONCURRENCY', 16),
+    )
@@ -1,14 +1,12 @@
 import numpy as np
 import random
 from collections import deque
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.optimizers import Adam
 import os
 import json
-# --- NEW IMPORTS ---
-from firebase_admin import firestore
-import numpy as np
+# TensorFlow/Keras is imported on first use (see _build_model) so that importing this module stays cheap.
+from .storage import get_store
+from .constants import CATEGORY_KEYS
+from .feature_store import NUMERIC_INDEX, gather_features, masks_to_matrix
 
 
 # --- RL Agent Configuration ---
@@ -16,7 +14,7 @@ STATE_SIZE = 35 # This should match the number of features from your content_bas
 ACTION_SIZE = 4  # like, dislike, click, skip
 
 class DQNAgent:
-    def __init__(self, state_size, action_size, user_id):
+    def __init__(self, state_size, action_size, user_id, weights=None):
         self.state_size = state_size
         self.action_size = action_size
         self.memory = deque(maxlen=2000)
@@ -27,13 +25,20 @@ class DQNAgent:
         self.learning_rate = 0.001
         self.user_id = user_id
         self.model = self._build_model()
-        # --- NEW: Load model from Firestore on initialization ---
-        self.load_model_from_firestore()
+        # Load the user's saved weights on initialization, unless the caller already fetched them
+        if weights is not None:
+            self.model.set_weights(weights)
+        else:
+            self.load_model()
 
     def _build_model(self):
         """
         Builds a new DQN model.
         """
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense
+        from tensorflow.keras.optimizers import Adam
+
         model = Sequential()
         model.add(Dense(64, input_dim=self.state_size, activation='relu'))
         model.add(Dense(32, activation='relu'))
@@ -67,6 +72,19 @@ class DQNAgent:
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
+    def replay_batch(self, states, actions, rewards, batch_size=32, epochs=1):
+        """
+        Trains on many single-step experiences at once, as used by the retraining job.
+        Every feedback event ends its episode (done=True), so each target is the reward for the
+        taken action, as in replay(), but the Q-values and the fit are computed in batches.
+        """
+        states = np.reshape(states, [-1, self.state_size])
+        if not len(states):
+            return
+        targets = self.model.predict(states, verbose=0, batch_size=max(1, len(states)))
+        targets[np.arange(len(states)), np.asarray(actions, dtype=int)] = rewards
+        self.model.fit(states, targets, batch_size=batch_size, epochs=epochs, verbose=0)
+
     def get_q_values(self, state):
         """
         Predicts the Q-values for a given state using the neural network.
@@ -81,53 +99,48 @@ class DQNAgent:
         q_values = self.model.predict(state, verbose=0)
         return q_values[0]
 
-    def load_model_from_firestore(self):
-        """Loads model weights from a Firestore document."""
+    def get_q_values_batch(self, states):
+        """
+        Predicts the Q-values for a matrix of states (one row per restaurant) in a
+        single forward pass, instead of one predict call per restaurant.
+        """
+        states = np.reshape(states, [-1, self.state_size])
+        return self.model.predict(states, verbose=0, batch_size=max(1, len(states)))
+
+    def load_model(self):
+        """Loads this user's model weights from the configured store (Firestore by default)."""
         try:
-            db = firestore.client()
-            doc_ref = db.collection('rl_models').document(self.user_id)
-            doc = doc_ref.get()
-
-            if doc.exists:
-                weights_data = doc.to_dict().get('weights')
-                if weights_data:
-                    # Reconstruct weights from flattened list and shape
-                    reconstructed_weights = []
-                    for w_data in weights_data:
-                        shape = tuple(w_data['shape'])
-                        values = np.array(w_data['values'], dtype=np.float32)
-                        reconstructed_weights.append(values.reshape(shape))
-                    
-                    self.model.set_weights(reconstructed_weights)
-                    print(f"  [RL] INFO: Loaded model for user {self.user_id} from Firestore.")
+            weights = get_store().get_model_weights(self.user_id)
+            if weights:
+                self.model.set_weights(weights)
+                print(f"  [RL] INFO: Loaded model for user {self.user_id} from the store.")
             else:
-                print(f"  [RL] INFO: No model found for user {self.user_id} in Firestore. Building a new one.")
+                print(f"  [RL] INFO: No model found for user {self.user_id} in the store. Building a new one.")
         except Exception as e:
-            print(f"  [RL] ERROR: Failed to load model from Firestore for user {self.user_id}. Error: {e}")
+            print(f"  [RL] ERROR: Failed to load model from the store for user {self.user_id}. Error: {e}")
 
-    def save_model_to_firestore(self):
-        """Saves model weights to a Firestore document."""
+    def save_model(self):
+        """Saves this user's model weights to the configured store (Firestore by default)."""
         try:
-            db = firestore.client()
-            doc_ref = db.collection('rl_models').document(self.user_id)
-            
-            # Convert weights to a Firestore-compatible format
-            # (list of dicts with shape and flattened values)
-            weights = self.model.get_weights()
-            weights_serializable = []
-            for w in weights:
-                weights_serializable.append({
-                    'shape': list(w.shape),
-                    'values': w.flatten().tolist()
-                })
-
-            doc_ref.set({
-                'weights': weights_serializable,
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
-            print(f"  [RL FEEDBACK] Saved model to Firestore for user {self.user_id}.")
+            get_store().put_model_weights(self.user_id, self.model.get_weights())
+            print(f"  [RL FEEDBACK] Saved model to the store for user {self.user_id}.")
         except Exception as e:
-            print(f"  [RL] ERROR: Failed to save model to Firestore for user {self.user_id}. Error: {e}")
+            print(f"  [RL] ERROR: Failed to save model to the store for user {self.user_id}. Error: {e}")
+
+
+def dqn_q_values(weights, states):
+    """
+    The DQN's forward pass in NumPy, from a list of Keras weights ([kernel, bias] per Dense layer).
+    Gives the same Q-values as DQNAgent.get_q_values_batch without building a Keras model, and
+    works directly on read-only buffers such as the shared weight arena's.
+    """
+    x = np.reshape(states, [-1, weights[0].shape[0]]).astype(np.float32, copy=False)
+    last = len(weights) - 2
+    for i in range(0, len(weights), 2):
+        x = x @ weights[i] + weights[i + 1]
+        if i < last:
+            np.maximum(x, 0, out=x)  # relu on the hidden layers, linear output
+    return x
 
 
 # --- Feature Extraction (Helper Function) ---
@@ -167,3 +180,40 @@ def extract_rl_features(restaurant, all_categories):
         features.append(0)
 
     return np.array(features[:STATE_SIZE]).reshape(1, -1)
+
+
+
+def build_rl_feature_matrix(restaurants, all_categories):
+    """
+    Builds the extract_rl_features vectors for a list of restaurants as one matrix.
+    Rating, price level and categories of restaurants ingested by this server are gathered
+    from the feature store; other restaurants fall back to extract_rl_features.
+    The hybrid score column (index 2) is taken from 'final_score' when present; callers
+    scoring many users against the same restaurants can overwrite that column per user.
+    """
+    features = np.zeros((len(restaurants), STATE_SIZE))
+    if not restaurants:
+        return features
+
+    # The stored category bits follow CATEGORY_KEYS, so they can only be used for that ordering.
+    numeric, masks, found = gather_features(restaurants) if list(all_categories) == CATEGORY_KEYS \
+        else (None, None, np.zeros(len(restaurants), dtype=bool))
+
+    if found.any():
+        # Same sanitization and defaults as extract_rl_features.
+        rating = numeric[found, NUMERIC_INDEX['rating']]
+        price_level = numeric[found, NUMERIC_INDEX['price_level']]
+        features[found, 0] = np.where(np.isnan(rating), 3.0, rating) / 5.0
+        features[found, 1] = np.trunc(np.where(np.isnan(price_level), 2, price_level)) / 4.0
+        num_cats = min(len(CATEGORY_KEYS), STATE_SIZE - 3)
+        features[found, 3:3 + num_cats] = masks_to_matrix(masks[found])[:, :num_cats]
+
+    for row, restaurant in enumerate(restaurants):
+        if found[row]:
+            try:
+                features[row, 2] = float(restaurant.get('final_score', 0.0))
+            except (ValueError, TypeError):
+                features[row, 2] = 0.0
+        else:
+            features[row] = extract_rl_features(restaurant, all_categories)[0]
+    return features
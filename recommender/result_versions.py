@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# ======================= # # Each get_restaurants result set gets a content version: a hash of its restaurants
+# === Result Versions === # # in order. It is sent as the ETag, so clients polling an unchanged area get a 304,
+# ======================= # # and recent versions are kept so that clients can ask for only what changed since.
+
+
+def serialize_rows(rows):
+    """Serializes each restaurant dictionary to JSON (keys sorted, so equal dictionaries give equal text)."""
+    return [json.dumps(row, cls=DjangoJSONEncoder, sort_keys=True) for row in rows]
+
+
+def _digest(text, size):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=size).hexdigest()
+
+
+class ResultVersionStore:
+    """
+    A thread-safe, size-bounded, in-process record of recent result sets: version -> {place_id: digest}.
+    The least recently used versions are dropped first. Versions are per worker process; a delta
+    request for a version this worker does not know falls back to the full result set.
+    """
+    def __init__(self, max_versions=1024):
+        self.max_versions = max_versions
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, place_ids, row_texts, variant=''):
+        """
+        Computes the version of a result set and remembers its contents.
+
+        Args:
+            place_ids (list): The place_id of each restaurant, in response order.
+            row_texts (list): The serialized restaurants (see serialize_rows), in the same order.
+            variant (str): Anything else that changes the response body, e.g. the projection.
+
+        Returns:
+            str: The version.
+        """
+        digests = {place_id: _digest(text, 8) for place_id, text in zip(place_ids, row_texts)}
+        version = _digest(variant + '\n' + '\n'.join(f"{pid}:{digests[pid]}" for pid in place_ids), 12)
+        with self._lock:
+            self._versions[version] = digests
+            self._versions.move_to_end(version)
+            while len(self._versions) > self.max_versions:
+                self._versions.popitem(last=False)
+        return version
+
+    def delta(self, since, version):
+        """
+        Compares two recorded versions.
+
+        Returns:
+            tuple: (added, removed, changed) lists of place_ids, or None if either version is unknown.
+        """
+        with self._lock:
+            old, new = self._versions.get(since), self._versions.get(version)
+            if old is None or new is None:
+                return None
+            self._versions.move_to_end(since)
+        added = [pid for pid in new if pid not in old]
+        removed = [pid for pid in old if pid not in new]
+        changed = [pid for pid in new if pid in old and old[pid] != new[pid]]
+        return added, removed, changed
+
+
+result_versions = ResultVersionStore(max_versions=getattr(settings, 'RESULT_VERSION_CACHE_SIZE', 1024))
@@ -0,0 +1,153 @@
+import math
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
+from django.utils import timezone
+from .bandit import BANDIT_COLLECTION, LinUCBRanker, get_ranker_name
+from .constants import CATEGORY_KEYS, FEEDBACK_ACTION_INDEX, FEEDBACK_REWARDS
+from .reinforcement_learning import DQNAgent, STATE_SIZE, ACTION_SIZE, build_rl_feature_matrix
+from .storage import SQLiteStore, get_store, set_store
+
+# ======================== # # Trains the per-user rankers offline from the UserFeedback log: untrained events
+# === Batch Retraining === # # are grouped by user, each user's model is trained on all of them at once in a
+# ======================== # # process pool, the weights are read and written back in bulk, and the events marked.
+
+_worker_agent = None
+
+
+def _init_worker():
+    """Process pool initializer. Workers only train; the parent does all store reads and writes."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Spawned workers start with a fresh interpreter.
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
+        django.setup()
+    # DQNAgent loads weights on construction; give it an empty local store instead of Firestore.
+    set_store(SQLiteStore())
+
+
+def _train_dqn(user_id, states, actions, rewards, weights):
+    global _worker_agent
+    # One Keras model per process; each user's weights are swapped in.
+    if _worker_agent is None:
+        _worker_agent = DQNAgent(state_size=STATE_SIZE, action_size=ACTION_SIZE, user_id=user_id)
+        _worker_agent.initial_weights = _worker_agent.model.get_weights()
+    _worker_agent.model.set_weights(weights or _worker_agent.initial_weights)
+    _worker_agent.replay_batch(states, actions, rewards)
+    return _worker_agent.model.get_weights()
+
+
+def _train_linucb(user_id, states, actions, rewards, weights):
+    ranker = LinUCBRanker.from_weights(user_id, weights) if weights else LinUCBRanker(user_id)
+    ranker.update_many(states, rewards)
+    return ranker.to_weights()
+
+
+_TRAINERS = {'dqn': _train_dqn, 'linucb': _train_linucb}
+
+
+def _train_chunk(ranker, jobs):
+    """Trains a list of (user_id, states, actions, rewards, weights) jobs. Returns {user_id: new weights}."""
+    train = _TRAINERS[ranker]
+    return {job[0]: train(*job) for job in jobs}
+
+
+def _load_untrained_events(ranker, until):
+    """
+    Returns the untrained UserFeedback events for a ranker up to `until`, in time order, as
+    (user_id, restaurant_id, action, score, id) tuples. Events logged before the ranker was
+    recorded (ranker '') go to whichever ranker is trained first.
+    """
+    from .models import UserFeedback
+
+    # Served by the (trained, ranker, timestamp) index.
+    rows = UserFeedback.objects.filter(
+        trained=False, ranker__in=[ranker, ''], timestamp__lte=until,
+    ).order_by('timestamp').values_list(
+        'user_id', 'restaurant_id', 'action', 'score_at_recommendation', 'id').iterator(chunk_size=2000)
+    return [row for row in rows if row[2] in FEEDBACK_ACTION_INDEX]
+
+
+def _mark_trained(event_ids, batch_size=500):
+    from .models import UserFeedback
+
+    for i in range(0, len(event_ids), batch_size):
+        UserFeedback.objects.filter(id__in=event_ids[i:i + batch_size]).update(trained=True)
+
+
+def retrain_from_feedback(ranker=None, workers=None, lag_seconds=0):
+    """
+    Trains every user with untrained feedback, then marks those events as trained. Events are
+    tracked one by one, so rows written late by a web worker's write-behind buffer (e.g. after a
+    database outage) are trained by the next run, and events trained online are skipped.
+
+    Args:
+        ranker (str): 'dqn' or 'linucb'. Defaults to settings.RECOMMENDER_RANKER.
+        workers (int): Number of worker processes. None uses all cores, 1 trains in-process.
+        lag_seconds (int): Leave events newer than this for a later run.
+
+    Returns:
+        dict: Run summary with events, users, elapsed_seconds and the time of the run.
+    """
+    from .models import TrainingWatermark
+    from .feedback_log import feedback_buffer
+
+    ranker = get_ranker_name(ranker)
+    collection = BANDIT_COLLECTION if ranker == 'linucb' else 'rl_models'
+    start = time.perf_counter()
+    feedback_buffer.flush()
+
+    until = timezone.now() - timedelta(seconds=lag_seconds)
+    events = _load_untrained_events(ranker, until)
+    print(f"[RETRAIN] {len(events)} untrained '{ranker}' events up to {until}.")
+
+    by_user = defaultdict(list)
+    for row, event in enumerate(events):
+        by_user[event[0]].append(row)
+
+    if events:
+        # Contexts as at recommendation time: stored restaurant features plus the hybrid score.
+        states = build_rl_feature_matrix(
+            [{'place_id': e[1], 'final_score': e[3]} for e in events], CATEGORY_KEYS)
+        actions = np.array([FEEDBACK_ACTION_INDEX[e[2]] for e in events])
+        rewards = np.array([FEEDBACK_REWARDS[e[2]] for e in events])
+
+        store = get_store()
+        current_weights = store.get_model_weights_many(list(by_user), collection=collection)
+        jobs = [
+            (user_id, states[rows], actions[rows], rewards[rows], current_weights.get(user_id))
+            for user_id, rows in by_user.items()
+        ]
+
+        def save(trained):
+            # Events are marked only once their user's weights are written; a failed run leaves them for the next.
+            store.put_model_weights_many(trained, collection=collection)
+            _mark_trained([events[row][4] for user_id in trained for row in by_user[user_id]])
+
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            save(_train_chunk(ranker, jobs))
+        else:
+            chunk_size = max(1, math.ceil(len(jobs) / (workers * 4)))
+            chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+            # TensorFlow is not fork-safe, so DQN workers are spawned.
+            context = multiprocessing.get_context('spawn') if ranker == 'dqn' else None
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+                for trained in executor.map(_train_chunk, [ranker] * len(chunks), chunks):
+                    save(trained)
+
+    TrainingWatermark.objects.update_or_create(name=ranker, defaults={'trained_until': until})
+    elapsed = time.perf_counter() - start
+    print(f"[RETRAIN] Trained {len(by_user)} users on {len(events)} events in {elapsed:.2f}s.")
+    return {
+        'ranker': ranker,
+        'events': len(events),
+        'users': len(by_user),
+        'elapsed_seconds': elapsed,
+        'trained_until': until.isoformat(),
+    }
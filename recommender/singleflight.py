@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+# ===================== # # Concurrent identical calls (e.g. the same nearby search from several users in
+# === Single Flight === # # one place, or a client retrying) share one in-flight computation: the first
+# ===================== # # caller runs it and every caller that arrives before it finishes gets its result.
+
+
+def nearby_search_key(latitude, longitude, radius, keyword="", precision=4):
+    """
+    Normalized key of a nearby search. Coordinates are rounded to `precision` decimals
+    (4 decimals is ~11 m), so searches from practically the same spot are coalesced.
+    """
+    return (round(float(latitude), precision), round(float(longitude), precision), int(radius),
+            (keyword or "").strip().lower())
+
+
+class _Flight:
+    def __init__(self):
+        self.future = Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key, for sync callers (do) and async callers (ado) alike.
+    Results are shared between the callers, so they must not be mutated.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._executions = 0
+        self._coalesced = 0
+        self._max_waiters = 0
+
+    def _join(self, key):
+        """Returns (flight, is_leader)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._executions += 1
+                return flight, True
+            flight.waiters += 1
+            self._coalesced += 1
+            self._max_waiters = max(self._max_waiters, flight.waiters)
+            return flight, False
+
+    def _finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        if flight.waiters:
+            print(f"[SINGLEFLIGHT] {self.name}: result of {key} shared with {flight.waiters} waiting request(s).")
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def do(self, key, func):
+        """Calls func() unless an identical call is in flight, in which case it waits for that call's result."""
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return flight.future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            # Also on KeyboardInterrupt/SystemExit, so waiters are not left hanging.
+            self._finish(key, flight, error=e if isinstance(e, Exception) else RuntimeError("Leader was interrupted"))
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    async def ado(self, key, coroutine_func):
+        """Async version of do: awaits coroutine_func() or the in-flight call with the same key."""
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return await asyncio.wrap_future(flight.future)
+        try:
+            result = await coroutine_func()
+        except BaseException as e:
+            # Also on cancellation, so waiters are not left hanging.
+            self._finish(key, flight, error=e if isinstance(e, Exception) else RuntimeError("Leader was cancelled"))
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    def stats(self):
+        """Counters since start: executions, coalesced callers, coalesce ratio and waiter counts."""
+        with self._lock:
+            calls = self._executions + self._coalesced
+            return {
+                'executions': self._executions,
+                'coalesced': self._coalesced,
+                'coalesce_ratio': self._coalesced / calls if calls else 0.0,
+                'in_flight': len(self._flights),
+                'waiting_now': sum(f.waiters for f in self._flights.values()),
+                'max_waiters': self._max_waiters,
+            }
+
+
+nearby_search_flight = SingleFlight('nearby_search')
+place_details_flight = SingleFlight('place_details')
+photo_flight = SingleFlight('photo')
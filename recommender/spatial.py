@@ -0,0 +1,175 @@
+import math
+import threading
+import numpy as np
+from django.conf import settings
+
+# ===================== # # A grid index over the coordinates of the restaurants we already know, so that
+# === Spatial Index === # # "restaurants within R metres of (lat, lon)" is answered locally: the grid narrows
+# ===================== # # the search to a few cells and a vectorized haversine filters them exactly.
+
+EARTH_RADIUS_M = 6371000.0
+METRES_PER_DEGREE_LAT = 111320.0
+
+# Cells are keyed as (row + _ROW_OFFSET) * _COL_STRIDE + (col + _COL_OFFSET), so that the cells of one
+# row are contiguous in key order and a row's column range is a single slice of the sorted points.
+_ROW_OFFSET = 1 << 20
+_COL_OFFSET = 1 << 31
+_COL_STRIDE = 1 << 32
+
+
+def haversine_distances_m(lat, lon, latitudes, longitudes):
+    """
+    Vectorized haversine distance from one point to many.
+
+    Args:
+        lat (float): Latitude of the origin, in degrees.
+        lon (float): Longitude of the origin, in degrees.
+        latitudes (np.ndarray): Latitudes of the points, in degrees.
+        longitudes (np.ndarray): Longitudes of the points, in degrees.
+
+    Returns:
+        np.ndarray: The distances in metres.
+    """
+    phi1 = math.radians(lat)
+    phi2 = np.radians(latitudes)
+    dphi = phi2 - phi1
+    dlambda = np.radians(longitudes) - math.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    A thread-safe grid index of place_id -> (lat, lon).
+
+    Points live in arrays sorted by grid cell. New points go to a small pending buffer that is
+    scanned linearly and merged into the sorted arrays once it grows past merge_threshold
+    (or 1/16 of the index), which keeps adds cheap and queries fast.
+    """
+    def __init__(self, cell_degrees=0.01, merge_threshold=4096):
+        self.cell_degrees = cell_degrees
+        self.merge_threshold = merge_threshold
+        self._points = {}  # place_id -> (lat, lon), the current location of every indexed place
+        self._pending = []  # (place_id, lat, lon) added since the last merge
+        self._ids = np.empty(0, dtype=object)
+        self._lats = np.empty(0)
+        self._lons = np.empty(0)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._stale = 0  # sorted entries that were removed or moved since the last merge
+        self._lock = threading.Lock()
+
+    def _cell_keys(self, lats, lons):
+        rows = np.floor(np.asarray(lats) / self.cell_degrees).astype(np.int64)
+        cols = np.floor(np.asarray(lons) / self.cell_degrees).astype(np.int64)
+        return (rows + _ROW_OFFSET) * _COL_STRIDE + (cols + _COL_OFFSET)
+
+    def add_many(self, place_ids, latitudes, longitudes):
+        """Indexes (or moves) places. Entries without numeric coordinates are skipped. Returns the number added."""
+        added = 0
+        with self._lock:
+            for place_id, lat, lon in zip(place_ids, latitudes, longitudes):
+                try:
+                    lat, lon = float(lat), float(lon)
+                except (TypeError, ValueError):
+                    continue
+                if not place_id or not (math.isfinite(lat) and math.isfinite(lon)):
+                    continue
+                if self._points.get(place_id) == (lat, lon):
+                    continue
+                if place_id in self._points:
+                    self._stale += 1
+                self._points[place_id] = (lat, lon)
+                self._pending.append((place_id, lat, lon))
+                added += 1
+            if len(self._pending) + self._stale > max(self.merge_threshold, len(self._ids) // 16):
+                self._merge()
+        return added
+
+    def add_restaurants(self, restaurants):
+        """Indexes a list of restaurant dictionaries by their 'latitude'/'longitude'."""
+        return self.add_many([r.get('place_id') for r in restaurants],
+                             [r.get('latitude') for r in restaurants],
+                             [r.get('longitude') for r in restaurants])
+
+    def discard_many(self, place_ids):
+        """Removes places from the index, e.g. once they are evicted from the catalog."""
+        with self._lock:
+            for place_id in place_ids:
+                if self._points.pop(place_id, None) is not None:
+                    self._stale += 1
+
+    def _merge(self):
+        """Rebuilds the sorted arrays from the current points. Caller holds the lock."""
+        ids = np.array(list(self._points), dtype=object)
+        coords = np.array(list(self._points.values()), dtype=float).reshape(-1, 2)
+        keys = self._cell_keys(coords[:, 0], coords[:, 1])
+        order = np.argsort(keys, kind='stable')
+        # New arrays rather than in-place changes, so queries holding the old ones are unaffected.
+        self._ids, self._lats, self._lons, self._keys = ids[order], coords[order, 0], coords[order, 1], keys[order]
+        self._pending = []
+        self._stale = 0
+
+    def query(self, latitude, longitude, radius_m, limit=None):
+        """
+        Finds the indexed places within radius_m metres of (latitude, longitude).
+
+        Args:
+            latitude (float): Latitude of the centre, in degrees.
+            longitude (float): Longitude of the centre, in degrees.
+            radius_m (float): Search radius in metres.
+            limit (int): Return at most this many (the nearest). None returns all.
+
+        Returns:
+            tuple: (place_ids, distances_m), nearest first.
+        """
+        with self._lock:
+            ids, lats, lons, keys = self._ids, self._lats, self._lons, self._keys
+            pending = list(self._pending)
+            points = self._points
+            stale = self._stale
+
+        # --- Candidate cells: the bounding box of the circle ---
+        dlat = radius_m / METRES_PER_DEGREE_LAT
+        cos_lat = math.cos(math.radians(min(89.9, abs(latitude) + dlat)))
+        dlon = min(180.0, radius_m / (METRES_PER_DEGREE_LAT * cos_lat))
+        row0, row1 = (math.floor((latitude - dlat) / self.cell_degrees), math.floor((latitude + dlat) / self.cell_degrees))
+        col0, col1 = (math.floor((longitude - dlon) / self.cell_degrees), math.floor((longitude + dlon) / self.cell_degrees))
+        # Longitudes are not wrapped at the antimeridian.
+        rows = np.arange(row0, row1 + 1, dtype=np.int64) + _ROW_OFFSET
+        starts = np.searchsorted(keys, rows * _COL_STRIDE + (col0 + _COL_OFFSET), side='left')
+        ends = np.searchsorted(keys, rows * _COL_STRIDE + (col1 + _COL_OFFSET), side='right')
+        candidates = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends) if e > s] or [np.empty(0, dtype=np.int64)])
+
+        cand_ids, cand_lats, cand_lons = ids[candidates], lats[candidates], lons[candidates]
+        if pending:
+            cand_ids = np.concatenate([cand_ids, np.array([p[0] for p in pending], dtype=object)])
+            cand_lats = np.concatenate([cand_lats, [p[1] for p in pending]])
+            cand_lons = np.concatenate([cand_lons, [p[2] for p in pending]])
+
+        # --- Exact filter ---
+        distances = haversine_distances_m(latitude, longitude, cand_lats, cand_lons)
+        inside = np.flatnonzero(distances <= radius_m)
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+
+        place_ids, result_distances = [], []
+        seen = set()
+        for i in inside:
+            place_id = cand_ids[i]
+            # Skip entries removed or moved since the last merge.
+            if stale or pending:
+                if place_id in seen or points.get(place_id) != (cand_lats[i], cand_lons[i]):
+                    continue
+                seen.add(place_id)
+            place_ids.append(place_id)
+            result_distances.append(float(distances[i]))
+            if limit is not None and len(place_ids) >= limit:
+                break
+        return place_ids, result_distances
+
+    def __len__(self):
+        with self._lock:
+            return len(self._points)
+
+
+# Shared index of the restaurants in this worker's catalog.
+restaurant_spatial_index = SpatialIndex(cell_degrees=getattr(settings, 'SPATIAL_INDEX_CELL_DEGREES', 0.01))
@@ -0,0 +1,379 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+# ======================== # # Storage for the data the recommender keeps in Firestore: user favourites and
+# === Storage Backends === # # per-user model weights. The pipeline talks to a RecommenderStore so it can run
+# ======================== # # against Firestore, a local SQLite/in-memory database, or a cache in front of either.
+
+# Firestore limits batched writes and get_all calls, so bulk operations are chunked.
+FIRESTORE_BATCH_SIZE = 500
+
+
+def _favourite_place_ids(favourites_list):
+    """Extracts the place_ids from a Firestore 'favourites' list of restaurant dicts."""
+    return {fav['place_id'] for fav in favourites_list or [] if isinstance(fav, dict) and 'place_id' in fav}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class RecommenderStore:
+    """
+    Interface of a storage backend. Model weights are lists of NumPy arrays (as returned by
+    keras Model.get_weights()) stored per user in a named collection, e.g. 'rl_models'.
+    """
+    def get_all_favourites(self):
+        """Returns {user_id: set_of_favourite_place_ids} for every user with favourites."""
+        raise NotImplementedError
+
+    def get_favourites_many(self, user_ids):
+        """Returns {user_id: set_of_favourite_place_ids} for the given users (unknown users are omitted)."""
+        raise NotImplementedError
+
+    def put_favourites_many(self, favourites_by_user):
+        """Stores {user_id: iterable_of_place_ids}, replacing each user's favourites."""
+        raise NotImplementedError
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        """Returns {user_id: [numpy arrays]} for the users that have stored weights."""
+        raise NotImplementedError
+
+    def put_model_weights_many(self, weights_by_user, collection='rl_models'):
+        """Stores {user_id: [numpy arrays]} in one bulk write."""
+        raise NotImplementedError
+
+    def get_model_weights(self, user_id, collection='rl_models'):
+        return self.get_model_weights_many([user_id], collection).get(user_id)
+
+    def put_model_weights(self, user_id, weights, collection='rl_models'):
+        self.put_model_weights_many({user_id: weights}, collection)
+
+    def with_model_weights(self, user_id, func, collection='rl_models'):
+        """
+        Returns func(weights) for the user's stored weights, or None if the user has none.
+        Stores that keep weights in memory (see weight_arena.ArenaStore) call func in place, without a copy.
+        """
+        weights = self.get_model_weights(user_id, collection)
+        return func(weights) if weights else None
+
+
+# --- Firestore ---
+class FirestoreStore(RecommenderStore):
+    """The production backend: favourites in 'users' documents, weights in one document per user."""
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def db(self):
+        if self._client is None:
+            from .firebase_client import get_firestore_client
+            self._client = get_firestore_client()
+        return self._client
+
+    # A user's ID is the ID of their 'users' document (the app writes each profile at users/{uid}),
+    # the one key every method can also look a user up by.
+
+    def get_all_favourites(self):
+        db = self.db
+        print(f"  [STORAGE] INFO: Connected to Firebase project: {getattr(db, 'project', 'unknown')}")
+        all_favourites = {}
+        doc_count = 0
+        for doc in db.collection('users').stream():
+            doc_count += 1
+            user_data = doc.to_dict()
+            place_ids = _favourite_place_ids(user_data.get('favourites', []))
+            if place_ids:
+                all_favourites[doc.id] = place_ids
+
+        if doc_count == 0:
+            print("  [STORAGE] CRITICAL: No documents found in the 'users' collection.")
+        print(f"  [STORAGE] INFO: Found favorites for {len(all_favourites)} out of {doc_count} users.")
+        return all_favourites
+
+    def get_favourites_many(self, user_ids):
+        db = self.db
+        favourites = {}
+        for chunk in _chunks(list(user_ids), FIRESTORE_BATCH_SIZE):
+            refs = [db.collection('users').document(user_id) for user_id in chunk]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    place_ids = _favourite_place_ids(doc.to_dict().get('favourites', []))
+                    if place_ids:
+                        favourites[doc.id] = place_ids
+        return favourites
+
+    def put_favourites_many(self, favourites_by_user):
+        # Favourites hold the full restaurant objects written by the mobile app. Those objects are
+        # kept for the place_ids that stay, new place_ids are added as {'place_id': ...}, and only
+        # the 'favourites' field is written. The read and the write are not one transaction.
+        db = self.db
+        for chunk in _chunks(list(favourites_by_user.items()), FIRESTORE_BATCH_SIZE):
+            refs = [db.collection('users').document(user_id) for user_id, _ in chunk]
+            current = {doc.id: (doc.to_dict() or {}).get('favourites', []) for doc in db.get_all(refs) if doc.exists}
+            batch = db.batch()
+            for ref, (user_id, place_ids) in zip(refs, chunk):
+                place_ids = list(dict.fromkeys(place_ids))
+                existing = {fav['place_id']: fav for fav in current.get(user_id, [])
+                            if isinstance(fav, dict) and 'place_id' in fav}
+                batch.set(ref, {'favourites': [existing.get(pid, {'place_id': pid}) for pid in place_ids]}, merge=True)
+            batch.commit()
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        db = self.db
+        weights = {}
+        for chunk in _chunks(list(user_ids), FIRESTORE_BATCH_SIZE):
+            refs = [db.collection(collection).document(user_id) for user_id in chunk]
+            for doc in db.get_all(refs):
+                if not doc.exists:
+                    continue
+                weights_data = doc.to_dict().get('weights')
+                if weights_data:
+                    # Reconstruct weights from flattened list and shape
+                    weights[doc.id] = [
+                        np.array(w_data['values'], dtype=np.float32).reshape(tuple(w_data['shape']))
+                        for w_data in weights_data
+                    ]
+        return weights
+
+    def put_model_weights_many(self, weights_by_user, collection='rl_models'):
+        from firebase_admin import firestore
+
+        db = self.db
+        for chunk in _chunks(list(weights_by_user.items()), FIRESTORE_BATCH_SIZE):
+            batch = db.batch()
+            for user_id, weights in chunk:
+                # Firestore-compatible format: list of dicts with shape and flattened values
+                batch.set(db.collection(collection).document(user_id), {
+                    'weights': [{'shape': list(w.shape), 'values': w.flatten().tolist()} for w in weights],
+                    'last_updated': firestore.SERVER_TIMESTAMP,
+                })
+            batch.commit()
+
+
+# --- SQLite / in-memory ---
+def encode_weights(weights):
+    """Packs a list of arrays as: header length, JSON list of shapes, raw little-endian float32 values."""
+    header = json.dumps([list(w.shape) for w in weights]).encode('utf-8')
+    return struct.pack('<I', len(header)) + header + b''.join(
+        np.ascontiguousarray(w, dtype='<f4').tobytes() for w in weights
+    )
+
+
+def decode_weights(payload):
+    """Inverse of encode_weights."""
+    (header_length,) = struct.unpack_from('<I', payload)
+    shapes = json.loads(payload[4:4 + header_length].decode('utf-8'))
+    offset = 4 + header_length
+    weights = []
+    for shape in shapes:
+        count = int(np.prod(shape)) if shape else 1
+        weights.append(np.frombuffer(payload, dtype='<f4', count=count, offset=offset).reshape(shape).copy())
+        offset += count * 4
+    return weights
+
+
+class SQLiteStore(RecommenderStore):
+    """
+    A local backend for offline benchmarks, load tests and development.
+    path=':memory:' keeps everything in memory for the lifetime of the process.
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS favourites ("
+                               "user_id TEXT NOT NULL, place_id TEXT NOT NULL, PRIMARY KEY (user_id, place_id))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS model_weights ("
+                               "collection TEXT NOT NULL, user_id TEXT NOT NULL, payload BLOB NOT NULL, "
+                               "updated_at REAL NOT NULL, PRIMARY KEY (collection, user_id))")
+
+    def _group_favourites(self, rows):
+        favourites = {}
+        for user_id, place_id in rows:
+            favourites.setdefault(user_id, set()).add(place_id)
+        return favourites
+
+    def get_all_favourites(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, place_id FROM favourites").fetchall()
+        return self._group_favourites(rows)
+
+    def get_favourites_many(self, user_ids):
+        user_ids = list(user_ids)
+        rows = []
+        with self._lock:
+            # Stay below SQLite's limit on the number of query parameters.
+            for chunk in _chunks(user_ids, 900):
+                rows.extend(self._conn.execute(
+                    f"SELECT user_id, place_id FROM favourites WHERE user_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        return self._group_favourites(rows)
+
+    def put_favourites_many(self, favourites_by_user):
+        with self._lock, self._conn:
+            for chunk in _chunks(list(favourites_by_user), 900):
+                self._conn.execute(f"DELETE FROM favourites WHERE user_id IN ({','.join('?' * len(chunk))})", chunk)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO favourites (user_id, place_id) VALUES (?, ?)",
+                [(user_id, place_id) for user_id, place_ids in favourites_by_user.items() for place_id in place_ids],
+            )
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        user_ids = list(user_ids)
+        weights = {}
+        with self._lock:
+            for chunk in _chunks(user_ids, 900):
+                rows = self._conn.execute(
+                    f"SELECT user_id, payload FROM model_weights WHERE collection = ? "
+                    f"AND user_id IN ({','.join('?' * len(chunk))})",
+                    [collection] + chunk,
+                ).fetchall()
+                for user_id, payload in rows:
+                    weights[user_id] = decode_weights(payload)
+        return weights
+
+    def put_model_weights_many(self, weights_by_user, collection='rl_models'):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO model_weights (collection, user_id, payload, updated_at) VALUES (?, ?, ?, ?)",
+                [(collection, user_id, encode_weights(weights), now) for user_id, weights in weights_by_user.items()],
+            )
+
+
+# --- Read-through cache ---
+class CachingStore(RecommenderStore):
+    """
+    A read-through, write-through cache in front of another store. Entries expire after
+    ttl_seconds; bulk reads only send the missing keys to the inner store, in one call.
+    """
+    _ALL_FAVOURITES = ('favourites', '__all__')
+
+    def __init__(self, inner, ttl_seconds=60, max_entries=10000):
+        self.inner = inner
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._cache = {}  # key -> (expires_at, value); a value of None caches "not found"
+        self._lock = threading.Lock()
+
+    def _get_cached(self, keys):
+        now = time.time()
+        hits, misses = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._cache.get(key)
+                if entry is not None and entry[0] > now:
+                    hits[key] = entry[1]
+                else:
+                    misses.append(key)
+        return hits, misses
+
+    def _set_cached(self, items):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            if len(self._cache) + len(items) > self.max_entries:
+                # Drop expired entries first, then the oldest ones.
+                now = time.time()
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+                while self._cache and len(self._cache) + len(items) > self.max_entries:
+                    self._cache.pop(next(iter(self._cache)))
+            for key, value in items.items():
+                self._cache[key] = (expires_at, value)
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_all_favourites(self):
+        hits, _ = self._get_cached([self._ALL_FAVOURITES])
+        if self._ALL_FAVOURITES in hits:
+            return hits[self._ALL_FAVOURITES]
+        favourites = self.inner.get_all_favourites()
+        self._set_cached({self._ALL_FAVOURITES: favourites})
+        return favourites
+
+    def get_favourites_many(self, user_ids):
+        keys = [('favourites', user_id) for user_id in user_ids]
+        hits, misses = self._get_cached(keys)
+        if misses:
+            fetched = self.inner.get_favourites_many([key[1] for key in misses])
+            new_entries = {key: fetched.get(key[1]) for key in misses}
+            self._set_cached(new_entries)
+            hits.update(new_entries)
+        return {key[1]: value for key, value in hits.items() if value is not None}
+
+    def put_favourites_many(self, favourites_by_user):
+        self.inner.put_favourites_many(favourites_by_user)
+        with self._lock:
+            self._cache.pop(self._ALL_FAVOURITES, None)
+        self._set_cached({('favourites', user_id): set(place_ids) for user_id, place_ids in favourites_by_user.items()})
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        keys = [(collection, user_id) for user_id in user_ids]
+        hits, misses = self._get_cached(keys)
+        if misses:
+            fetched = self.inner.get_model_weights_many([key[1] for key in misses], collection)
+            new_entries = {key: fetched.get(key[1]) for key in misses}
+            self._set_cached(new_entries)
+            hits.update(new_entries)
+        return {key[1]: value for key, value in hits.items() if value is not None}
+
+    def put_model_weights_many(self, weights_by_user, collection='rl_models'):
+        self.inner.put_model_weights_many(weights_by_user, collection)
+        self._set_cached({(collection, user_id): weights for user_id, weights in weights_by_user.items()})
+
+
+# --- Configured store ---
+_store = None
+_store_lock = threading.Lock()
+
+
+def build_store_from_settings():
+    """
+    Builds the store selected by settings.RECOMMENDER_STORAGE_BACKEND ('firestore' or 'sqlite'),
+    wrapped in a CachingStore when RECOMMENDER_STORAGE_CACHE_TTL is greater than 0, and in an
+    ArenaStore (weights shared by the worker processes) when MODEL_ARENA_ENABLED is set.
+    """
+    backend = getattr(settings, 'RECOMMENDER_STORAGE_BACKEND', 'firestore')
+    if backend == 'firestore':
+        store = FirestoreStore()
+    elif backend == 'sqlite':
+        store = SQLiteStore(getattr(settings, 'RECOMMENDER_SQLITE_PATH', ':memory:'))
+    else:
+        raise ValueError(f"Unknown RECOMMENDER_STORAGE_BACKEND: {backend}")
+
+    cache_ttl = getattr(settings, 'RECOMMENDER_STORAGE_CACHE_TTL', 0)
+    if cache_ttl > 0:
+        store = CachingStore(store, ttl_seconds=cache_ttl)
+
+    if getattr(settings, 'MODEL_ARENA_ENABLED', False):
+        from .weight_arena import ArenaStore
+        store = ArenaStore(store, getattr(settings, 'MODEL_ARENA_DIR', os.path.join(settings.BASE_DIR, 'model_arena')),
+                           ttl_seconds=getattr(settings, 'MODEL_ARENA_TTL_SECONDS', 300))
+    return store
+
+
+def get_store():
+    """Returns the process-wide store, building it from settings on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = build_store_from_settings()
+        return _store
+
+
+def set_store(store):
+    """Replaces the process-wide store, e.g. with a SQLiteStore for offline benchmarks and load tests."""
+    global _store
+    with _store_lock:
+        _store = store
@@ -0,0 +1,136 @@
+"""
+Synthetic restaurants and users for benchmarks and load tests.
+
+The generated dictionaries have the same shape as the output of
+get_nearby_recommend_restaurants_logic and the user profile sent by the Flutter app,
+so they can be fed to every stage of the recommender without calling Google or Firebase.
+"""
+import random
+from .constants import CATEGORY_KEYS
+
+# Kuala Lumpur city centre, the default search area of the app.
+DEFAULT_CENTER = (3.1390, 101.6869)
+
+_NAME_WORDS = ["Nasi", "Kopi", "Sushi", "Burger", "Tandoori", "Dim Sum", "Pizza", "Satay",
+               "Kimchi", "Thai", "Cafe", "Bistro", "House", "Corner", "Kitchen", "Garden"]
+_REVIEW_WORDS = ["great", "food", "halal", "service", "spicy", "coffee", "vegetarian", "cheap",
+                 "friendly", "noodles", "rice", "dessert", "crowded", "clean", "tasty", "slow"]
+
+
+def _sentence(rng, words, length):
+    return ' '.join(rng.choice(words) for _ in range(length))
+
+
+def make_restaurants(n, seed=0, center=DEFAULT_CENTER, spread_deg=0.05):
+    """
+    Generates n enriched restaurant dictionaries around a centre point.
+
+    Args:
+        n (int): Number of restaurants.
+        seed (int): Random seed, so the same n always gives the same data.
+        center (tuple): (lat, lon) of the search area.
+        spread_deg (float): Maximum offset from the centre in degrees.
+
+    Returns:
+        list: Restaurant dictionaries with unique place_ids.
+    """
+    rng = random.Random(seed)
+    restaurants = []
+    for i in range(n):
+        categories = rng.sample(CATEGORY_KEYS, rng.randint(0, 4))
+        restaurants.append({
+            'place_id': f"synthetic_place_{i}",
+            'name': f"{_sentence(rng, _NAME_WORDS, 2)} {i}",
+            'categories': categories,
+            'address': f"{rng.randint(1, 200)}, Jalan {rng.choice(_NAME_WORDS)}, Kuala Lumpur",
+            'latitude': center[0] + rng.uniform(-spread_deg, spread_deg),
+            'longitude': center[1] + rng.uniform(-spread_deg, spread_deg),
+            'rating': round(rng.uniform(2.5, 5.0), 1),
+            'user_ratings_total': rng.randint(1, 5000),
+            'price_level': rng.choice([1, 2, 3, 4, 'N/A']),
+            'editorial_summary': _sentence(rng, _REVIEW_WORDS, 12),
+            'reviews': [
+                {
+                    'author': f"Reviewer {j}",
+                    'rating': rng.randint(1, 5),
+                    'text': _sentence(rng, _REVIEW_WORDS, 40),
+                    'relative_time': f"{rng.randint(1, 11)} months ago",
+                }
+                for j in range(3)
+            ],
+            'photos': [f"synthetic_photo_{i}_{j}_" + 'x' * 180 for j in range(3)],
+            'url': f"https://maps.google.com/?cid={rng.getrandbits(60)}",
+            'phone_number': f"03-{rng.randint(1000, 9999)} {rng.randint(1000, 9999)}",
+            'website': 'N/A',
+            'opening_hours': [f"{day}: 10:00 AM - 10:00 PM" for day in
+                              ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]],
+            'opening_status': rng.random() < 0.7,
+            'business_status': 'OPERATIONAL',
+            'types': ['restaurant', 'food', 'point_of_interest', 'establishment'],
+            'delivery': rng.random() < 0.5,
+            'takeout': rng.random() < 0.8,
+        })
+    return restaurants
+
+
+def make_user_profiles(n, restaurants, seed=0, max_favourites=10, restriction_rate=0.2):
+    """
+    Generates n user profiles in the format sent by the Flutter app.
+    Favourites are drawn from the given restaurants so they overlap with the candidates.
+    """
+    rng = random.Random(seed)
+    place_ids = [r['place_id'] for r in restaurants]
+    profiles = []
+    for i in range(n):
+        favourites = rng.sample(place_ids, min(len(place_ids), rng.randint(0, max_favourites)))
+        profiles.append({
+            'uid': f"synthetic_user_{i}",
+            'preferences': rng.sample(CATEGORY_KEYS, rng.randint(1, 4)),
+            'restrictions': rng.sample(['halal', 'vegetarian', 'beef-free'], 1) if rng.random() < restriction_rate else [],
+            'favourites': [{'place_id': pid} for pid in favourites],
+        })
+    return profiles
+
+
+def make_user_favourites(num_users, place_ids, seed=0, max_favourites=20):
+    """
+    Generates the {user_id: set(place_ids)} mapping returned by _get_all_user_favorites.
+    A small set of popular places is favourited more often, as in real data.
+    """
+    rng = random.Random(seed)
+    popular = place_ids[:max(1, len(place_ids) // 20)]
+    favourites = {}
+    for i in range(num_users):
+        count = rng.randint(1, max_favourites)
+        chosen = {rng.choice(popular) if rng.random() < 0.3 else rng.choice(place_ids) for _ in range(count)}
+        favourites[f"synthetic_user_{i}"] = chosen
+    return favourites
+
+
+def make_feedback_events(user_profiles, restaurants, events_per_user=40, seed=0, start_time=1.7e9):
+    """
+    Generates UserFeedback-like events in chronological order. Users like restaurants that
+    share a category with their preferences more often, so rankers have something to learn.
+
+    Returns:
+        list: Dicts with user_id, restaurant_id, action, score_at_recommendation and timestamp (UNIX seconds).
+    """
+    rng = random.Random(seed)
+    actions = ['like', 'dislike', 'click_details', 'skip']
+    matching_weights = [0.55, 0.05, 0.25, 0.15]
+    other_weights = [0.1, 0.3, 0.15, 0.45]
+    events = []
+    for profile in user_profiles:
+        preferences = set(profile.get('preferences', []))
+        for _ in range(events_per_user):
+            restaurant = rng.choice(restaurants)
+            matches = bool(preferences & set(restaurant['categories']))
+            events.append({
+                'user_id': profile['uid'],
+                'restaurant_id': restaurant['place_id'],
+                'action': rng.choices(actions, matching_weights if matches else other_weights)[0],
+                'score_at_recommendation': rng.random() * 0.5 + (0.3 if matches else 0.0),
+                'timestamp': start_time + rng.uniform(0, 30 * 24 * 3600),
+            })
+    events.sort(key=lambda e: e['timestamp'])
+    return events
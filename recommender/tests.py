@@ -1,3 +1,868 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from googlemaps.exceptions import ApiError
+from .affinity import UserAffinityStore, affinity_store
+from .bandit import BANDIT_COLLECTION
+from .batch import get_batch_hybrid_recommendations
+from .catalog import RestaurantCatalog
+from .categorization import CategoryCache, dictionary_version, recategorize_entries
+from .constants import CATEGORY_DICT
+from .hybrid import RL_SCORE_WEIGHT, get_hybrid_recommendations
+from .fakes import FakeGoogleMapsClient, LatencyModel
+from .favourites_snapshot import CURRENT_POINTER, FavouritesSnapshot, write_favourites_snapshot
+from .feedback_log import FeedbackBuffer
+from .feature_store import FEATURE_VERSION_KEY, RestaurantFeatureStore, from_client, gather_features
+from .projection import LAYOUT_COLUMNAR, LAYOUT_ROWS, project_restaurants
+from .photos import PhotoCache, PhotoNotFound, get_photo, image_content_type
+from .result_versions import ResultVersionStore
+from .singleflight import SingleFlight
+from .spatial import SpatialIndex, haversine_distances_m
+from .rate_limit import AdaptiveConcurrencyLimit, KeyedRateLimit, PlacesCallScheduler, TokenBucket
+from .models import CategoryCacheEntry, UserFeedback
+from .storage import SQLiteStore, get_store, set_store
+from .weight_arena import ArenaStore, WeightArena
+from .synthetic import DEFAULT_CENTER, make_restaurants, make_user_favourites, make_user_profiles
 
-# Create your tests here.
+# One arena layout for the tests: a 4x8 kernel and its bias.
+ARENA_LAYOUT = [(4, 8), (8,)]
+
+
+def _arena_weights(value):
+    return [np.full(shape, value, dtype=np.float32) for shape in ARENA_LAYOUT]
+
+
+def _write_arena_rounds(directory, num_users, rounds):
+    """Writer process: adds the users one by one (growing the arena), then overwrites them all, round after round."""
+    arena = WeightArena(directory, initial_capacity=2)
+    for i in range(num_users):
+        arena.put_many({f'user_{i}': _arena_weights(0)})
+    for value in range(1, rounds + 1):
+        arena.put_many({f'user_{i}': _arena_weights(value) for i in range(num_users)})
+
+
+def _fake_gmaps(**kwargs):
+    """A fake Google Maps client without network latency."""
+    return FakeGoogleMapsClient(restaurants=make_restaurants(60), latency=LatencyModel(median_ms=0), **kwargs)
+
+
+def _scheduler(**kwargs):
+    """A scheduler with tiny delays, so the tests run in milliseconds."""
+    options = dict(budgets={}, max_retries=4, max_concurrency=8, backoff_base=0.001, backoff_cap=0.005,
+                   page_token_delay=0.0, page_token_poll=0.01, page_token_timeout=1.0, seed=0)
+    options.update(kwargs)
+    return PlacesCallScheduler(**options)
+
+
+# --- Rate limiting ---
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_is_free_then_calls_are_paced(self):
+        bucket = TokenBucket(rate=100, burst=2)
+        start = time.monotonic()
+        waits = [bucket.acquire() for _ in range(6)]
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertTrue(all(wait > 0 for wait in waits[2:]))
+        # 4 calls beyond the burst at 100/s take at least 40 ms.
+        self.assertGreaterEqual(elapsed, 0.035)
+
+    def test_try_acquire_does_not_wait(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+
+class AdaptiveConcurrencyLimitTests(SimpleTestCase):
+    def test_halves_when_throttled_and_grows_additively(self):
+        limit = AdaptiveConcurrencyLimit(8)
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 4.0)
+        limit.acquire()
+        limit.release()
+        self.assertEqual(limit.limit, 4.25)
+
+
+class PlacesCallSchedulerTests(SimpleTestCase):
+    def test_retries_over_query_limit_until_success(self):
+        # With this seed the fake throttles the first two calls and lets the third through.
+        gmaps = _fake_gmaps(over_query_limit_rate=0.5, seed=7)
+        scheduler = _scheduler()
+        place_id = gmaps.restaurants[0]['place_id']
+
+        response = scheduler.call('place', gmaps.place, place_id)
+
+        self.assertEqual(response['result']['place_id'], place_id)
+        self.assertEqual(gmaps.calls['over_query_limit'], 2)
+        stats = scheduler.stats()
+        self.assertEqual((stats['attempts'], stats['retries'], stats['throttled'], stats['failed']), (3, 2, 2, 0))
+
+    def test_gives_up_after_max_retries(self):
+        gmaps = _fake_gmaps(over_query_limit_rate=1.0)
+        scheduler = _scheduler(max_retries=2)
+
+        with self.assertRaises(ApiError) as raised:
+            scheduler.call('place', gmaps.place, gmaps.restaurants[0]['place_id'])
+
+        self.assertEqual(raised.exception.status, 'OVER_QUERY_LIMIT')
+        self.assertEqual(gmaps.calls['place'], 3)
+        self.assertEqual(scheduler.stats()['failed'], 1)
+
+    def test_concurrency_limit_halves_on_each_throttled_attempt(self):
+        gmaps = _fake_gmaps(over_query_limit_rate=0.5, seed=7)
+        scheduler = _scheduler(max_concurrency=8)
+
+        scheduler.call('place', gmaps.place, gmaps.restaurants[0]['place_id'])
+
+        # 8 -> 4 -> 2 on the two throttled attempts, then +1/limit on the success.
+        self.assertEqual(scheduler.stats()['concurrency_limit'], 2.5)
+
+    def test_non_retryable_errors_are_not_retried(self):
+        gmaps = _fake_gmaps()
+        scheduler = _scheduler()
+
+        with self.assertRaises(ApiError):
+            scheduler.call('place', gmaps.place, 'unknown_place_id')
+
+        self.assertEqual(gmaps.calls['place'], 1)
+
+    def test_next_page_polls_until_the_token_is_active(self):
+        gmaps = _fake_gmaps(page_token_delay=0.05)
+        scheduler = _scheduler()
+        first = gmaps.places_nearby(location=DEFAULT_CENTER, radius=1000)
+
+        second = scheduler.next_page(gmaps.places_nearby, first['next_page_token'])
+
+        self.assertEqual(len(second['results']), FakeGoogleMapsClient.PAGE_SIZE)
+        self.assertGreater(scheduler.stats()['page_token_polls'], 1)
+        # Polls answered with INVALID_REQUEST are not counted as failures.
+        self.assertEqual(scheduler.stats()['failed'], 0)
+
+    def test_next_page_gives_up_at_the_timeout(self):
+        gmaps = _fake_gmaps(page_token_delay=10.0)
+        scheduler = _scheduler(page_token_timeout=0.05)
+        first = gmaps.places_nearby(location=DEFAULT_CENTER, radius=1000)
+
+        with self.assertRaises(ApiError) as raised:
+            scheduler.next_page(gmaps.places_nearby, first['next_page_token'])
+
+        self.assertEqual(raised.exception.status, 'INVALID_REQUEST')
+
+
+# --- Photo proxy ---
+def _fetch_photo_from(gmaps):
+    """fetch_photo against a fake client: an answer that is not an image means the reference is unknown."""
+    def fetch(photo_reference, max_width):
+        data = b''.join(gmaps.places_photo(photo_reference, max_width=max_width))
+        if image_content_type(data[:12]) is None:
+            raise PhotoNotFound(photo_reference)
+        return data
+    return fetch
+
+
+class PhotoApiTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.gmaps = _fake_gmaps()
+        self.cache = PhotoCache(directory.name, max_bytes=10 * 1024 * 1024)
+        for target, value in (('photo_cache', self.cache), ('fetch_photo', _fetch_photo_from(self.gmaps))):
+            patcher = mock.patch(f'recommender.views.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.reference = self.gmaps.restaurants[0]['photos'][0]
+
+    def _get(self, reference, **headers):
+        return self.client.get(f'/recommender/photos/{reference}/', {'max_width': 400}, headers=headers)
+
+    def test_miss_then_hit(self):
+        first = self._get(self.reference)
+        second = self._get(self.reference)
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual((first['X-Photo-Cache'], second['X-Photo-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(first.streaming_content), b''.join(second.streaming_content))
+        self.assertEqual(self.gmaps.calls['places_photo'], 1)
+
+    def test_matching_if_none_match_is_not_modified(self):
+        etag = self._get(self.reference)['ETag']
+
+        response = self._get(self.reference, if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.gmaps.calls['places_photo'], 1)
+
+    def test_unknown_reference_is_not_found_and_remembered(self):
+        first = self._get('unknown_reference')
+        second = self._get('unknown_reference')
+
+        self.assertEqual((first.status_code, second.status_code), (404, 404))
+        # The second request is answered from the negative cache.
+        self.assertEqual(self.gmaps.calls['places_photo'], 1)
+
+    def test_evicted_photo_is_fetched_again(self):
+        size = len(b''.join(self._get(self.reference).streaming_content))
+        # Room for one photo: caching a second evicts the least recently used first one.
+        self.cache.max_bytes = int(size * 1.5)
+        self._get(self.gmaps.restaurants[1]['photos'][0])
+
+        response = self._get(self.reference)
+
+        self.assertEqual(response['X-Photo-Cache'], 'MISS')
+        self.assertEqual(self.gmaps.calls['places_photo'], 3)
+
+    def test_file_evicted_between_lookup_and_open_is_refetched(self):
+        fetch = _fetch_photo_from(self.gmaps)
+        path, _ = get_photo(self.reference, 400, fetch, self.cache)
+        os.remove(path)
+        lookups = []
+
+        def get_photo_stale_once(*args):
+            # The first lookup returns the path as it was before another worker evicted the file.
+            lookups.append(args)
+            return (path, True) if len(lookups) == 1 else get_photo(*args)
+
+        with mock.patch('recommender.views.get_photo', get_photo_stale_once):
+            response = self._get(self.reference)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Photo-Cache'], 'MISS')
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(self.gmaps.calls['places_photo'], 2)
+
+
+# --- Cold-start re-ranking ---
+@override_settings(FEATURE_STORE_ENABLED=False, RECOMMENDER_DEBUG_LOGS=False, RL_TRAINING_MODE='online',
+                   BANDIT_MIN_UPDATES=10)
+class AffinityReRankingTests(TestCase):
+    def setUp(self):
+        previous = get_store()
+        self.store = SQLiteStore()
+        set_store(self.store)
+        self.addCleanup(set_store, previous)
+        patcher = mock.patch('recommender.views.feedback_buffer')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.restaurants = make_restaurants(30)
+        self.liked = [r for r in self.restaurants if r['categories']][:3]
+
+    def _like_all(self, user_id, ranker):
+        for restaurant in self.liked:
+            response = self.client.post('/recommender/record_feedback/', json.dumps(
+                {'user_id': user_id, 'restaurant_data': restaurant, 'action': 'like', 'ranker': ranker}),
+                content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+    def _assert_reranked_by_affinity(self, user_id, ranker):
+        recommendations = get_hybrid_recommendations({'uid': user_id}, [dict(r) for r in self.restaurants],
+                                                     ranker=ranker)
+
+        expected = affinity_store.score_restaurants(user_id, recommendations)
+        rl_scores = [(rec['final_score_with_rl'] - rec['final_score']) / RL_SCORE_WEIGHT for rec in recommendations]
+        self.assertTrue(any(expected))
+        for rl_score, affinity in zip(rl_scores, expected):
+            self.assertAlmostEqual(rl_score, affinity)
+
+    def test_bandit_with_few_updates_is_reranked_by_affinity(self):
+        self._like_all('cold_bandit_user', 'linucb')
+
+        # The bandit is stored, but with fewer than BANDIT_MIN_UPDATES updates.
+        self.assertTrue(self.store.get_model_weights('cold_bandit_user', collection=BANDIT_COLLECTION))
+        self._assert_reranked_by_affinity('cold_bandit_user', 'linucb')
+
+    def test_untrained_dqn_is_not_saved_and_user_is_reranked_by_affinity(self):
+        self._like_all('cold_dqn_user', 'dqn')
+
+        self.assertIsNone(self.store.get_model_weights('cold_dqn_user'))
+        self._assert_reranked_by_affinity('cold_dqn_user', 'dqn')
+
+
+class AffinityHistoryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        feature_store = RestaurantFeatureStore(directory.name)
+        patcher = mock.patch('recommender.feature_store._feature_store', feature_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.restaurants = [r for r in make_restaurants(30) if r['categories']][:4]
+        feature_store.add_many(self.restaurants)
+
+    def _log(self, user_id, restaurant, action, timestamp):
+        UserFeedback.objects.create(user_id=user_id, restaurant_id=restaurant['place_id'], action=action,
+                                    timestamp=datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc))
+
+    def test_history_is_merged_after_a_live_update(self):
+        now = float(int(time.time()))  # Whole seconds survive the round trip through the database exactly
+        stored = [(self.restaurants[0], 'like', now - 3600), (self.restaurants[1], 'dislike', now - 1800),
+                  (self.restaurants[2], 'like', now - 600)]
+        live = (self.restaurants[3], 'like', now - 60)
+        for restaurant, action, timestamp in stored:
+            self._log('history_user', restaurant, action, timestamp)
+        affinities = UserAffinityStore()
+
+        # The user's first event in this process arrives through record_feedback...
+        affinities.update('history_user', live[1], live[0]['categories'], live[0]['price_level'], now=live[2])
+        # ...and is flushed to the database before the history is loaded.
+        self._log('history_user', *live)
+        affinities.load_history('history_user')
+
+        expected = UserAffinityStore()
+        for restaurant, action, timestamp in stored + [live]:
+            expected.update('history_user', action, restaurant['categories'], restaurant['price_level'], now=timestamp)
+        np.testing.assert_allclose(affinities.affinity_vector('history_user', now=now),
+                                   expected.affinity_vector('history_user', now=now))
+
+
+# --- Write-behind feedback ---
+class FeedbackBufferTests(SimpleTestCase):
+    def test_a_full_buffer_keeps_the_most_recent_events(self):
+        buffer = FeedbackBuffer(batch_size=100, flush_interval=3600, max_pending=3)
+        for i in range(5):
+            buffer.record('user', f'p{i}', 'like')
+        self.assertEqual([e.restaurant_id for e in buffer._pending], ['p2', 'p3', 'p4'])
+
+        # A failed write puts the batch back, still keeping the most recent events.
+        with mock.patch('recommender.models.UserFeedback.objects.bulk_create', side_effect=RuntimeError('db down')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual([e.restaurant_id for e in buffer._pending], ['p2', 'p3', 'p4'])
+        buffer.record('user', 'p5', 'like')
+        self.assertEqual([e.restaurant_id for e in buffer._pending], ['p3', 'p4', 'p5'])
+
+
+# --- Batch recommendations ---
+@override_settings(FEATURE_STORE_ENABLED=False, RECOMMENDER_DEBUG_LOGS=False, FAVOURITES_SNAPSHOT_ENABLED=False)
+class BatchRecommendationTests(TestCase):
+    def setUp(self):
+        previous = get_store()
+        self.store = SQLiteStore()
+        set_store(self.store)
+        self.addCleanup(set_store, previous)
+        self.restaurants = make_restaurants(40)
+        self.favourites = make_user_favourites(30, [r['place_id'] for r in self.restaurants])
+        self.store.put_favourites_many(self.favourites)
+
+    def test_batch_scores_match_the_hybrid_recommendations(self):
+        profiles = make_user_profiles(12, self.restaurants, restriction_rate=0.5)
+        self.assertTrue(any(p['restrictions'] for p in profiles) and not all(p['restrictions'] for p in profiles))
+
+        batch = get_batch_hybrid_recommendations(profiles, self.restaurants, top_k=len(self.restaurants), workers=1,
+                                                 all_user_favorites=self.favourites, restricted='append')
+
+        for profile in profiles:
+            hybrid = get_hybrid_recommendations(profile, [dict(r) for r in self.restaurants], ranker='dqn',
+                                                restricted='append')
+            results = batch['results'][profile['uid']]
+            self.assertEqual(len(results), len(hybrid))
+            self.assertEqual([r.get('restricted', False) for r in results], [r.get('restricted', False) for r in hybrid])
+            expected = {r['place_id']: r.get('final_score') for r in hybrid}
+            for rec in results:
+                if expected[rec['place_id']] is None:
+                    self.assertNotIn('final_score', rec)
+                else:
+                    self.assertAlmostEqual(rec['final_score'], expected[rec['place_id']])
+
+    def test_profiles_need_distinct_uids(self):
+        for profiles in ([{'preferences': ['cafe']}], [{'uid': 'a'}, {'uid': 'a'}]):
+            with self.assertRaises(ValueError):
+                get_batch_hybrid_recommendations(profiles, self.restaurants, workers=1, all_user_favorites={})
+        response = self.client.post('/recommender/batch_recommendations/', json.dumps(
+            {'user_profiles': [{'preferences': ['cafe']}], 'restaurants': self.restaurants}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+# --- Result versions ---
+class VersionedRestaurantsTests(SimpleTestCase):
+    def setUp(self):
+        self.catalog = RestaurantCatalog()
+        self.spatial_index = SpatialIndex()
+        for target, value in (('get_restaurants.restaurant_catalog', self.catalog),
+                              ('get_restaurants.restaurant_spatial_index', self.spatial_index),
+                              ('views.result_versions', ResultVersionStore()), ('views.area_prefetcher', None)):
+            patcher = mock.patch(f'recommender.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.restaurants = make_restaurants(10)
+        self._put(self.restaurants)
+
+    def _put(self, restaurants):
+        self.catalog.put_many(restaurants)
+        self.spatial_index.add_restaurants(restaurants)
+
+    def _get(self, **kwargs):
+        params = {'lat': DEFAULT_CENTER[0], 'lon': DEFAULT_CENTER[1], 'radius': 20000, 'source': 'local',
+                  'fields': 'place_id,name,rating'}
+        params.update({k: v for k, v in kwargs.items() if not k.startswith('HTTP_')})
+        return self.client.get('/recommender/get_restaurants/', params,
+                               **{k: v for k, v in kwargs.items() if k.startswith('HTTP_')})
+
+    def test_unchanged_results_get_a_304(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()), 10)
+
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self._get(since=first['ETag'].strip('"')).status_code, 304)
+        # Another projection is another result set.
+        self.assertEqual(self._get(fields='place_id', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_since_returns_what_changed(self):
+        version = self._get()['ETag'].strip('"')
+        removed, changed = self.restaurants[0], dict(self.restaurants[1], rating=1.0)
+        added = dict(self.restaurants[2], place_id='new_place', name='New Place')
+        self.catalog.put_many([changed])
+        self.spatial_index.discard_many([removed['place_id']])
+        self._put([added])
+
+        body = self._get(since=version).json()
+
+        self.assertTrue(body['delta'])
+        self.assertEqual(body['since'], version)
+        self.assertEqual([r['place_id'] for r in body['added']], ['new_place'])
+        self.assertEqual(body['changed'], [{'place_id': changed['place_id'], 'name': changed['name'], 'rating': 1.0}])
+        self.assertEqual(body['removed'], [removed['place_id']])
+        self.assertEqual(len(body['place_ids']), 10)
+        self.assertNotIn(removed['place_id'], body['place_ids'])
+
+    def test_unknown_version_falls_back_to_the_full_results(self):
+        response = self._get(since='unknown')
+        body = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(body['delta'])
+        self.assertEqual(body['version'], response['ETag'].strip('"'))
+        self.assertEqual(len(body['restaurants']), 10)
+
+
+# --- Request coalescing ---
+class SingleFlightTests(SimpleTestCase):
+    callers = 8
+
+    def setUp(self):
+        self.flight = SingleFlight('test')
+        self.executions = 0
+
+    def _all_waiting(self):
+        return self.flight.stats()['waiting_now'] == self.callers - 1
+
+    def _leader(self, outcome):
+        """A func that returns (or raises) outcome once every other caller waits on it."""
+        def func():
+            self.executions += 1
+            deadline = time.monotonic() + 5
+            while not self._all_waiting() and time.monotonic() < deadline:
+                time.sleep(0.001)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return func
+
+    def _run_threads(self, outcome):
+        results = [None] * self.callers
+
+        def call(i):
+            try:
+                results[i] = self.flight.do('key', self._leader(outcome))
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(self.callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_callers_share_one_execution(self):
+        result = {'restaurants': []}
+        results = self._run_threads(result)
+        self.assertEqual(self.executions, 1)
+        self.assertTrue(all(r is result for r in results))
+        self.assertEqual(self.flight.stats()['coalesced'], self.callers - 1)
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_concurrent_callers_share_the_exception(self):
+        error = ValueError('search failed')
+        results = self._run_threads(error)
+        self.assertEqual(self.executions, 1)
+        self.assertTrue(all(r is error for r in results))
+        # The next call runs again.
+        self.assertEqual(self.flight.do('key', lambda: 'fresh'), 'fresh')
+
+    def test_async_callers_share_one_execution(self):
+        async def run(outcome):
+            async def leader():
+                self.executions += 1
+                while not self._all_waiting():
+                    await asyncio.sleep(0.001)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+            return await asyncio.gather(*[self.flight.ado('key', leader) for _ in range(self.callers)],
+                                        return_exceptions=True)
+
+        result = {'restaurants': []}
+        self.assertTrue(all(r is result for r in asyncio.run(asyncio.wait_for(run(result), 5))))
+        error = ValueError('search failed')
+        self.assertTrue(all(r is error for r in asyncio.run(asyncio.wait_for(run(error), 5))))
+        self.assertEqual(self.executions, 2)
+
+
+# --- Spatial index ---
+class SpatialIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.points = {}  # The reference: place_id -> (lat, lon)
+
+    def _add(self, index, n, start=0):
+        lats = DEFAULT_CENTER[0] + self.rng.uniform(-0.1, 0.1, n)
+        lons = DEFAULT_CENTER[1] + self.rng.uniform(-0.1, 0.1, n)
+        place_ids = [f'p{start + i}' for i in range(n)]
+        index.add_many(place_ids, lats, lons)
+        self.points.update(zip(place_ids, zip(lats, lons)))
+
+    def _brute_force(self, lat, lon, radius, limit=None):
+        place_ids = list(self.points)
+        coords = np.array([self.points[pid] for pid in place_ids])
+        distances = haversine_distances_m(lat, lon, coords[:, 0], coords[:, 1])
+        inside = [i for i in np.argsort(distances, kind='stable') if distances[i] <= radius][:limit]
+        return [place_ids[i] for i in inside], [float(distances[i]) for i in inside]
+
+    def _assert_matches_brute_force(self, index, queries=30, limit=None):
+        for _ in range(queries):
+            lat = DEFAULT_CENTER[0] + self.rng.uniform(-0.1, 0.1)
+            lon = DEFAULT_CENTER[1] + self.rng.uniform(-0.1, 0.1)
+            radius = self.rng.uniform(100, 8000)
+            place_ids, distances = index.query(lat, lon, radius, limit=limit)
+            expected_ids, expected_distances = self._brute_force(lat, lon, radius, limit)
+            self.assertEqual(place_ids, expected_ids)
+            np.testing.assert_allclose(distances, expected_distances)
+
+    def test_merged_index(self):
+        index = SpatialIndex(merge_threshold=64)
+        for batch in range(10):
+            self._add(index, 200, start=batch * 200)
+        self.assertLess(len(index._pending), 200)
+        self._assert_matches_brute_force(index)
+
+    def test_pending_buffer_only(self):
+        index = SpatialIndex(merge_threshold=10 ** 9)
+        self._add(index, 500)
+        self.assertEqual(len(index._ids), 0)
+        self._assert_matches_brute_force(index)
+
+    def test_moves_and_discards_before_a_merge(self):
+        index = SpatialIndex(merge_threshold=64)
+        self._add(index, 1000)
+        index.merge_threshold = 10 ** 9
+        moved = [f'p{i}' for i in range(0, 100, 2)]
+        lats = DEFAULT_CENTER[0] + self.rng.uniform(-0.1, 0.1, len(moved))
+        lons = DEFAULT_CENTER[1] + self.rng.uniform(-0.1, 0.1, len(moved))
+        index.add_many(moved, lats, lons)
+        self.points.update(zip(moved, zip(lats, lons)))
+        discarded = [f'p{i}' for i in range(1, 100, 2)] + [moved[0]]
+        index.discard_many(discarded)
+        for place_id in discarded:
+            self.points.pop(place_id)
+        self._add(index, 50, start=1000)
+
+        self.assertTrue(index._pending and index._stale)
+        self.assertEqual(len(index), len(self.points))
+        self._assert_matches_brute_force(index)
+        self._assert_matches_brute_force(index, limit=5)
+
+    def test_limit_returns_the_nearest(self):
+        index = SpatialIndex(merge_threshold=64)
+        self._add(index, 1000)
+        self._add(index, 30, start=1000)
+        for limit in (1, 10, 100):
+            self._assert_matches_brute_force(index, queries=10, limit=limit)
+
+
+# --- Model weight arena ---
+class WeightArenaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @staticmethod
+    def _value(views):
+        """The single value all of a slot's weights were written with; a torn read would mix two."""
+        values = np.unique(np.concatenate([v.ravel() for v in views]))
+        assert len(values) == 1, f"torn read: {values}"
+        return float(values[0])
+
+    def test_reader_sees_consistent_slots_while_another_process_writes_and_grows(self):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.skipTest('needs fork')
+        num_users, rounds = 40, 200
+        writer = multiprocessing.get_context('fork').Process(target=_write_arena_rounds,
+                                                             args=(self.directory, num_users, rounds))
+        reader = WeightArena(self.directory)
+        writer.start()
+        seen = {}
+        while writer.is_alive():
+            for i in range(num_users):
+                value = reader.read(f'user_{i}', self._value)
+                if value is not None:
+                    # Slots only move forward, even across the file swaps of _grow.
+                    self.assertGreaterEqual(value, seen.get(i, 0))
+                    seen[i] = value
+        writer.join()
+
+        self.assertEqual(writer.exitcode, 0)
+        self.assertGreaterEqual(reader._read_index()['capacity'], num_users)  # Grown from 2, several times
+        self.assertEqual([reader.read(f'user_{i}', self._value) for i in range(num_users)], [rounds] * num_users)
+
+    def test_overwrites_are_visible_without_an_index_change(self):
+        writer, reader = WeightArena(self.directory), WeightArena(self.directory)
+        writer.put_many({'user': _arena_weights(1)})
+        self.assertEqual(reader.read('user', self._value), 1)
+        index_stat = os.stat(os.path.join(self.directory, 'index.json'))
+        version = reader.version('user')
+
+        writer.put_many({'user': _arena_weights(2)})
+
+        self.assertEqual(os.stat(os.path.join(self.directory, 'index.json')).st_mtime_ns, index_stat.st_mtime_ns)
+        self.assertEqual(reader.version('user'), version + 2)
+        self.assertEqual(reader.read('user', self._value), 2)
+
+    def test_misses_are_cached_for_the_ttl(self):
+        inner = SQLiteStore()
+        store = ArenaStore(inner, self.directory, ttl_seconds=0.2)
+        with mock.patch.object(inner, 'get_model_weights_many', wraps=inner.get_model_weights_many) as inner_reads:
+            self.assertIsNone(store.with_model_weights('cold', self._value))
+            self.assertEqual(store.get_model_weights_many(['cold']), {})
+            self.assertEqual(inner_reads.call_count, 1)
+
+            time.sleep(0.25)
+            self.assertIsNone(store.with_model_weights('cold', self._value))
+            self.assertEqual(inner_reads.call_count, 2)
+
+            # Written by another worker: found in the arena, although this worker remembers the miss.
+            ArenaStore(inner, self.directory, ttl_seconds=0.2).put_model_weights_many({'cold': _arena_weights(3)})
+            self.assertEqual(store.with_model_weights('cold', self._value), 3)
+            self.assertEqual(inner_reads.call_count, 2)
+
+
+# --- Place Details tiers ---
+@override_settings(FEATURE_STORE_ENABLED=False, CATEGORY_CACHE_ENABLED=False)
+class PlaceDetailsTests(SimpleTestCase):
+    def setUp(self):
+        self.gmaps = _fake_gmaps()
+        self.catalog = RestaurantCatalog()
+        for target, value in (('gmaps', self.gmaps), ('restaurant_catalog', self.catalog),
+                              ('places_scheduler', _scheduler())):
+            patcher = mock.patch(f'recommender.get_restaurants.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_basic_details_give_the_same_categories_as_full_details(self):
+        from .get_restaurants import _fetch_restaurant_details
+        for restaurant in self.gmaps.restaurants[:20]:
+            basic = _fetch_restaurant_details(restaurant['place_id'], None, '', level='basic')
+            full = _fetch_restaurant_details(restaurant['place_id'], None, '', level='full')
+            self.assertEqual(sorted(basic['categories']), sorted(full['categories']))
+            self.assertEqual(basic['photos'], [])
+
+    def test_details_of_unknown_places_are_limited_per_client(self):
+        known = self.gmaps.restaurants[0]
+        self.catalog.put_many([dict(known, details_level='basic')])
+
+        with mock.patch('recommender.views.unknown_place_details_limit', KeyedRateLimit(0, burst=2)):
+            statuses = [self.client.get(f'/recommender/place_details/unknown_{i}/').status_code for i in range(3)]
+            known_statuses = [self.client.get(f"/recommender/place_details/{known['place_id']}/").status_code
+                              for _ in range(3)]
+
+        self.assertEqual(statuses, [404, 404, 429])
+        self.assertEqual(known_statuses, [200, 200, 200])
+        # The two allowed unknown IDs and the one upgrade of the known place to full details.
+        self.assertEqual(self.gmaps.calls['place'], 3)
+
+    @override_settings(PLACE_IDS_MAX_FETCH=3)
+    def test_places_missing_from_the_catalog_are_fetched_up_to_the_cap(self):
+        from .get_restaurants import get_restaurants_by_ids
+        known = self.gmaps.restaurants[0]
+        self.catalog.put_many([known])
+        place_ids = [known['place_id']] + [r['place_id'] for r in self.gmaps.restaurants[1:6]]
+
+        restaurants, unresolved = get_restaurants_by_ids(place_ids)
+
+        self.assertEqual([r['place_id'] for r in restaurants], place_ids[:4])
+        self.assertEqual(unresolved, place_ids[4:])
+        self.assertEqual(self.gmaps.calls['place'], 3)
+
+    @override_settings(PLACE_IDS_MAX_PER_REQUEST=5)
+    def test_requests_listing_too_many_place_ids_are_rejected(self):
+        body = {'place_ids': [r['place_id'] for r in self.gmaps.restaurants[:6]], 'user_profile': {'uid': 'u'}}
+        for url in ('/recommender/hybrid_recommendations/', '/recommender/async/hybrid_recommendations/'):
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/recommender/batch_recommendations/', json.dumps(
+            {'place_ids': body['place_ids'], 'user_profiles': [body['user_profile']]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.gmaps.calls['place'], 0)
+
+
+# --- Response projection ---
+class ProjectionTests(SimpleTestCase):
+    # A full-details restaurant, a basic one and a restricted one appended after them, as the hybrid endpoint returns them.
+    restaurants = [
+        {'place_id': 'a', 'name': 'A', 'details_level': 'full', 'phone_number': '1', 'reviews': ['good']},
+        {'place_id': 'b', 'name': 'B', 'details_level': 'basic', 'reviews': []},
+        {'place_id': 'c', 'name': 'C', 'details_level': 'basic', 'reviews': [], 'restricted': True},
+    ]
+
+    def test_columnar_layout_has_every_key_of_any_row(self):
+        payload = project_restaurants(self.restaurants, layout=LAYOUT_COLUMNAR)
+        self.assertEqual(payload['fields'], ['place_id', 'name', 'details_level', 'phone_number', 'reviews', 'restricted'])
+        self.assertEqual(payload['count'], 3)
+        self.assertEqual(payload['columns']['phone_number'], ['1', None, None])
+        self.assertEqual(payload['columns']['restricted'], [None, None, True])
+
+    def test_columnar_layout_with_fields(self):
+        payload = project_restaurants(self.restaurants, ['place_id', 'restricted'], LAYOUT_COLUMNAR)
+        self.assertEqual(payload, {'fields': ['place_id', 'restricted'], 'count': 3,
+                                   'columns': {'place_id': ['a', 'b', 'c'], 'restricted': [None, None, True]}})
+
+    def test_rows_layout_leaves_out_missing_fields(self):
+        self.assertIs(project_restaurants(self.restaurants, layout=LAYOUT_ROWS), self.restaurants)
+        rows = project_restaurants(self.restaurants, ['place_id', 'phone_number', 'restricted'], LAYOUT_ROWS)
+        self.assertEqual(rows, [{'place_id': 'a', 'phone_number': '1'}, {'place_id': 'b'},
+                                {'place_id': 'c', 'restricted': True}])
+
+    def test_an_empty_list(self):
+        self.assertEqual(project_restaurants([], layout=LAYOUT_COLUMNAR), {'fields': [], 'count': 0, 'columns': {}})
+
+
+# --- Category cache ---
+class CategoryCacheTests(TestCase):
+    details = {'name': 'Ichiban Ramen House', 'vicinity': 'Jalan Bukit', 'types': ['restaurant'],
+               'reviews': [{'text': 'Rich tonkotsu ramen and gyoza.'}]}
+
+    def setUp(self):
+        from .get_restaurants import categorize
+        self.calls = 0
+
+        def compute(inputs, keyword):
+            self.calls += 1
+            return categorize(inputs, keyword)
+        self.compute = compute
+
+    def _edited_dictionary(self):
+        """CATEGORY_DICT with 'ramen' added to the japanese keywords, and its version."""
+        edited = dict(CATEGORY_DICT, japanese=CATEGORY_DICT['japanese'] + ['ramen'])
+        return mock.patch.dict(CATEGORY_DICT, edited), \
+            mock.patch('recommender.categorization.CATEGORY_DICT_VERSION', dictionary_version(edited))
+
+    def test_new_inputs_replace_the_entry_for_the_same_keyword(self):
+        cache = CategoryCache()
+        cache.get_categories('p1', self.details, '', self.compute)
+        cache.get_categories('p1', self.details, 'sushi', self.compute)
+        updated = dict(self.details, reviews=self.details['reviews'] + [{'text': 'Great miso soup.'}])
+        cache.get_categories('p1', updated, '', self.compute)
+
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(sorted(e['keyword'] for e in CategoryCacheEntry.objects.filter(place_id='p1')
+                                .values_list('inputs', flat=True)), ['', 'sushi'])
+        # A fresh worker finds the new inputs in the table.
+        CategoryCache().get_categories('p1', updated, '', self.compute)
+        self.assertEqual(self.calls, 3)
+
+    def test_editing_the_dictionary_invalidates_the_cache(self):
+        before = CategoryCache().get_categories('p1', self.details, '', self.compute)
+        self.assertNotIn('japanese', before)
+
+        patch_dict, patch_version = self._edited_dictionary()
+        with patch_dict, patch_version:
+            after = CategoryCache().get_categories('p1', self.details, '', self.compute)
+
+        self.assertEqual(self.calls, 2)
+        self.assertIn('japanese', after)
+        self.assertEqual(CategoryCacheEntry.objects.get(place_id='p1').categories, after)
+
+    def test_recategorize_updates_the_rows(self):
+        cache = CategoryCache()
+        for i in range(3):
+            cache.get_categories(f'p{i}', self.details, '', self.compute)
+
+        patch_dict, patch_version = self._edited_dictionary()
+        with patch_dict, patch_version:
+            self.assertEqual(recategorize_entries(self.compute), (3, 3))
+            self.assertEqual(recategorize_entries(self.compute), (0, 0))
+            for entry in CategoryCacheEntry.objects.all():
+                self.assertIn('japanese', entry.categories)
+            calls = self.calls
+            self.assertIn('japanese', CategoryCache().get_categories('p0', self.details, '', self.compute))
+            self.assertEqual(self.calls, calls)
+
+
+# --- Favourites snapshot ---
+class FavouritesSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_a_snapshot_that_fails_to_open_is_retried(self):
+        write_favourites_snapshot({'a': {'p1'}}, self.directory)
+        snapshot = FavouritesSnapshot(self.directory)
+        first = snapshot.current()
+        self.assertIsNotNone(first)
+
+        # A pointer naming a snapshot that cannot be opened (yet) keeps the previous snapshot...
+        with open(os.path.join(self.directory, CURRENT_POINTER), 'w', encoding='utf-8') as f:
+            f.write('snapshot_missing')
+        self.assertIs(snapshot.current(), first)
+        # ...and does not stop the next good one from being picked up.
+        write_favourites_snapshot({'a': {'p1'}, 'b': {'p1', 'p2'}}, self.directory)
+        self.assertEqual(len(snapshot.current()['user_ids']), 2)
+
+    def test_an_unopenable_first_snapshot_is_retried(self):
+        path = write_favourites_snapshot({'a': {'p1'}}, self.directory)
+        indices = os.path.join(path, 'indices.npy')
+        os.rename(indices, indices + '.moved')
+        snapshot = FavouritesSnapshot(self.directory)
+        self.assertIsNone(snapshot.current())
+
+        os.rename(indices + '.moved', indices)
+        self.assertIsNotNone(snapshot.current())
+
+
+# --- Feature store ---
+class FeatureStoreTrustTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.feature_store = RestaurantFeatureStore(directory.name)
+        patcher = mock.patch('recommender.feature_store._feature_store', self.feature_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.restaurants = make_restaurants(20)
+        self.feature_store.add_many(self.restaurants)
+
+    def test_ingested_and_id_only_dicts_use_the_store(self):
+        self.assertTrue(all(FEATURE_VERSION_KEY in r for r in self.restaurants))
+        self.assertTrue(gather_features(self.restaurants)[2].all())
+        self.assertTrue(gather_features([{'place_id': r['place_id']} for r in self.restaurants])[2].all())
+
+    def test_client_and_stale_dicts_are_encoded_from_their_data(self):
+        client = from_client([dict(r, rating=1.0) for r in self.restaurants[:5]])
+        self.assertFalse(any(FEATURE_VERSION_KEY in r for r in client))
+        self.assertFalse(gather_features(client)[2].any())
+
+        stale = dict(self.restaurants[0])
+        self.feature_store.add_many([dict(self.restaurants[0], rating=1.0)])
+        found = gather_features([stale, self.restaurants[1]])[2]
+        self.assertEqual(list(found), [False, True])
@@ -3,6 +3,14 @@ from . import views
 
 urlpatterns = [
     path('get_restaurants/', views.get_restaurants_api, name='get_restaurants_api'),
+    path('place_details/<str:place_id>/', views.get_place_details_api, name='get_place_details_api'),
+    path('photos/<str:photo_reference>/', views.get_photo_api, name='get_photo_api'),
     path('hybrid_recommendations/', views.get_hybrid_recommendations_api, name='get_hybrid_recommendations_api'),
+    path('batch_recommendations/', views.get_batch_recommendations_api, name='get_batch_recommendations_api'),
     path('record_feedback/', views.record_feedback, name='record_feedback'),
+    path('stats/coalescing/', views.get_coalescing_stats_api, name='get_coalescing_stats_api'),
+    path('stats/prefetch/', views.get_prefetch_stats_api, name='get_prefetch_stats_api'),
+    # Async versions for ASGI deployments
+    path('async/get_restaurants/', views.get_restaurants_api_async, name='get_restaurants_api_async'),
+    path('async/hybrid_recommendations/', views.get_hybrid_recommendations_api_async, name='get_hybrid_recommendations_api_async'),
 ]
\ No newline at end of file
@@ -1,21 +1,87 @@
-from django.http import JsonResponse, HttpRequest
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, HttpRequest
+from django.utils.http import parse_etags
 from django.views.decorators.http import require_GET
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 import json
-from .get_restaurants import get_nearby_recommend_restaurants_logic
+from .get_restaurants import get_nearby_recommend_restaurants_logic, get_restaurants_by_ids, get_local_nearby_restaurants
+from .get_restaurants import get_restaurant_full_details, fetch_photo, is_known_place
+from .get_restaurants import aget_nearby_recommend_restaurants_logic, aget_restaurants_by_ids, run_io
 from .content_based import get_content_based_recommendations
 from .collaborative import get_collaborative_filtering_recommendations
 from .hybrid import get_hybrid_recommendations
+from .batch import get_batch_hybrid_recommendations
 from .reinforcement_learning import DQNAgent, extract_rl_features
-from .constants import CATEGORY_KEYS
+from .constants import CATEGORY_KEYS, FEEDBACK_ACTION_INDEX, FEEDBACK_REWARDS
+from .feature_store import from_client
+from .feedback_log import feedback_buffer
+from .affinity import affinity_store
+from .bandit import LinUCBRanker, get_ranker_name, load_linucb_ranker, save_linucb_ranker
+from .projection import LAYOUT_ROWS, parse_projection, project_restaurants
+from .result_versions import result_versions, serialize_rows
+from .prefetch import PREFETCH_RESULT_LIMIT, area_prefetcher
+from .singleflight import nearby_search_flight, nearby_search_key, place_details_flight, photo_flight
+from .photos import DEFAULT_PHOTO_WIDTH, PhotoNotFound, get_photo, image_content_type, is_valid_photo_reference
+from .photos import photo_cache, snap_width
+from .rate_limit import KeyedRateLimit
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
 import sys
 
+# Place Details calls for place_ids this server has not seen, per client address (see get_place_details_api).
+unknown_place_details_limit = KeyedRateLimit(
+    getattr(settings, 'PLACE_DETAILS_UNKNOWN_PER_MINUTE', 10) / 60.0,
+    burst=getattr(settings, 'PLACE_DETAILS_UNKNOWN_PER_MINUTE', 10),
+)
+
+def _versioned_restaurants_response(request, restaurants, fields, layout):
+    """
+    Builds the get_restaurants response with the result set's version as its ETag. A request whose
+    If-None-Match holds that version gets a 304. With ?since=<version> the response only carries
+    the restaurants added or changed since that version and the place_ids removed, plus the new order.
+    """
+    rows = project_restaurants(restaurants, fields, LAYOUT_ROWS)
+    row_texts = serialize_rows(rows)
+    place_ids = [r.get('place_id') for r in restaurants]
+    version = result_versions.record(place_ids, row_texts, variant=f"{','.join(fields or [])}|{layout}")
+    etag = f'"{version}"'
+
+    since = request.GET.get('since')
+    if etag in parse_etags(request.headers.get('If-None-Match', '')) or since == version:
+        response = HttpResponse(status=304)
+    elif since:
+        delta = result_versions.delta(since, version)
+        if delta is None:
+            # Unknown or expired version (or recorded by another worker): send everything.
+            response = JsonResponse({'version': version, 'since': since, 'delta': False,
+                                     'restaurants': project_restaurants(restaurants, fields, layout)})
+        else:
+            added, removed, changed = delta
+            by_id = dict(zip(place_ids, restaurants))
+            response = JsonResponse({
+                'version': version, 'since': since, 'delta': True, 'place_ids': place_ids,
+                'added': project_restaurants([by_id[pid] for pid in added], fields, layout),
+                'changed': project_restaurants([by_id[pid] for pid in changed], fields, layout),
+                'removed': removed,
+            })
+    elif layout == LAYOUT_ROWS:
+        # The rows are already serialized for the version; join them instead of encoding again.
+        response = HttpResponse('[' + ','.join(row_texts) + ']', content_type='application/json')
+    else:
+        response = JsonResponse(project_restaurants(restaurants, fields, layout), safe=False)
+    response['ETag'] = etag
+    return response
+
+
 @require_GET
 def get_restaurants_api(request: HttpRequest):
     """
     API endpoint to fetch nearby restaurants based on latitude, longitude, and radius.
     Correctly parses 'lat', 'lon', and 'radius' from URL query parameters.
+    With source=local, only restaurants already known to the server are searched (no Google
+    call), and each result carries its 'distance_m'. With PREFETCH_ENABLED, searches inside an
+    area prefetched in the background are answered the same way.
+    Responses carry an ETag; see _versioned_restaurants_response for 304s and ?since= deltas.
     """
     try:
         # Correctly parse parameters from the GET request's query string
@@ -27,15 +93,37 @@ def get_restaurants_api(request: HttpRequest):
         if not all([latitude, longitude, radius]):
             return JsonResponse({"error": "Missing required parameters: lat, lon, radius"}, status=400)
 
+        # Optional projection, e.g. ?fields=place_id,name,rating&layout=columnar
+        try:
+            fields, layout = parse_projection(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
         # Convert parameters to the correct data types
         latitude = float(latitude)
         longitude = float(longitude)
         radius = int(radius)
 
-        # Call your existing logic function with the parsed parameters
-        restaurants = get_nearby_recommend_restaurants_logic(latitude, longitude, radius)
+        if area_prefetcher is not None:
+            area_prefetcher.record_query(latitude, longitude)
+
+        if request.GET.get('source') == 'local':
+            return _versioned_restaurants_response(
+                request, get_local_nearby_restaurants(latitude, longitude, radius), fields, layout)
+
+        if area_prefetcher is not None and area_prefetcher.covers(latitude, longitude, radius):
+            # The area was searched in the background recently; answer from the catalog.
+            return _versioned_restaurants_response(
+                request, get_local_nearby_restaurants(latitude, longitude, radius, limit=PREFETCH_RESULT_LIMIT),
+                fields, layout)
+
+        # Call your existing logic function with the parsed parameters.
+        # Identical searches already in flight share that search's result.
+        restaurants = nearby_search_flight.do(
+            nearby_search_key(latitude, longitude, radius),
+            lambda: get_nearby_recommend_restaurants_logic(latitude, longitude, radius))
         
-        return JsonResponse(restaurants, safe=False)
+        return _versioned_restaurants_response(request, restaurants, fields, layout)
 
     except ValueError:
         return JsonResponse({"error": "Invalid parameter format. lat/lon must be float, radius must be int."}, status=400)
@@ -44,22 +132,158 @@ def get_restaurants_api(request: HttpRequest):
         return JsonResponse({"error": "An internal server error occurred."}, status=500)
     
 
+@require_GET
+def get_place_details_api(request: HttpRequest, place_id):
+    """
+    Returns one restaurant with the full Place Details (reviews, photos, opening hours, contact details).
+    With PLACES_DETAILS_MODE='tiered' the search results only carry the basic fields, and clients call
+    this when a restaurant is opened; the result is cached in the catalog.
+    Each call may cost a paid Place Details request, so place_ids the server has not ingested are
+    limited to PLACE_DETAILS_UNKNOWN_PER_MINUTE per client address.
+    """
+    if not is_known_place(place_id) and not unknown_place_details_limit.try_acquire(request.META.get('REMOTE_ADDR')):
+        return JsonResponse({"error": "Too many requests for unknown places"}, status=429)
+    try:
+        restaurant = place_details_flight.do(place_id, lambda: get_restaurant_full_details(place_id))
+    except Exception as e:
+        print(f"An unexpected error occurred in get_place_details_api: {e}", file=sys.stderr)
+        return JsonResponse({"error": "An internal server error occurred."}, status=500)
+
+    if restaurant is None:
+        return JsonResponse({"error": f"Place {place_id} not found"}, status=404)
+    return JsonResponse(restaurant)
+
+
+@require_GET
+def get_photo_api(request: HttpRequest, photo_reference):
+    """
+    Serves a restaurant photo by its Places photo reference, e.g. photos/<photo_reference>/?max_width=400.
+    The photo is fetched from Google once and then served from the on-disk photo cache. A photo
+    reference always names the same image, so responses carry a long Cache-Control and an ETag,
+    and clients revalidating with If-None-Match get a 304 without the photo being read.
+    """
+    if not is_valid_photo_reference(photo_reference):
+        return JsonResponse({"error": "Invalid photo reference"}, status=400)
+    try:
+        width = snap_width(max(1, int(request.GET.get('max_width', DEFAULT_PHOTO_WIDTH))))
+    except ValueError:
+        return JsonResponse({"error": "max_width must be an int"}, status=400)
+
+    etag = f'"{photo_cache.key(photo_reference)}-w{width}"'
+    cache_control = f"public, max-age={getattr(settings, 'PHOTO_MAX_AGE_SECONDS', 7 * 24 * 60 * 60)}, immutable"
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        try:
+            path, hit = get_photo(photo_reference, width, fetch_photo, photo_cache)
+            try:
+                photo = open(path, 'rb')
+            except FileNotFoundError:
+                # Evicted by another worker since the lookup; fetch it again, once.
+                path, hit = get_photo(photo_reference, width, fetch_photo, photo_cache)
+                photo = open(path, 'rb')
+        except PhotoNotFound:
+            return JsonResponse({"error": "Photo not found"}, status=404)
+        except (ApiError, HTTPError, Timeout, TransportError) as e:
+            print(f"Error during Google Maps API call (places_photo): {e}", file=sys.stderr)
+            return JsonResponse({"error": "Could not fetch the photo"}, status=502)
+        except Exception as e:
+            print(f"An unexpected error occurred in get_photo_api: {e}", file=sys.stderr)
+            return JsonResponse({"error": "An internal server error occurred."}, status=500)
+
+        content_type = image_content_type(photo.read(12)) or 'application/octet-stream'
+        photo.seek(0)
+        # FileResponse streams the open file; WSGI servers with a file_wrapper send it with sendfile().
+        response = FileResponse(photo, content_type=content_type)
+        response['X-Photo-Cache'] = 'HIT' if hit else 'MISS'
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _check_place_ids(place_ids):
+    """Raises ValueError unless place_ids is a list of at most PLACE_IDS_MAX_PER_REQUEST strings."""
+    if not isinstance(place_ids, list) or not all(isinstance(pid, str) for pid in place_ids):
+        raise ValueError('place_ids must be a list of strings')
+    max_ids = getattr(settings, 'PLACE_IDS_MAX_PER_REQUEST', 500)
+    if len(place_ids) > max_ids:
+        raise ValueError(f'place_ids may list at most {max_ids} IDs')
+
+
+def _split_place_ids(place_ids, restaurants):
+    """
+    Splits the place_ids of a request into the restaurants the client sent in full and the IDs
+    still to resolve. Objects for IDs not listed in place_ids are ignored.
+
+    Returns:
+        tuple: ({place_id: restaurant} sent by the client, [place_ids to resolve]).
+
+    Raises:
+        ValueError: If place_ids is not a list of strings, or lists more than PLACE_IDS_MAX_PER_REQUEST.
+    """
+    _check_place_ids(place_ids)
+    listed = set(place_ids)
+    client_restaurants = {
+        r['place_id']: r for r in (restaurants or [])
+        if isinstance(r, dict) and isinstance(r.get('place_id'), str) and r['place_id'] in listed
+    }
+    return client_restaurants, [pid for pid in place_ids if pid not in client_restaurants]
+
+
+def _in_request_order(place_ids, client_restaurants, resolved):
+    """Merges the client's and the resolved restaurants in the order of place_ids (each ID once)."""
+    by_id = dict(client_restaurants)
+    for restaurant in resolved:
+        by_id.setdefault(restaurant['place_id'], restaurant)
+    return [by_id[pid] for pid in dict.fromkeys(place_ids) if pid in by_id]
+
+
 @csrf_exempt
 def get_hybrid_recommendations_api(request):
     if request.method == 'POST':
         try:
             # The user's profile and restaurant list are now in the POST body
             data = json.loads(request.body)
-            restaurants = data.get('restaurants')
+            restaurants = from_client(data.get('restaurants'))
+            place_ids = data.get('place_ids')
             user_profile = data.get('user_profile')
 
+            # Clients can send plain place_ids instead of the full restaurant objects.
+            # Full objects sent along for some of the IDs are used as they are; the other
+            # IDs are resolved from the server-side catalog, falling back to Google.
+            if place_ids:
+                try:
+                    client_restaurants, to_resolve = _split_place_ids(place_ids, restaurants)
+                except ValueError as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+                resolved, unresolved = get_restaurants_by_ids(to_resolve)
+                restaurants = _in_request_order(place_ids, client_restaurants, resolved)
+                if unresolved:
+                    print(f"Hybrid API: Could not resolve {len(unresolved)} place_ids: {unresolved}", file=sys.stderr)
+
             if not restaurants or not user_profile:
-                return JsonResponse({'error': 'restaurants and user_profile are required in the request body'}, status=400)
+                return JsonResponse({'error': 'restaurants (or place_ids) and user_profile are required in the request body'}, status=400)
+
+            # Projection options can be sent in the body or in the query string.
+            try:
+                fields, layout = parse_projection(data if ('fields' in data or 'layout' in data) else request.GET)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            try:
+                ranker = get_ranker_name(data.get('ranker'))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # Candidates failing the user's restrictions: 'append' (unscored, at the end) or 'drop'.
+            restricted = data.get('restricted')
+            if restricted not in (None, 'append', 'drop'):
+                return JsonResponse({'error': "restricted must be 'append' or 'drop'"}, status=400)
 
             # Generate personalized hybrid recommendations
-            recommendations = get_hybrid_recommendations(user_profile, restaurants)
+            recommendations = get_hybrid_recommendations(user_profile, restaurants, ranker=ranker, restricted=restricted)
             
-            return JsonResponse(recommendations, safe=False)
+            return JsonResponse(project_restaurants(recommendations, fields, layout), safe=False)
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
@@ -68,6 +292,153 @@ def get_hybrid_recommendations_api(request):
 
     return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
+# --- Async views ---
+# Same requests and responses as the views above. Under ASGI, waiting on Google Maps does not
+# hold a worker thread, so one worker can serve many slow searches at once.
+
+@require_GET
+async def get_restaurants_api_async(request: HttpRequest):
+    """Async version of get_restaurants_api."""
+    try:
+        latitude = request.GET.get('lat')
+        longitude = request.GET.get('lon')
+        radius = request.GET.get('radius')
+
+        if not all([latitude, longitude, radius]):
+            return JsonResponse({"error": "Missing required parameters: lat, lon, radius"}, status=400)
+
+        try:
+            fields, layout = parse_projection(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        latitude = float(latitude)
+        longitude = float(longitude)
+        radius = int(radius)
+
+        if area_prefetcher is not None:
+            area_prefetcher.record_query(latitude, longitude)
+
+        if request.GET.get('source') == 'local':
+            # Sub-millisecond and in memory, so not worth a thread hop.
+            return _versioned_restaurants_response(
+                request, get_local_nearby_restaurants(latitude, longitude, radius), fields, layout)
+
+        if area_prefetcher is not None and area_prefetcher.covers(latitude, longitude, radius):
+            return _versioned_restaurants_response(
+                request, get_local_nearby_restaurants(latitude, longitude, radius, limit=PREFETCH_RESULT_LIMIT),
+                fields, layout)
+
+        restaurants = await nearby_search_flight.ado(
+            nearby_search_key(latitude, longitude, radius),
+            lambda: aget_nearby_recommend_restaurants_logic(latitude, longitude, radius))
+
+        return _versioned_restaurants_response(request, restaurants, fields, layout)
+
+    except ValueError:
+        return JsonResponse({"error": "Invalid parameter format. lat/lon must be float, radius must be int."}, status=400)
+    except Exception as e:
+        print(f"An unexpected error occurred in get_restaurants_api_async: {e}", file=sys.stderr)
+        return JsonResponse({"error": "An internal server error occurred."}, status=500)
+
+@csrf_exempt
+@require_POST
+async def get_hybrid_recommendations_api_async(request):
+    """Async version of get_hybrid_recommendations_api."""
+    try:
+        data = json.loads(request.body)
+        restaurants = from_client(data.get('restaurants'))
+        place_ids = data.get('place_ids')
+        user_profile = data.get('user_profile')
+
+        if place_ids:
+            try:
+                client_restaurants, to_resolve = _split_place_ids(place_ids, restaurants)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            resolved, unresolved = await aget_restaurants_by_ids(to_resolve)
+            restaurants = _in_request_order(place_ids, client_restaurants, resolved)
+            if unresolved:
+                print(f"Hybrid API: Could not resolve {len(unresolved)} place_ids: {unresolved}", file=sys.stderr)
+
+        if not restaurants or not user_profile:
+            return JsonResponse({'error': 'restaurants (or place_ids) and user_profile are required in the request body'}, status=400)
+
+        try:
+            fields, layout = parse_projection(data if ('fields' in data or 'layout' in data) else request.GET)
+            ranker = get_ranker_name(data.get('ranker'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        restricted = data.get('restricted')
+        if restricted not in (None, 'append', 'drop'):
+            return JsonResponse({'error': "restricted must be 'append' or 'drop'"}, status=400)
+
+        # The pipeline reads favourites and model weights from the store; run it off the event loop.
+        recommendations = await run_io(get_hybrid_recommendations, user_profile, restaurants,
+                                        ranker=ranker, restricted=restricted)
+
+        return JsonResponse(project_restaurants(recommendations, fields, layout), safe=False)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An unexpected error occurred: {str(e)}'}, status=500)
+
+
+@require_GET
+def get_coalescing_stats_api(request):
+    """Request coalescing counters of the nearby search (executions, coalesced requests, waiters)."""
+    return JsonResponse({'nearby_search': nearby_search_flight.stats(), 'place_details': place_details_flight.stats(),
+                         'photo': photo_flight.stats()})
+
+
+@require_GET
+def get_prefetch_stats_api(request):
+    """Background prefetch counters (refreshes, details calls, searches answered from prefetched data)."""
+    if area_prefetcher is None:
+        return JsonResponse({'enabled': False})
+    return JsonResponse(dict(area_prefetcher.stats(), enabled=True))
+
+
+@csrf_exempt
+@require_POST
+def get_batch_recommendations_api(request):
+    """
+    Generates recommendations for many users against one shared candidate set.
+    Body: {"user_profiles": [...], "restaurants": [...] or "place_ids": [...],
+           "top_k": 20, "workers": 1, "use_rl": false, "restricted": "append" | "drop"}
+    "workers" is capped by BATCH_API_MAX_WORKERS (1 by default, i.e. in-process); large batches
+    should use the batch_recommend management command, which can use every core.
+    """
+    try:
+        data = json.loads(request.body)
+        user_profiles = data.get('user_profiles')
+        restaurants = from_client(data.get('restaurants'))
+        if data.get('place_ids'):
+            _check_place_ids(data['place_ids'])
+            restaurants, _ = get_restaurants_by_ids(data['place_ids'])
+
+        if not user_profiles or not restaurants:
+            return JsonResponse({'error': 'user_profiles and restaurants (or place_ids) are required in the request body'}, status=400)
+
+        batch = get_batch_hybrid_recommendations(
+            user_profiles,
+            restaurants,
+            top_k=int(data.get('top_k', 20)),
+            workers=max(1, min(int(data.get('workers') or 1), getattr(settings, 'BATCH_API_MAX_WORKERS', 1))),
+            use_rl=bool(data.get('use_rl', False)),
+            restricted=data.get('restricted'),
+        )
+        return JsonResponse(batch)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid parameter: {str(e)}'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An unexpected error occurred: {str(e)}'}, status=500)
+
 @csrf_exempt
 @require_POST
 def record_feedback(request):
@@ -85,13 +456,49 @@ def record_feedback(request):
 
         print(f"\n--- [RL FEEDBACK] Received: {action} for restaurant {restaurant_data.get('name')} from user {user_id} ---")
 
-        # Define rewards and action mapping
-        action_map = {'like': 0, 'dislike': 1, 'click_details': 2, 'skip': 3}
-        reward_map = {'like': 1.0, 'dislike': -1.0, 'click_details': 0.5, 'skip': -0.2}
+        # Rewards and action mapping are shared with the training code (see constants.py)
+        action_map = FEEDBACK_ACTION_INDEX
+        reward_map = FEEDBACK_REWARDS
 
         if action not in action_map:
             return JsonResponse({'status': 'error', 'message': 'Invalid action.'}, status=400)
 
+        try:
+            ranker = get_ranker_name(data.get('ranker'))
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        # Update the user's category affinities (used to re-rank until the user has a trained model).
+        # Their stored history is loaded first, so they do not rest on this process's events alone.
+        # Applied before the event is logged: the history merge skips events from after the first update.
+        affinity_store.load_history(user_id)
+        affinity_store.update(user_id, action, restaurant_data.get('categories'), restaurant_data.get('price_level'))
+
+        # 0. Log the event; it is written to UserFeedback in batches by a background thread.
+        # In online mode it is trained on below, so the retraining job leaves it alone.
+        online = getattr(settings, 'RL_TRAINING_MODE', 'online') != 'batch'
+        feedback_buffer.record(
+            user_id=user_id,
+            restaurant_id=restaurant_data.get('place_id', ''),
+            action=action,
+            score_at_recommendation=restaurant_data.get('final_score_with_rl', restaurant_data.get('final_score', 0.0)),
+            ranker=ranker,
+            trained=online,
+        )
+
+        if not online:
+            # Models are trained from the logged events by the retrain_models job; requests only do inference.
+            return JsonResponse({'status': 'success', 'message': 'Feedback recorded; the model is updated by the next training run.'})
+
+        if ranker == 'linucb':
+            # The bandit update is a rank-one update of the user's small state; no model to fit.
+            state = extract_rl_features(restaurant_data, CATEGORY_KEYS)
+            bandit = load_linucb_ranker(user_id) or LinUCBRanker(user_id)
+            bandit.update(state[0], reward_map[action])
+            save_linucb_ranker(bandit)
+            print(f"  [RL FEEDBACK] Updated LinUCB state ({bandit.num_updates} updates) for user {user_id}.")
+            return JsonResponse({'status': 'success', 'message': 'Feedback recorded and model updated.'})
+
         # 1. Instantiate the agent (which loads the existing model)
         agent = DQNAgent(state_size=35, action_size=4, user_id=user_id)
 
@@ -106,12 +513,15 @@ def record_feedback(request):
 
         # 4. Replay/train the model with a batch of experiences
         batch_size = 32
-        if len(agent.memory) > batch_size:
-            agent.replay(batch_size)
-            print(f"  [RL FEEDBACK] Replayed experience and trained model.")
+        if len(agent.memory) <= batch_size:
+            # Untrained weights would count as the user's model and hide their category affinities
+            # in get_hybrid_recommendations, so nothing is saved until the agent has trained.
+            return JsonResponse({'status': 'success', 'message': 'Feedback recorded; not enough experience to train yet.'})
+        agent.replay(batch_size)
+        print(f"  [RL FEEDBACK] Replayed experience and trained model.")
 
-        # 5. Save the updated model back to Firestore
-        agent.save_model_to_firestore()
+        # 5. Save the updated model back to the store (Firestore by default)
+        agent.save_model()
 
         return JsonResponse({'status': 'success', 'message': 'Feedback recorded and model updated.'})
 
@@ -0,0 +1,29 @@
+import time
+import numpy as np
+
+
+def warm_up():
+    """
+    Pre-loads the heavy dependencies and models so the first request of a worker does not pay for them:
+    pandas/scikit-learn (content-based), TensorFlow/Keras (RL agent) and the Firebase client.
+    Called from RecommenderConfig.ready() when settings.RECOMMENDER_WARMUP is enabled.
+    """
+    start = time.perf_counter()
+    print("[WARMUP] Pre-loading recommender dependencies...")
+
+    import pandas  # noqa: F401
+    from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: F401
+    from sklearn.metrics.pairwise import cosine_similarity  # noqa: F401
+
+    # Initialize Firebase, then build and run one throwaway DQN so Keras compiles
+    # its predict function now (its Firestore lookup also opens the client channel).
+    from .firebase_client import initialize_firebase
+    from .reinforcement_learning import DQNAgent, STATE_SIZE, ACTION_SIZE
+    try:
+        initialize_firebase()
+    except Exception as e:
+        print(f"[WARMUP] WARNING: Could not initialize Firebase: {e}")
+    agent = DQNAgent(state_size=STATE_SIZE, action_size=ACTION_SIZE, user_id='__warmup__')
+    agent.get_q_values_batch(np.zeros((1, STATE_SIZE)))
+
+    print(f"[WARMUP] Done in {time.perf_counter() - start:.2f}s.")
@@ -0,0 +1,326 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from .storage import RecommenderStore
+
+try:
+    import fcntl # Cross-process write lock (not available on Windows)
+except ImportError:
+    fcntl = None
+
+# ========================== # # Per-user model weights in memory-mapped files shared by every worker process on
+# === Model Weight Arena === # # the host: one fixed-size float32 slot per user, guarded by a per-slot version
+# ========================== # # counter (a seqlock), so workers read weights in place and see each other's updates.
+
+SEQLOCK_READ_RETRIES = 100
+
+
+class WeightArena:
+    """
+    Shared, memory-mapped weights of one model collection (e.g. 'rl_models').
+
+    Files in `directory`:
+        slots.f32    - float32 array of shape (capacity, slot_size), one flattened model per row
+        versions.u64 - uint64 seqlock counter per slot: odd while the slot is being written
+        stamps.f64   - float64 time at which each slot was last written
+        index.json   - {"user_ids": [...], "capacity": n, "layout": [shape, ...]}
+
+    All models in a collection share one layout (the list of weight array shapes), which is
+    fixed by the first write. Writers serialize on a file lock; readers never block.
+    """
+    def __init__(self, directory, initial_capacity=256):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._index_stamp = None
+        self._slot_of = {}
+        self._layout = None
+        self._slots = None
+        self._versions = None
+        self._stamps = None
+
+    # --- Paths and index ---
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_index(self):
+        try:
+            with open(self._path('index.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_index(self, user_ids, capacity, layout):
+        tmp_path = self._path(f'index.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'user_ids': user_ids, 'capacity': capacity, 'layout': layout}, f)
+        os.replace(tmp_path, self._path('index.json'))
+
+    @staticmethod
+    def _slot_size(layout):
+        return sum(int(np.prod(shape)) for shape in layout)
+
+    def _open(self, name, dtype, shape, mode):
+        return np.memmap(self._path(name), dtype=dtype, mode=mode, shape=shape)
+
+    # --- Reading ---
+    def _refresh(self):
+        """Reopens the memory maps if another process has added users or grown the files. Caller holds the lock."""
+        try:
+            stat = os.stat(self._path('index.json'))
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._index_stamp:
+            return
+        index = self._read_index() if stamp else None
+        if index is None or not index['user_ids']:
+            self._slot_of, self._layout, self._slots, self._versions, self._stamps = {}, None, None, None, None
+        else:
+            capacity, layout = index['capacity'], [tuple(shape) for shape in index['layout']]
+            self._slots = self._open('slots.f32', np.float32, (capacity, self._slot_size(layout)), 'r')
+            self._versions = self._open('versions.u64', np.uint64, (capacity,), 'r')
+            self._stamps = self._open('stamps.f64', np.float64, (capacity,), 'r')
+            self._slot_of = {user_id: slot for slot, user_id in enumerate(index['user_ids'])}
+            self._layout = layout
+        self._index_stamp = stamp
+
+    def _views(self, row, layout):
+        """Splits a slot row into read-only arrays of the layout's shapes, without copying."""
+        views, offset = [], 0
+        for shape in layout:
+            size = int(np.prod(shape))
+            views.append(row[offset:offset + size].reshape(shape))
+            offset += size
+        return views
+
+    def read(self, user_id, func, max_age=None):
+        """
+        Calls func(weights) on the user's weights in place and returns its result.
+
+        The weights are read-only views into the shared file. func may run more than once: if a
+        writer updated the slot meanwhile, the result is discarded and func is called again on
+        the new weights. Results must not keep references to the views, and must not be None.
+
+        Args:
+            user_id (str): The user whose model to read.
+            func (callable): Called with the list of weight arrays.
+            max_age (float): Treat slots written longer ago than this (seconds) as missing.
+
+        Returns:
+            The result of func, or None if the arena has no (fresh enough) weights for the user.
+        """
+        with self._lock:
+            self._refresh()
+            slot = self._slot_of.get(user_id)
+            if slot is None:
+                return None
+            slots, versions, stamps, layout = self._slots, self._versions, self._stamps, self._layout
+
+        for _ in range(SEQLOCK_READ_RETRIES):
+            version = int(versions[slot])
+            if version == 0:
+                return None  # Allocated by a writer that has not finished yet
+            if version & 1:
+                time.sleep(0)  # A write is in progress
+                continue
+            if max_age is not None and time.time() - stamps[slot] > max_age:
+                return None
+            try:
+                result = func(self._views(slots[slot], layout))
+            except Exception:
+                if int(versions[slot]) == version:
+                    raise
+                continue  # Read a torn slot; try again
+            if int(versions[slot]) == version:
+                return result
+        raise RuntimeError(f"Could not get a consistent read of the weights of user {user_id}")
+
+    def get_many(self, user_ids, max_age=None):
+        """Returns {user_id: list of weight arrays} (copies) for the users in the arena."""
+        weights = {}
+        for user_id in user_ids:
+            copied = self.read(user_id, lambda views: [np.array(v) for v in views], max_age=max_age)
+            if copied is not None:
+                weights[user_id] = copied
+        return weights
+
+    def version(self, user_id):
+        """The seqlock counter of the user's slot: it grows by 2 per write. 0 if the user is not in the arena."""
+        with self._lock:
+            self._refresh()
+            slot = self._slot_of.get(user_id)
+            return int(self._versions[slot]) if slot is not None else 0
+
+    # --- Writing ---
+    def put_many(self, weights_by_user):
+        """
+        Writes (or overwrites) models. Models whose layout does not match the arena's are skipped.
+        Returns the user_ids written.
+        """
+        if not weights_by_user:
+            return []
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path('write.lock'), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            index = self._read_index()
+            user_ids = index['user_ids'] if index else []
+            capacity = index['capacity'] if index else 0
+            layout = [tuple(shape) for shape in index['layout']] if index else \
+                [tuple(np.shape(w)) for w in next(iter(weights_by_user.values()))]
+            slot_of = {user_id: slot for slot, user_id in enumerate(user_ids)}
+
+            written, added = [], False
+            for user_id, weights in weights_by_user.items():
+                if [tuple(np.shape(w)) for w in weights] != layout:
+                    print(f"  [ARENA] WARNING: Model of user {user_id} does not match the arena layout; not cached.")
+                    continue
+                if user_id not in slot_of:
+                    slot_of[user_id] = len(user_ids)
+                    user_ids.append(user_id)
+                    added = True
+                written.append(user_id)
+            if not written:
+                return []
+
+            slot_size = self._slot_size(layout)
+            old_capacity = capacity
+            if len(user_ids) > capacity:
+                capacity = self._grow(capacity, max(self.initial_capacity, capacity * 2, len(user_ids)), slot_size)
+
+            slots = self._open('slots.f32', np.float32, (capacity, slot_size), 'r+')
+            versions = self._open('versions.u64', np.uint64, (capacity,), 'r+')
+            stamps = self._open('stamps.f64', np.float64, (capacity,), 'r+')
+            now = time.time()
+            for user_id in written:
+                slot = slot_of[user_id]
+                flat = np.concatenate([np.asarray(w, dtype=np.float32).ravel() for w in weights_by_user[user_id]])
+                versions[slot] += 1  # odd: readers retry
+                slots[slot] = flat
+                stamps[slot] = now
+                versions[slot] += 1  # even again
+            del slots, versions, stamps
+
+            # New users become visible to readers only now, after their slots are written. Overwrites
+            # of existing slots are already visible through the shared maps, so the index (whose
+            # mtime makes every reader reopen its maps) is left alone unless users were added.
+            if added or capacity != old_capacity:
+                self._write_index(user_ids, capacity, [list(shape) for shape in layout])
+        return written
+
+    def _grow(self, old_capacity, new_capacity, slot_size):
+        """Copies the arrays into larger files and swaps them in atomically."""
+        for name, dtype, width in (('slots.f32', np.float32, slot_size), ('versions.u64', np.uint64, None),
+                                   ('stamps.f64', np.float64, None)):
+            shape = (new_capacity, width) if width else (new_capacity,)
+            tmp_path = self._path(f'{name}.{os.getpid()}.tmp')
+            grown = np.memmap(tmp_path, dtype=dtype, mode='w+', shape=shape)
+            if old_capacity and os.path.exists(self._path(name)):
+                old_shape = (old_capacity, width) if width else (old_capacity,)
+                grown[:old_capacity] = np.memmap(self._path(name), dtype=dtype, mode='r', shape=old_shape)
+            grown.flush()
+            del grown
+            os.replace(tmp_path, self._path(name))
+        return new_capacity
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._slot_of)
+
+
+class ArenaStore(RecommenderStore):
+    """
+    Serves model weights from host-wide WeightArenas in front of another store. Misses (and slots
+    older than ttl_seconds, so updates made on other hosts are picked up) are read from the inner
+    store and written to the arena; writes go to both. Users the inner store has no model for are
+    remembered for ttl_seconds (per process, up to max_missing), so cold users do not cost an inner
+    read per request; weights written meanwhile by any worker on the host are still found in the
+    arena first. Favourites are passed through.
+    """
+    def __init__(self, inner, directory, ttl_seconds=300, max_missing=100000):
+        self.inner = inner
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_missing = max_missing
+        self._arenas = {}
+        self._missing = OrderedDict()  # (collection, user_id) -> time the miss expires
+        self._lock = threading.Lock()
+
+    def arena(self, collection):
+        with self._lock:
+            if collection not in self._arenas:
+                self._arenas[collection] = WeightArena(os.path.join(self.directory, collection))
+            return self._arenas[collection]
+
+    def _max_age(self):
+        return self.ttl_seconds if self.ttl_seconds > 0 else None
+
+    def _fetch(self, user_ids, collection):
+        """Reads models from the inner store, skipping and then remembering the users it has none for."""
+        now = time.monotonic()
+        with self._lock:
+            to_fetch = []
+            for user_id in user_ids:
+                expires = self._missing.get((collection, user_id))
+                if expires is not None and expires <= now:
+                    del self._missing[(collection, user_id)]
+                    expires = None
+                if expires is None:
+                    to_fetch.append(user_id)
+        if not to_fetch:
+            return {}
+        fetched = self.inner.get_model_weights_many(to_fetch, collection)
+        if self.ttl_seconds > 0:
+            with self._lock:
+                for user_id in to_fetch:
+                    if user_id not in fetched:
+                        self._missing[(collection, user_id)] = now + self.ttl_seconds
+                        self._missing.move_to_end((collection, user_id))
+                while len(self._missing) > self.max_missing:
+                    self._missing.popitem(last=False)
+        return fetched
+
+    def get_all_favourites(self):
+        return self.inner.get_all_favourites()
+
+    def get_favourites_many(self, user_ids):
+        return self.inner.get_favourites_many(user_ids)
+
+    def put_favourites_many(self, favourites_by_user):
+        self.inner.put_favourites_many(favourites_by_user)
+
+    def get_model_weights_many(self, user_ids, collection='rl_models'):
+        arena = self.arena(collection)
+        weights = arena.get_many(user_ids, max_age=self._max_age())
+        misses = [user_id for user_id in user_ids if user_id not in weights]
+        if misses:
+            fetched = self._fetch(misses, collection)
+            arena.put_many(fetched)
+            weights.update(fetched)
+        return weights
+
+    def put_model_weights_many(self, weights_by_user, collection='rl_models'):
+        self.inner.put_model_weights_many(weights_by_user, collection)
+        with self._lock:
+            for user_id in weights_by_user:
+                self._missing.pop((collection, user_id), None)
+        self.arena(collection).put_many(weights_by_user)
+
+    def with_model_weights(self, user_id, func, collection='rl_models'):
+        # In place on a hit; a miss is fetched into the arena first.
+        arena = self.arena(collection)
+        result = arena.read(user_id, func, max_age=self._max_age())
+        if result is None:
+            fetched = self._fetch([user_id], collection)
+            if user_id not in fetched:
+                return None
+            if not arena.put_many(fetched):
+                return func(fetched[user_id])
+            result = arena.read(user_id, func)
+        return result